@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ローカルスタブに対するベンチマーク（ネットワーク・認証情報不要）
+  python benchmark.py crawl [--pages 3 10 50] [--latency 0.2]
+  python benchmark.py boards [--boards 4] [--pages 3] [--latency 0.2] [--in-flight 4]
+  python benchmark.py paging [--active 1 3 8] [--latency 0.05]
+  python benchmark.py http [--pages 30] [--handshake 0.05] [--workers 1 4]
+  python benchmark.py sheets [--candidates 25] [--posts 5]
+  python benchmark.py post [--posts 12] [--limit 5] [--window 3] [--lost 0.2] [--runs 2]
+  python benchmark.py judge [--concurrency 1 4 8] [--latency 0.5] [--rate-429 0.1]
+  python benchmark.py batch [--prompts 25] [--errored 0.1]
+  python benchmark.py titles [--threads 20] [--bad 0.3 0.6] [--latency 0.3]
+  python benchmark.py neardup [--sizes 1000 10000 30000] [--queries 200]
+  python benchmark.py parse [--fixtures DIR] [--repeat 5]
+  python benchmark.py prompt [--threads DIR] [--budget 6000]
+  python benchmark.py premod [--mb 1 4 16]
+  python benchmark.py e2e --fixtures DIR [--jobs main post_to_x] [--latency 0.05] [--baseline FILE]
+  python benchmark.py startup [--modules main post_to_x candidate_extractor] [--repeat 5] [--baseline FILE]
+"""
+
+import argparse, datetime, glob, json, os, random, re, statistics, subprocess, sys, tempfile, time, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import boards, config, crawler, extract, http_client, llm, llm_cache, neardup, post_queue, premod, prompt_budget, state, titles
+from sheet_writer import SheetWriter
+from stubs import BatchStub, ClaudeStub, FakeClient, StubServer, TitleStub, TweetsStub, board_html, thread_html
+
+
+# ------------ crawl ------------
+def bench_crawl(args):
+    def route(method, path, query, headers, body):
+        page = int(query.get("page", ["1"])[0])
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, board_html(page)
+
+    print(f"latency={args.latency}s rate={args.rate}/s in_flight={args.in_flight} workers={args.workers}")
+    print(f"{'pages':>6} {'serial':>9} {'legacy*':>9} {'concurrent':>11} {'threads':>8}")
+    with StubServer(route, latency=args.latency) as srv:
+        board = f"{srv.url}/bbs/board/23ku/"
+        for n in args.pages:
+            t0 = time.perf_counter()
+            serial = crawler.crawl_board(board, n, workers=1,
+                                         limiter=crawler.HostLimiter(rate=0, max_in_flight=1))
+            t_serial = time.perf_counter() - t0
+
+            limiter = crawler.HostLimiter(rate=args.rate, burst=args.burst, max_in_flight=args.in_flight)
+            t0 = time.perf_counter()
+            conc = crawler.crawl_board(board, n, workers=args.workers, limiter=limiter)
+            t_conc = time.perf_counter() - t0
+
+            assert [t["id"] for t in serial] == [t["id"] for t in conc], "順序/重複排除が不一致"
+            legacy = t_serial + 2 * n   # 旧実装はページ毎に固定 2 秒待機
+            print(f"{n:>6} {t_serial:>8.2f}s {legacy:>8.2f}s {t_conc:>10.2f}s {len(conc):>8}")
+    print("* legacy = serial + 固定 2s/ページ（旧 fetch_threads 相当の推定値）")
+
+
+# ------------ boards ------------
+def bench_boards(args):
+    """複数板: 板を 1 つずつクロール vs boards.crawl（並列・板をまたいだ重複排除）"""
+    def route(method, path, query, headers, body):
+        k = int(path.rstrip("/").rsplit("b", 1)[-1])           # /bbs/board/b{k}/ は 1 ページずつずらして重複させる
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, board_html(int(query.get("page", ["1"])[0]) + k)
+
+    print(f"boards={args.boards} pages={args.pages} latency={args.latency}s rate={args.rate}/s in_flight={args.in_flight}")
+    limiter = lambda: crawler.HostLimiter(rate=args.rate, burst=args.in_flight, max_in_flight=args.in_flight)
+    with StubServer(route, latency=args.latency) as srv:
+        bs = [boards.Board(f"b{k}", f"{srv.url}/bbs/board/b{k}/", args.pages, 5, None, args.pages)
+              for k in range(args.boards)]
+        t0 = time.perf_counter()
+        lim = limiter()
+        serial = [t for b in bs for t in crawler.crawl_board(b.url, b.pages, limiter=lim)]
+        t_serial = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        merged = boards.crawl(bs, limiter=limiter())
+        t_conc = time.perf_counter() - t0
+    uniq = {t["id"] for t in serial}
+    assert {t["id"] for t in merged} == uniq and len(merged) == len(uniq)
+    print(f"  serial: {t_serial:>6.2f}s  {len(serial)} スレ（重複込み。従来はそのまま判定対象）")
+    print(f"  boards: {t_conc:>6.2f}s  {len(merged)} スレ（判定は 1 スレ 1 回）")
+
+
+# ------------ paging ------------
+def bench_paging(args):
+    """固定 BOARD_PAGES vs adaptive（差分の出るページ数 = active を変えて、取得ページ数と拾えた差分スレ数）"""
+    def route(method, path, query, headers, body):
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, board_html(int(query.get("page", ["1"])[0]))
+
+    def history_for(active):
+        """active ページ目までのスレだけレス数を 1 増やした履歴"""
+        hist = {}
+        for p in range(1, config.BOARD_MAX_PAGES + 3):
+            for t in crawler.parse_board(board_html(p)):
+                hist.setdefault(t["url"], t["count"] - (1 if p <= active else 0))
+        return hist
+
+    print(f"pages={config.BOARD_PAGES} max={config.BOARD_MAX_PAGES} quiet={config.BOARD_QUIET_PAGES} latency={args.latency}s")
+    print(f"{'active':>7} {'mode':>9} {'pages':>6} {'wall':>7} {'差分スレ':>8}")
+    with StubServer(route, latency=args.latency) as srv:
+        board = f"{srv.url}/bbs/board/23ku/"
+        for active in args.active:
+            hist = history_for(active)
+            for mode in ("fixed", "adaptive"):
+                t0 = time.perf_counter()
+                limiter = crawler.HostLimiter(rate=args.rate, burst=args.in_flight, max_in_flight=args.in_flight)
+                if mode == "fixed":
+                    threads, n = crawler.crawl_board(board, config.BOARD_PAGES, limiter=limiter), config.BOARD_PAGES
+                else:
+                    threads, n = crawler.crawl_adaptive(board, hist, max_pages=config.BOARD_MAX_PAGES,
+                                                        wave=args.in_flight, limiter=limiter)
+                wall = time.perf_counter() - t0
+                found = sum(t["count"] > hist.get(t["url"], t["count"]) for t in threads)
+                print(f"{active:>7} {mode:>9} {n:>6} {wall:>6.2f}s {found:>8}")
+
+
+# ------------ http ------------
+def bench_http(args):
+    """複数ページ取得: 毎回新規接続（requests.get） vs ホスト毎の共有 Session（http_client）"""
+    def route(method, path, query, headers, body):
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, board_html(int(query.get("page", ["1"])[0]))
+
+    def per_call(url):
+        return requests.get(url, timeout=30)
+
+    def pooled(url):
+        return http_client.get(url, target="bench")
+
+    print(f"pages={args.pages} latency={args.latency}s handshake={args.handshake}s（新規接続ごと）")
+    print(f"{'client':>9} {'workers':>8} {'wall':>8} {'conns':>6} {'setup(est)':>11}")
+    with StubServer(route, latency=args.latency, connect_latency=args.handshake) as srv:
+        urls = [f"{srv.url}/bbs/board/23ku/?page={p}" for p in range(1, args.pages + 1)]
+        for workers in args.workers:
+            for name, fetch in (("per-call", per_call), ("pooled", pooled)):
+                srv.connections = 0
+                t0 = time.perf_counter()
+                if workers <= 1:
+                    res = [fetch(u) for u in urls]
+                else:
+                    with ThreadPoolExecutor(max_workers=workers) as ex:
+                        res = list(ex.map(fetch, urls))
+                wall = time.perf_counter() - t0
+                assert all(r.status_code == 200 for r in res)
+                print(f"{name:>9} {workers:>8} {wall:>7.2f}s {srv.connections:>6} "
+                      f"{srv.connections * args.handshake:>10.2f}s")
+            http_client._sessions.clear()          # 次の workers では接続を作り直す
+    print("setup(est) = 接続数 × handshake（接続確立に費やした時間の見積り）")
+
+
+# ------------ sheets ------------
+def _weekly_writes(ws_cand, ws_post, ws_status, n_cand, n_post):
+    """main.py（候補・予定）と post_to_x.py（投稿済み更新）の書き込みパターン"""
+    ws_cand.clear(); ws_cand.append_row(["URL", "差分レス数", "スレッドタイトル", "炎上リスク", "コメント", "投稿可否"])
+    for i in range(n_cand):
+        ws_cand.append_row([f"u{i}", i, "t", "低", "c", "OK"])
+    ws_post.clear(); ws_post.append_row(["日付", "投稿時間", "投稿テキスト", "投稿済み", "URL"])
+    for i in range(n_post):
+        ws_post.append_row(["2026/01/05", "8:00", "text", "FALSE", f"u{i}"])
+    for i in range(n_post):
+        ws_status.update_cell(i + 2, 4, "TRUE")
+
+
+def bench_sheets(args):
+    legacy = FakeClient()
+    b = legacy.book
+    _weekly_writes(b.worksheet("投稿候補"), b.worksheet("投稿予定"), b.worksheet("投稿予定"),
+                   args.candidates, args.posts)
+
+    buffered = FakeClient()
+    b = buffered.book
+    with SheetWriter(b.worksheet("投稿候補")) as wc, SheetWriter(b.worksheet("投稿予定")) as wp:
+        _weekly_writes(wc, wp, wp, args.candidates, args.posts)
+
+    # 同じ最終状態になること
+    assert legacy.book.worksheet("投稿候補").rows == buffered.book.worksheet("投稿候補").rows
+    assert legacy.book.worksheet("投稿予定").rows == buffered.book.worksheet("投稿予定").rows
+    for name, client in (("legacy", legacy), ("buffered", buffered)):
+        calls = client.book.calls
+        print(f"{name:>9}: {sum(calls.values()):>3} requests  {calls}")
+
+
+# ------------ post ------------
+def bench_post(args):
+    """
+    期日到来分の連続投稿を runs 回（= 定期実行）繰り返す。
+    legacy: 1 件ずつ送り 201 以外は ERROR（429 は共通バックオフ）/ queue: post_queue
+    """
+    config.POST_CURSOR_PATH = ""
+    now = datetime.datetime(2026, 1, 6)
+    rows = [state.POST_HEADER] + [["2026/01/05", f"{8 + i % 12}:00", f"投稿{i}", "FALSE", f"u{i}"]
+                                  for i in range(args.posts)]
+    print(f"posts={args.posts} 枠={args.limit}件/{args.window}s 結果不明率={args.lost} runs={args.runs}")
+    print(f"{'mode':>7} {'wall':>8} {'POST':>5} {'429':>4} {'posted':>7} {'TRUE':>5} {'ERROR':>6}")
+    for mode in ("legacy", "queue"):
+        stub = TweetsStub(limit=args.limit, window=args.window, lost=args.lost)
+        book = FakeClient({state.POST_SHEET: rows}).book
+        with StubServer(stub) as srv:
+            url = f"{srv.url}/2/tweets"
+            t0 = time.perf_counter()
+            for _ in range(args.runs):
+                st = state.SheetsState(book)
+                due = st.pending_posts(now)
+                if mode == "queue":
+                    post_queue.post_due(due, st, lambda text: http_client.post(
+                        url, json={"text": text}, target="twitter", retries=1))
+                else:
+                    for item in due:
+                        res = http_client.post(url, json={"text": item.text}, target="twitter")
+                        st.writer.update_cell(item.row, 4, "TRUE" if res.status_code == 201 else "ERROR")
+                st.close()
+            wall = time.perf_counter() - t0
+        col = [r[3] for r in book.worksheet(state.POST_SHEET).rows[1:]]
+        print(f"{mode:>7} {wall:>7.2f}s {stub.sent:>5} {stub.throttled:>4} {len(stub.posts):>7} "
+              f"{col.count('TRUE'):>5} {sum(c.startswith('ERROR') for c in col):>6}")
+    print("posted = X 側で実際に作られた投稿数（重複は 403 で拒否されるので posts 以下）")
+
+
+# ------------ judge ------------
+def bench_judge(args):
+    llm_cache.CACHE = llm_cache.LLMCache(path="")      # 毎回 API を叩かせる
+    print(f"latency={args.latency}s prompts={args.prompts} 429率={args.rate_429} retry-after={args.retry_after}s")
+    print(f"{'conc':>5} {'wall':>8} {'req/s':>7} {'429':>5} {'NG':>4}")
+    for conc in args.concurrency:
+        stub = ClaudeStub(rate_429=args.rate_429, retry_after=args.retry_after)
+        with StubServer(stub, latency=args.latency) as srv:
+            config.CLAUDE_API_URL = f"{srv.url}/v1/messages"
+            t0 = time.perf_counter()
+            out = llm.map_ordered(lambda i: llm.claude_call(f"本文{i}", 200, api_key="stub"),
+                                  range(args.prompts), workers=conc,
+                                  on_error=lambda i, e: "NG")
+            wall = time.perf_counter() - t0
+        ng = sum(o == "NG" for o in out)
+        print(f"{conc:>5} {wall:>7.2f}s {args.prompts / wall:>7.2f} {stub.throttled:>5} {ng:>4}")
+
+
+# ------------ batch ------------
+def bench_batch(args):
+    config.CLAUDE_BATCH_POLL = args.poll
+    print(f"latency={args.latency}s prompts={args.prompts} 個別エラー率={args.errored}")
+    for mode in ("sync", "batch"):
+        llm_cache.CACHE = llm_cache.LLMCache(path="")
+        llm._batched.clear()
+        stub = BatchStub(errored=args.errored)
+        with StubServer(stub, latency=args.latency) as srv:
+            config.CLAUDE_API_URL = f"{srv.url}/v1/messages"
+            prompts = [(f"本文{i}", 200) for i in range(args.prompts)]
+            t0 = time.perf_counter()
+            if mode == "batch":
+                llm.prefetch_batch(prompts, api_key="stub")
+            out = [llm.claude_call(p, n, api_key="stub") for p, n in prompts]
+            wall = time.perf_counter() - t0
+        assert len(out) == args.prompts
+        print(f"{mode:>6}: {wall:>6.2f}s  HTTP {srv.hits:>3} 回（うち同期 messages {stub.ok} 回）")
+
+
+# ------------ titles ------------
+def _legacy_title(text, call):
+    """旧 main: generate_summary（最大 4 回）を NOK の間 6 回。temperature 0・1 本ずつ・禁止語のみ検証"""
+    banned = premod.compile_terms(tuple(titles.BANNED_WORDS))
+    for _ in range(6):
+        t = "NOK"
+        for _ in range(4):
+            t = call(f"タイトルを 1 本だけ生成\n--- 本文 ---\n{text}", 80, 0).strip()
+            if "NOK" in t.upper():
+                break
+            if banned.search(t):
+                t = "NOK"
+                continue
+            if len(t) > titles.MAX_TITLE_LEN:
+                t = t[:titles.MAX_TITLE_LEN].rstrip("、,。. ") + "…"
+            break
+        if t.upper() != "NOK":
+            return t
+    return "NOK"
+
+
+def bench_titles(args):
+    """タイトル生成: 旧（1 本ずつ・入れ子の再試行）vs 候補一括＋ローカル検証"""
+    print(f"threads={args.threads} latency={args.latency}s 候補数={config.TITLE_CANDIDATES}")
+    print(f"{'bad':>5} {'mode':>10} {'wall':>8} {'calls':>6} {'平均':>5} {'最大':>4} {'NOK':>4} {'規則違反':>8}")
+    for bad in args.bad:
+        for mode in ("legacy", "candidates"):
+            llm_cache.CACHE = llm_cache.LLMCache(path="")
+            stub, per = TitleStub(bad=bad, nok=args.nok), []
+            with StubServer(stub, latency=args.latency) as srv:
+                config.CLAUDE_API_URL = f"{srv.url}/v1/messages"
+
+                def one(i):
+                    n = 0
+
+                    def call(prompt, max_tokens, temperature):
+                        nonlocal n
+                        n += 1
+                        return llm.claude_call(prompt, max_tokens, api_key="stub", temperature=temperature)
+                    text = f"スレ{i} 渋谷駅の新築マンションについて"
+                    t = _legacy_title(text, call) if mode == "legacy" else titles.generate(text, call).text
+                    return t, n
+
+                t0 = time.perf_counter()
+                out = llm.map_ordered(one, range(args.threads), workers=config.JUDGE_WORKERS)
+                wall = time.perf_counter() - t0
+            per = [n for _, n in out]
+            nok = sum(t == "NOK" for t, _ in out)
+            broken = sum(t != "NOK" and titles.check(t.rstrip("…")) is not None for t, _ in out)
+            print(f"{bad:>5} {mode:>10} {wall:>7.2f}s {stub.calls:>6} {statistics.mean(per):>5.2f} "
+                  f"{max(per):>4} {nok:>4} {broken:>8}")
+    print("規則違反 = 採用されたが形式の規則を満たさないタイトル（旧方式は禁止語しか見ない）")
+
+
+# ------------ neardup ------------
+def _dup_text(r, base=None, edit=0.03):
+    """ランダムな本文。base を渡すとその一部（edit の割合）だけ書き換えた本文"""
+    chars = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわ管理駅徒歩築年修繕"
+    if base is None:
+        return "".join(r.choice(chars) for _ in range(400))
+    out = list(base)
+    for i in r.sample(range(len(out)), int(len(out) * edit)):
+        out[i] = r.choice(chars)
+    return "".join(out)
+
+
+def bench_neardup(args):
+    """類似スレ索引: LSH の索引引き vs 全件の署名比較（件数を増やしたときの 1 件あたりの時間と再現率）"""
+    print(f"queries={args.queries} 書き換え率={args.edit} 閾値={config.NEARDUP_THRESHOLD} "
+          f"perm={config.NEARDUP_PERM} bands={config.NEARDUP_BANDS}")
+    print(f"{'size':>7} {'build':>8} {'lsh/q':>9} {'scan/q':>9} {'候補/q':>7} {'recall':>7} {'誤検出':>6}")
+    for size in args.sizes:
+        r = random.Random(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            index = neardup.NearDupIndex(os.path.join(tmp, "neardup.sqlite3"))
+            texts, sigs = [], {}
+            t0 = time.perf_counter()
+            for i in range(size):
+                texts.append(_dup_text(r))
+                sigs[f"u{i}"] = index.add(f"u{i}", neardup.signature(texts[-1]))
+            build = time.perf_counter() - t0
+            dense = {u: neardup.densify(s) for u, s in sigs.items()}
+
+            targets = r.sample(range(size), args.queries)
+            queries = [neardup.signature(_dup_text(r, texts[i], args.edit)) for i in targets]
+            t0 = time.perf_counter()
+            found, cands, false = 0, 0, 0
+            for i, q in zip(targets, queries):
+                near = index.query(q)
+                hits = {u for u in near if neardup.similarity(q, sigs[u]) >= config.NEARDUP_THRESHOLD}
+                cands += len(near)
+                found += f"u{i}" in hits
+                false += len(hits - {f"u{i}"})
+            lsh = (time.perf_counter() - t0) / args.queries
+
+            t0 = time.perf_counter()
+            for q in queries[:args.scan_queries]:
+                dq = neardup.densify(q)
+                [u for u, d in dense.items() if sum(x == y for x, y in zip(dq, d)) / len(d) >= config.NEARDUP_THRESHOLD]
+            scan = (time.perf_counter() - t0) / min(args.queries, args.scan_queries)
+            index.db.close()
+        print(f"{size:>7} {build:>7.1f}s {lsh * 1000:>7.2f}ms {scan * 1000:>7.2f}ms {cands / args.queries:>7.1f} "
+              f"{found / args.queries:>7.0%} {false:>6}")
+
+
+# ------------ parse ------------
+def _fixtures(path):
+    """保存済み HTML（*.html）。無ければダミーページを生成"""
+    if path:
+        pages = []
+        for f in sorted(glob.glob(os.path.join(path, "*.html"))):
+            with open(f, encoding="utf-8") as fh:
+                pages.append(fh.read())
+        return pages
+    return ([board_html(p, filler=150) for p in range(1, 4)]
+            + [thread_html("700000", p, filler=150) for p in range(1, 4)])
+
+
+def _extract_all(backend, pages):
+    return [(backend.board_items(h), backend.comments(h), backend.title(h)) for h in pages]
+
+
+def bench_parse(args):
+    pages = _fixtures(args.fixtures)
+    size = sum(len(h.encode("utf-8")) for h in pages)
+    print(f"fixtures={len(pages)} pages ({size / 1024:.0f} KiB) repeat={args.repeat}")
+    print(f"{'backend':>9} {'pages/s':>9} {'peak MiB':>9}  一致")
+    expected = _extract_all(extract.SoupBackend(), pages)
+    for name, cls in extract.BACKENDS.items():
+        backend = cls()
+        tracemalloc.start()
+        got = _extract_all(backend, pages)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            _extract_all(backend, pages)
+        rate = len(pages) * args.repeat / (time.perf_counter() - t0)
+        print(f"{name:>9} {rate:>9.1f} {peak / 2**20:>9.2f}  {'OK' if got == expected else 'NG'}")
+    print("※ peak は tracemalloc 計測のため lxml(libxml2) の C 側確保は含まない")
+
+
+# ------------ prompt ------------
+def _recorded_threads(path):
+    """スレページキャッシュ（thread_cache の *.json）からレス列を復元。無ければ合成"""
+    threads = []
+    for f in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(f, encoding="utf-8") as fh:
+            pages = json.load(fh)
+        threads.append([p for k in sorted(pages, key=int) for p in pages[k]["posts"]])
+    if threads:
+        return threads
+    rng = random.Random(0)
+    words = ["駅近", "管理費", "修繕積立金", "眺望", "騒音", "外国人", "値上がり", "総会", "事故", "日当たり"]
+    for n in [20, 60, 150, 300, 600]:
+        posts = []
+        for i in range(n):
+            body = "、".join(rng.choice(words) for _ in range(rng.randint(3, 40))) + "について。"
+            if posts and rng.random() < 0.15:           # 引用レス
+                body = posts[rng.randrange(len(posts))] + " ← " + body
+            elif posts and rng.random() < 0.05:         # 再投稿
+                body = posts[-1]
+            posts.append(body)
+        threads.append(posts)
+    return threads
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def bench_prompt(args):
+    threads = _recorded_threads(args.threads)
+    llm_cache.CACHE = llm_cache.LLMCache(path="")
+    print(f"threads={len(threads)} budget={args.budget} 文字  stub={args.sec_per_kchar}s/1000字")
+    print(f"{'':>7} {'p50字':>8} {'p90字':>8} {'max字':>8} {'p50秒':>7} {'p90秒':>7} {'合計秒':>7}")
+    with StubServer(ClaudeStub(sec_per_kchar=args.sec_per_kchar)) as srv:
+        config.CLAUDE_API_URL = f"{srv.url}/v1/messages"
+        for label, budget in (("before", 0), ("after", args.budget)):
+            sizes, lat = [], []
+            for posts in threads:
+                text = "\n".join(posts) if budget == 0 else prompt_budget.build(posts, budget)
+                prompt = f"炎上リスクを判定してください。\n--- 本文 ---\n{text}"
+                t0 = time.perf_counter()
+                llm.claude_call(prompt, 200, api_key="stub")
+                lat.append(time.perf_counter() - t0)
+                sizes.append(len(prompt))
+            print(f"{label:>7} {_pct(sizes, .5):>8} {_pct(sizes, .9):>8} {max(sizes):>8} "
+                  f"{_pct(lat, .5):>7.2f} {_pct(lat, .9):>7.2f} {sum(lat):>7.2f}")
+    print(f"▶ {prompt_budget.summary()}")
+
+
+# ------------ premod ------------
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def bench_premod(args):
+    terms = list(premod.DEFAULT_TERMS)
+    rng = random.Random(0)
+    filler = "駅から徒歩5分、管理も良好で日当たりも問題ありません。修繕積立金の値上げについて総会で議論。"
+    print(f"terms={len(terms)}  ※ 判定: 関連語なしの本文（全語が全文走査になる最悪ケース）")
+    print(f"{'MB':>5} {'判定 旧':>9} {'判定 新':>9} {'採点 旧':>9} {'採点 新':>9} {'score':>6}")
+    for mb in args.mb:
+        n = int(mb * 2**20 / len(filler.encode("utf-8")))
+        clean = filler * n
+        chunks = [filler] * n
+        for _ in range(max(1, n // 2000)):          # 0.05% 程度に関連語を混ぜる
+            chunks[rng.randrange(n)] = rng.choice(terms)
+        text = "".join(chunks)
+
+        # 旧 contains_banned 相当（語ごとに re.search）と 1 パス search
+        _, t_old = _timed(lambda: any(re.search(re.escape(w), clean, re.I) for w in terms))
+        _, t_new = _timed(lambda: premod.terms().search(clean))
+        # 語ごとに findall して数える素朴な採点と 1 パス scan
+        naive, s_old = _timed(lambda: {w: len(re.findall(re.escape(w), text, re.I)) for w in terms})
+        score, s_new = _timed(lambda: premod.terms().score(premod.terms().scan(text)))
+        assert score == premod.terms().score({w: c for w, c in naive.items() if c})
+        print(f"{mb:>5} {t_old:>7.1f}ms {t_new:>7.1f}ms {s_old:>7.1f}ms {s_new:>7.1f}ms {score:>6}")
+
+
+# ------------ e2e ------------
+# 先行判定を切って判定を走査順に 1 件ずつにする（HTTP 件数が打ち切りのタイミングに依らない）。
+# 記録時（replay.py record）も同じ値にすること
+E2E_ENV = {"JUDGE_WORKERS": "1", "JUDGE_SPECULATE": "0"}
+
+
+def _replay_once(job, fixtures, latency):
+    """replay.py を別プロセスで実行（モジュール状態・ピークメモリを毎回リセット）"""
+    env = {**E2E_ENV, **os.environ}
+    with tempfile.NamedTemporaryFile(suffix=".json") as f:
+        subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay.py"),
+                        "replay", job, "--fixtures", fixtures, "--latency", str(latency), "--report", f.name],
+                       check=True, stdout=subprocess.DEVNULL, env=env)
+        return json.load(open(f.name, encoding="utf-8"))
+
+
+def bench_e2e(args):
+    """記録済みフィクスチャで main / post_to_x を丸ごと再生し、壁時計・リクエスト数・メモリを比較"""
+    results = {}
+    print(f"fixtures={args.fixtures} latency={args.latency} repeat={args.repeat} "
+          + " ".join(f"{k}={os.environ.get(k, v)}" for k, v in E2E_ENV.items()))
+    print(f"{'job':>10} {'wall(med)':>10} {'http':>6} {'approx':>7} {'unmatched':>9} {'gspread':>8} {'rss':>8} {'dup':>4}")
+    for job in args.jobs:
+        runs = [_replay_once(job, args.fixtures, args.latency) for _ in range(args.repeat)]
+        r = {"wall_sec": statistics.median(x["wall_sec"] for x in runs),
+             "http": max(x["http"]["served"] for x in runs),
+             "approx": max(x["http"]["approx"] for x in runs),
+             "unmatched": max(x["http"]["unmatched"] for x in runs),
+             "gspread": max(sum(x["gspread"]["replayed"].values()) for x in runs),
+             "peak_rss_mib": max(x["peak_rss_mib"] for x in runs),
+             "synthetic": runs[0]["synthetic"], "duplicates": runs[0]["gauges"].get("pipeline.duplicates"),
+             "stages": runs[0]["stages"],
+             "nondeterministic": sorted(k for k, get in (("http", lambda x: x["http"]["served"]),
+                                                          ("gspread", lambda x: x["gspread"]["replayed"]))
+                                        if len({json.dumps(get(x), sort_keys=True) for x in runs}) > 1)}
+        results[job] = r
+        print(f"{job:>10} {r['wall_sec']:>9.2f}s {r['http']:>6} {r['approx']:>7} {r['unmatched']:>9} "
+              f"{r['gspread']:>8} {r['peak_rss_mib']:>6.1f}MiB {r['duplicates'] or 0:>4}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if not args.baseline:
+        return
+
+    # ベースラインより max_regression 以上悪化していれば非 0 で終了（CI 用）
+    base, failed = json.load(open(args.baseline, encoding="utf-8")), []
+    for job, r in results.items():
+        for k in ("wall_sec", "http", "gspread", "peak_rss_mib"):
+            old = base.get(job, {}).get(k)
+            if old and r[k] > old * (1 + args.max_regression):
+                failed.append(f"{job}.{k}: {old} → {r[k]}")
+        if r["unmatched"]:
+            failed.append(f"{job}: 記録にないリクエスト {r['unmatched']} 件")
+        if r["nondeterministic"]:                   # 件数の比較が意味を持たない
+            failed.append(f"{job}: 実行毎に件数が違う {r['nondeterministic']}")
+        if job == "main" and r["synthetic"] and not r["duplicates"]:    # 合成データには類似スレの組がある
+            failed.append(f"{job}: 類似スレが検出されない")
+    for msg in failed:
+        print(f"▶ 劣化 {msg}")
+    if failed:
+        sys.exit(1)
+
+
+# ------------ startup ------------
+SECRET_ENV = ("SPREADSHEET_ID", "CLAUDE_API_KEY", "GCP_SERVICE_ACCOUNT_JSON", "GCP_SERVICE_ACCOUNT_B64",
+              "TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_SECRET")
+
+
+def _importtime(mod):
+    """
+    認証情報を消した環境・空のディレクトリで `python -X importtime -c "import mod"` を実行。
+    → (mod の累積 import ms, 壁時計 ms, {直下の import: 累積 ms}, 作られたファイル)
+    """
+    env = {k: v for k, v in os.environ.items() if k not in SECRET_ENV}
+    env["PYTHONPATH"] = os.path.dirname(os.path.abspath(__file__))
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    with tempfile.TemporaryDirectory() as cwd:
+        t0 = time.perf_counter()
+        r = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {mod}"],
+                           cwd=cwd, env=env, capture_output=True, text=True)
+        wall = (time.perf_counter() - t0) * 1000
+        created = sorted(os.listdir(cwd))
+    if r.returncode:
+        raise SystemExit(f"{mod} の import に失敗:\n{r.stderr[-2000:]}")
+    total, children, stack = None, {}, []
+    for line in r.stderr.splitlines():
+        m = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        if not m:
+            continue
+        cum, depth, name = int(m.group(1)) / 1000, (len(m.group(2)) - 1) // 2, m.group(3)
+        # 子が先に出力されるので、depth 1 の行は直後に出る depth 0 の mod の直下
+        if depth == 0:
+            if name == mod:
+                total = cum
+                children = dict(stack)
+            stack = []
+        elif depth == 1:
+            stack.append((name, cum))
+    return total, wall, children, created
+
+
+def bench_startup(args):
+    """エントリポイントの import コスト（認証情報なしで import でき、ファイルを作らないことも確認）"""
+    results, failed = {}, []
+    print(f"{'module':>20} {'import(min)':>12} {'wall(min)':>10}  重い import")
+    for mod in args.modules:
+        runs = [_importtime(mod) for _ in range(args.repeat)]
+        best = min(runs, key=lambda x: x[0])
+        heavy = sorted(best[2].items(), key=lambda kv: -kv[1])[:args.top]
+        results[mod] = {"import_ms": round(best[0], 1), "wall_ms": round(min(x[1] for x in runs), 1),
+                        "heavy": {k: round(v, 1) for k, v in heavy}}
+        print(f"{mod:>20} {best[0]:>10.1f}ms {results[mod]['wall_ms']:>8.1f}ms  "
+              + ", ".join(f"{k} {v:.0f}ms" for k, v in heavy))
+        if best[3]:
+            failed.append(f"{mod}: import 時にファイルを作成 {best[3]}")
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+    if args.baseline:
+        base = json.load(open(args.baseline, encoding="utf-8"))
+        for mod, r in results.items():
+            old = base.get(mod, {}).get("import_ms")
+            # 数 ms の揺れで落ちないよう 10ms は許容
+            if old and r["import_ms"] > old * (1 + args.max_regression) + 10:
+                failed.append(f"{mod}.import_ms: {old} → {r['import_ms']}")
+    for msg in failed:
+        print(f"▶ 劣化 {msg}")
+    if failed:
+        sys.exit(1)
+
+
+# ------------ エントリポイント ------------
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("crawl", help="板クロール: 逐次 vs 並列")
+    p.add_argument("--pages", type=int, nargs="+", default=[3, 10, 50])
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--in-flight", type=int, default=4)
+    p.add_argument("--rate", type=float, default=20.0)
+    p.add_argument("--burst", type=int, default=4)
+    p.set_defaults(func=bench_crawl)
+
+    p = sub.add_parser("boards", help="複数板: 逐次 vs 並列＋重複排除")
+    p.add_argument("--boards", type=int, default=4)
+    p.add_argument("--pages", type=int, default=3)
+    p.add_argument("--latency", type=float, default=0.2)
+    p.add_argument("--in-flight", type=int, default=4)
+    p.add_argument("--rate", type=float, default=20.0)
+    p.set_defaults(func=bench_boards)
+
+    p = sub.add_parser("paging", help="板クロールの深さ: 固定 vs 履歴との差分で適応")
+    p.add_argument("--active", type=int, nargs="+", default=[0, 1, 3, 8], help="差分の出るページ数（= 週の忙しさ）")
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--in-flight", type=int, default=config.CRAWL_MAX_IN_FLIGHT)
+    p.add_argument("--rate", type=float, default=20.0)
+    p.set_defaults(func=bench_paging)
+
+    p = sub.add_parser("http", help="接続再利用: 毎回新規接続 vs 共有 Session")
+    p.add_argument("--pages", type=int, default=30)
+    p.add_argument("--latency", type=float, default=0.02)
+    p.add_argument("--handshake", type=float, default=0.05, help="新規接続ごとの待ち（TCP+TLS 相当）")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    p.set_defaults(func=bench_http)
+
+    p = sub.add_parser("sheets", help="Sheets 書き込み: 行毎 vs バッファ")
+    p.add_argument("--candidates", type=int, default=25)
+    p.add_argument("--posts", type=int, default=5)
+    p.set_defaults(func=bench_sheets)
+
+    p = sub.add_parser("post", help="X 投稿: 逐次 vs レート枠・冪等キー対応のキュー")
+    p.add_argument("--posts", type=int, default=12)
+    p.add_argument("--limit", type=int, default=5, help="レート枠（件/window）")
+    p.add_argument("--window", type=float, default=3)
+    p.add_argument("--lost", type=float, default=0.2, help="投稿されたのに 503 を返す割合")
+    p.add_argument("--runs", type=int, default=2)
+    p.set_defaults(func=bench_post)
+
+    p = sub.add_parser("judge", help="Claude 判定: 同時実行数ごとのスループット")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    p.add_argument("--prompts", type=int, default=25)
+    p.add_argument("--latency", type=float, default=0.5)
+    p.add_argument("--rate-429", type=float, default=0.1)
+    p.add_argument("--retry-after", type=float, default=1)
+    p.set_defaults(func=bench_judge)
+
+    p = sub.add_parser("batch", help="Message Batches: 同期 vs バッチ")
+    p.add_argument("--prompts", type=int, default=25)
+    p.add_argument("--latency", type=float, default=0.3)
+    p.add_argument("--errored", type=float, default=0.1)
+    p.add_argument("--poll", type=float, default=0.5)
+    p.set_defaults(func=bench_batch)
+
+    p = sub.add_parser("titles", help="タイトル生成: 1 本ずつ・入れ子の再試行 vs 候補一括＋ローカル検証")
+    p.add_argument("--threads", type=int, default=20)
+    p.add_argument("--bad", type=float, nargs="+", default=[0.3, 0.6], help="1 本が不合格になる割合")
+    p.add_argument("--nok", type=float, default=0.05, help="NOK を返す割合")
+    p.add_argument("--latency", type=float, default=0.3)
+    p.set_defaults(func=bench_titles)
+
+    p = sub.add_parser("neardup", help="類似スレ索引: LSH vs 全件比較の 1 件あたり時間・再現率")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 30000])
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--scan-queries", type=int, default=20, help="全件比較は遅いのでこの件数だけ")
+    p.add_argument("--edit", type=float, default=0.03, help="類似スレの本文を書き換える文字の割合")
+    p.set_defaults(func=bench_neardup)
+
+    p = sub.add_parser("parse", help="HTML 抽出: バックエンド別 pages/s とピークメモリ")
+    p.add_argument("--fixtures", help="保存済み *.html のディレクトリ")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_parse)
+
+    p = sub.add_parser("prompt", help="プロンプト予算: 文字数・レイテンシ分布の前後比較")
+    p.add_argument("--threads", default=config.THREAD_CACHE_DIR, help="スレページキャッシュのディレクトリ")
+    p.add_argument("--budget", type=int, default=config.PROMPT_BUDGET_CHARS)
+    p.add_argument("--sec-per-kchar", type=float, default=0.05)
+    p.set_defaults(func=bench_prompt)
+
+    p = sub.add_parser("premod", help="事前モデレーション: 数 MB の本文の走査時間")
+    p.add_argument("--mb", type=float, nargs="+", default=[1, 4, 16])
+    p.set_defaults(func=bench_premod)
+
+    p = sub.add_parser("e2e", help="記録・再生: main / post_to_x 全体の壁時計・リクエスト数・メモリ")
+    p.add_argument("--fixtures", required=True, help="replay.py record の出力先")
+    p.add_argument("--jobs", nargs="+", default=["main", "post_to_x"])
+    p.add_argument("--latency", default="0.05", help="応答遅延（秒）または recorded")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--save", help="結果 JSON の保存先（次回の --baseline 用）")
+    p.add_argument("--baseline", help="比較する結果 JSON")
+    p.add_argument("--max-regression", type=float, default=0.2)
+    p.set_defaults(func=bench_e2e)
+
+    p = sub.add_parser("startup", help="起動: エントリポイントの import 時間（-X importtime）")
+    p.add_argument("--modules", nargs="+", default=["main", "post_to_x", "candidate_extractor"])
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--top", type=int, default=5, help="表示する重い import の数")
+    p.add_argument("--save", help="結果 JSON の保存先（次回の --baseline 用）")
+    p.add_argument("--baseline", help="比較する結果 JSON")
+    p.add_argument("--max-regression", type=float, default=0.2)
+    p.set_defaults(func=bench_startup)
+
+    args = ap.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
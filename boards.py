@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+巡回する板の一覧と複数板クロール
+  BOARDS_FILE（JSON）で指定。空なら 23 区板のみ（従来どおり）
+    [{"name": "23ku", "url": "https://www.e-mansion.co.jp/bbs/board/23ku/",
+      "pages": 3, "max_pages": 10, "quota": 5, "sheet": "投稿候補_23ku"}, ...]
+    - pages : クロールするページ数（既定 BOARD_PAGES。adaptive では増減の基準）
+    - max_pages : adaptive で読む上限（既定 BOARD_MAX_PAGES）
+    - quota : 投稿予定に入れる上限（既定 POST_COUNT。全板合計は POST_COUNT まで）
+    - sheet : 指定するとその板の候補を別シートにも書く
+  - 板は並列にクロール（同じホストなので crawler.LIMITER の予算は共有）
+  - BOARD_PAGING=adaptive なら履歴のレス数と比べ、差分の無いページが BOARD_QUIET_PAGES 続くまで読む
+  - 複数の板に出ているスレは 1 件にまとめる（一覧の先の板・若いページを採用）ので判定も 1 回
+"""
+
+import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import config, crawler
+
+DEFAULT_URL = "https://www.e-mansion.co.jp/bbs/board/23ku/"
+
+Board = namedtuple("Board", "name url pages quota sheet max_pages")
+STATS = {"pages": 0, "base": 0, "added": 0, "skipped": 0}    # 取得ページ数と BOARD_PAGES 比の増減
+
+
+def _board(d) -> Board:
+    url = d["url"]
+    return Board(d.get("name") or url.rstrip("/").rsplit("/", 1)[-1], url,
+                 int(d.get("pages", config.BOARD_PAGES)), int(d.get("quota", config.POST_COUNT)),
+                 d.get("sheet") or None, int(d.get("max_pages", config.BOARD_MAX_PAGES)))
+
+
+def load(path=None) -> list[Board]:
+    path = config.BOARDS_FILE if path is None else path
+    if not path:
+        return [_board({"url": DEFAULT_URL})]
+    with open(path, encoding="utf-8") as f:
+        boards = [_board(d) for d in json.load(f)]
+    names = [b.name for b in boards]
+    if len(set(names)) != len(names):
+        raise ValueError(f"BOARDS_FILE の name が重複しています: {names}")
+    return boards
+
+
+def quotas(boards) -> dict:
+    return {b.name: b.quota for b in boards}
+
+
+def crawl(boards, *, history=None, headers=None, on_page=None, **kw) -> list[dict]:
+    """
+    全板を並列にクロールし、板の一覧順 → ページ順に連結（重複 ID は先勝ち）。
+    各スレに "board"（板名）を付ける。on_page(page, threads) は crawler.crawl_board と同じ。
+    history（url → レス数）を渡すと BOARD_PAGING=adaptive でページ数を決める
+    """
+    adaptive = history is not None and config.BOARD_PAGING == "adaptive"
+
+    def one(b):
+        tag = lambda items: [{**t, "board": b.name} for t in items]
+        cb = (lambda page, items: on_page(page, tag(items))) if on_page else None
+        if not adaptive:
+            return tag(crawler.crawl_board(b.url, b.pages, headers=headers, on_page=cb, **kw)), b.pages
+        items, n = crawler.crawl_adaptive(b.url, history, max_pages=max(b.pages, b.max_pages),
+                                          headers=headers, on_page=cb, **kw)
+        return tag(items), n
+
+    if len(boards) == 1:
+        per_board = [one(boards[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(boards)) as ex:
+            per_board = list(ex.map(one, boards))
+
+    threads, seen = [], set()
+    for b, (items, n) in zip(boards, per_board):
+        fresh = [t for t in items if t["id"] not in seen]
+        seen.update(t["id"] for t in fresh)
+        threads += fresh
+        STATS["pages"] += n
+        STATS["base"] += b.pages
+        STATS["added"] += max(0, n - b.pages)
+        STATS["skipped"] += max(0, b.pages - n)
+        print(f"▶ 板 {b.name}: {n} ページ（基準 {b.pages}）{len(items)} スレ（他の板と重複 {len(items) - len(fresh)}）")
+    return threads
+
+
+def summary() -> str:
+    s = STATS
+    return f"{s['pages']} ページ（基準 {s['base']} / 追加 {s['added']} / 省略 {s['skipped']}）"
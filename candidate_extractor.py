@@ -2,22 +2,12 @@ import os
 import datetime
 import random
 import re
-import requests
-import gspread
-from google.oauth2.service_account import Credentials
-import json
 
-SPREADSHEET_ID = os.environ['SPREADSHEET_ID']
-CLAUDE_API_KEY = os.environ['CLAUDE_API_KEY']
+import clients, http_client
+from history_store import HistoryStore
+from sheet_writer import SheetWriter
 
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
-# service_account.json をシークレットから復元
-with open("service_account.json", "w") as f:
-    f.write(os.environ['GCP_SERVICE_ACCOUNT_JSON'])
-
-CREDS = Credentials.from_service_account_file("service_account.json", scopes=SCOPES)
-GC = gspread.authorize(CREDS)
+# 認証は clients が初回使用時に行う（GCP_SERVICE_ACCOUNT_JSON をメモリ上で読む）
 
 HISTORY_SHEET = "スレ履歴"
 CANDIDATE_SHEET = "投稿候補"
@@ -30,7 +20,7 @@ def fetch_threads():
     threads = []
     for page in range(1, MAX_PAGES + 1):
         url = f"https://www.e-mansion.co.jp/bbs/board/23ku/?page={page}"
-        res = requests.get(url)
+        res = http_client.get(url, target="board")
         matches = re.findall(r'<a href="/bbs/thread/(\d+)/"[\s\S]*?<div class="oneliner title"[^>]*>([\s\S]*?)</div>[\s\S]*?<span class="num_of_item">(\d+)</span>', res.text)
         for tid, title, count in matches:
             threads.append({
@@ -42,23 +32,23 @@ def fetch_threads():
 
 
 def load_history():
-    sheet = GC.open_by_key(SPREADSHEET_ID).worksheet(HISTORY_SHEET)
-    data = sheet.get_all_values()[1:]
-    return {row[0]: int(row[1]) for row in data if len(row) > 1 and row[1].isdigit()}
+    store = HistoryStore(clients.spreadsheet().worksheet(HISTORY_SHEET))
+    store.load()
+    return store
 
 
-def save_history(history):
-    sheet = GC.open_by_key(SPREADSHEET_ID).worksheet(HISTORY_SHEET)
-    rows = [[url, count, datetime.datetime.now().strftime("%Y/%m/%d")] for url, count in history.items()]
-    sheet.clear()
-    sheet.append_row(["スレURL", "取得時のレス数", "最終取得日"])
-    sheet.append_rows(rows)
+def save_history(store, updated, seen):
+    # 変更行の batch_update と新規行の append だけ（clear しない）
+    store.touch(seen)
+    for url, count in updated.items():
+        store.set(url, count)
+    store.flush()
 
 
 def fetch_thread_text(url):
     text = ""
     for i in range(1, 6):
-        html = requests.get(f"{url}?page={i}").text
+        html = http_client.get(f"{url}?page={i}", target="thread").text
         posts = re.findall(r'<p itemprop="commentText">([\s\S]*?)</p>', html)
         for post in posts:
             plain = re.sub(r'<[^>]+>', '', post).replace('\u3000', ' ').strip()
@@ -81,10 +71,11 @@ def judge_risk(text):
             "messages": [{"role": "user", "content": prompt}]
         }
         headers = {
-            "x-api-key": CLAUDE_API_KEY,
+            "x-api-key": clients.claude_key(),
             "anthropic-version": "2023-06-01"
         }
-        res = requests.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
+        res = http_client.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload,
+                               target="claude", retry_status=http_client.RETRY_STATUS)
         content = res.json()["content"][0]["text"].strip()
         risk_line = next((line for line in content.splitlines() if line.startswith("リスク：")), "")
         if "高" in risk_line:
@@ -111,16 +102,18 @@ def generate_summary(text):
         "messages": [{"role": "user", "content": prompt}]
     }
     headers = {
-        "x-api-key": CLAUDE_API_KEY,
+        "x-api-key": clients.claude_key(),
         "anthropic-version": "2023-06-01"
     }
-    res = requests.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
+    res = http_client.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload,
+                           target="claude", retry_status=http_client.RETRY_STATUS)
     return res.json()["content"][0]["text"].strip()
 
 
 def main():
     threads = fetch_threads()
-    history = load_history()
+    store = load_history()
+    history = store.counts()
     updated = {}
     candidates = []
 
@@ -137,20 +130,21 @@ def main():
         updated[url] = count
 
     if os.environ.get("TEST_MODE") != "1":
-        save_history({**history, **updated})
+        save_history(store, updated, [t["url"] for t in threads])
 
     candidates.sort(key=lambda x: x["diff"], reverse=True)
-    write_candidates = GC.open_by_key(SPREADSHEET_ID).worksheet(CANDIDATE_SHEET)
+    write_candidates = SheetWriter(clients.spreadsheet().worksheet(CANDIDATE_SHEET))
     write_candidates.clear()
     write_candidates.append_row(["スレURL", "差分レス数", "タイトル", "炎上リスク判定", "コメント", "投稿可否"])
     for c in candidates[:20]:
         write_candidates.append_row([c["url"], c["diff"], c["title"], c["risk"], c["comment"], c["flag"]])
+    write_candidates.close()
 
     ok_candidates = [c for c in candidates if c["flag"] == "OK"][:POST_COUNT]
     random.shuffle(ok_candidates)
 
     today = datetime.date.today()
-    post_sheet = GC.open_by_key(SPREADSHEET_ID).worksheet(POST_SHEET)
+    post_sheet = SheetWriter(clients.spreadsheet().worksheet(POST_SHEET))
     post_sheet.clear()
     post_sheet.append_row(["日付", "投稿時間", "投稿テキスト", "投稿済み", "スレURL"])
 
@@ -162,6 +156,7 @@ def main():
         utm = f"?utm_source=x&utm_medium=em-{thread_id}&utm_campaign={post_date.strftime('%Y%m%d')}"
         post_text = f"{summary}\n#マンションコミュニティ\n{c['url']}{utm}"
         post_sheet.append_row([post_date.strftime("%Y/%m/%d"), time, post_text, "FALSE", c["url"]])
+    post_sheet.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+認証情報と外部クライアント（初回使用時に生成してプロセス内で使い回す）
+  - 資格情報は環境変数からメモリ上で読む（service_account.json 等をディスクに書かない）
+      GCP_SERVICE_ACCOUNT_B64（base64）または GCP_SERVICE_ACCOUNT_JSON（JSON そのまま）
+  - gspread / google-auth / requests_oauthlib は使う時に import（起動と import を軽くする）
+  - 必須の環境変数は import 時ではなく使う時に読む
+"""
+
+import base64, json, os, threading
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+
+_cache, _lock = {}, threading.Lock()
+
+
+def env(name) -> str:
+    """必須の環境変数（無ければ KeyError）"""
+    return os.environ[name]
+
+
+def _once(fn):
+    """引数なし関数の結果をプロセス内で 1 つだけ作る"""
+    def wrapper():
+        with _lock:
+            if fn.__name__ not in _cache:
+                _cache[fn.__name__] = fn()
+            return _cache[fn.__name__]
+    wrapper.__name__, wrapper.__doc__ = fn.__name__, fn.__doc__
+    return wrapper
+
+
+def service_account_info() -> dict:
+    raw = os.getenv("GCP_SERVICE_ACCOUNT_JSON")
+    if not raw:
+        raw = base64.b64decode(env("GCP_SERVICE_ACCOUNT_B64")).decode("utf-8")
+    return json.loads(raw)
+
+
+@_once
+def gspread_client():
+    import gspread
+    from google.oauth2.service_account import Credentials
+    return gspread.authorize(Credentials.from_service_account_info(service_account_info(), scopes=SCOPES))
+
+
+def spreadsheet(key=None):
+    """SPREADSHEET_ID（または key）のスプレッドシート"""
+    return gspread_client().open_by_key(key or env("SPREADSHEET_ID"))
+
+
+def claude_key() -> str:
+    return env("CLAUDE_API_KEY")
+
+
+@_once
+def twitter_auth():
+    """X API v2 用 OAuth1.0a"""
+    from requests_oauthlib import OAuth1
+    return OAuth1(env("TWITTER_API_KEY"), env("TWITTER_API_SECRET"),
+                  env("TWITTER_ACCESS_TOKEN"), env("TWITTER_ACCESS_SECRET"))
+
+
+def reset():
+    """生成済みクライアントを捨てる（テスト・再生で差し替えた後に使う）"""
+    with _lock:
+        _cache.clear()
@@ -1 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+共通設定（すべて環境変数で上書き可能）
+  - 認証情報は扱わない（各スクリプト側で読む）
+"""
 
+import os
+
+
+def _int(name, default):   return int(os.getenv(name, default))
+def _float(name, default): return float(os.getenv(name, default))
+
+
+# ------------ クロール（礼儀正しさの予算） ------------
+CRAWL_WORKERS       = _int("CRAWL_WORKERS", 4)          # スレッドプール数
+CRAWL_MAX_IN_FLIGHT = _int("CRAWL_MAX_IN_FLIGHT", 2)    # 1 ホストあたり同時リクエスト上限
+CRAWL_RATE          = _float("CRAWL_RATE", 1.0)         # 1 ホストあたりトークン補充 (req/s)
+CRAWL_BURST         = _int("CRAWL_BURST", 2)            # トークンバケット容量
+CRAWL_RETRY         = _int("CRAWL_RETRY", 3)            # 最大試行回数
+
+# ------------ 巡回する板（boards.py） ------------
+BOARDS_FILE         = os.getenv("BOARDS_FILE", "")          # 板一覧 JSON。空なら 23 区板のみ
+BOARD_PAGES         = _int("BOARD_PAGES", 3)                # 板毎のクロールページ数の既定値（fixed 時・比較の基準）
+BOARD_PAGING        = os.getenv("BOARD_PAGING", "adaptive") # adaptive（履歴との差分で深さを決める）/ fixed
+BOARD_MAX_PAGES     = _int("BOARD_MAX_PAGES", 10)           # adaptive の上限ページ数
+BOARD_QUIET_PAGES   = _int("BOARD_QUIET_PAGES", 2)          # 差分の無いページがこれだけ続いたら止める
+POST_COUNT          = _int("POST_COUNT", 5)                 # 投稿予定の総数（板毎 quota の既定値）
+
+# ------------ 共有 HTTP クライアント ------------
+HTTP_POOL_SIZE      = _int("HTTP_POOL_SIZE", 8)           # ホスト毎の keep-alive 接続数
+HTTP_CONNECT_RETRY  = _int("HTTP_CONNECT_RETRY", 2)       # 接続エラー時のアダプタ内再試行
+HTTP_RETRY          = _int("HTTP_RETRY", 3)               # ステータス・通信エラーを含む最大試行回数
+HTTP_BACKOFF_CAP    = _float("HTTP_BACKOFF_CAP", _float("CRAWL_BACKOFF_CAP", 30.0))  # バックオフ上限 (秒)
+HTTP_TIMEOUT        = _float("HTTP_TIMEOUT", 15)          # 既定タイムアウト (秒)
+HTTP_TIMEOUTS       = os.getenv("HTTP_TIMEOUTS", "api.twitter.com=30")  # "host=秒,..." で個別指定
+
+# ------------ スレページキャッシュ ------------
+THREAD_CACHE_DIR    = os.getenv("THREAD_CACHE_DIR", ".cache/thread_pages")  # 空文字でディスク無効
+THREAD_CACHE_TTL_DAYS = _float("THREAD_CACHE_TTL_DAYS", 14)   # 今回読まなかったスレはこの日数で削除
+THREAD_CACHE_MAX_FILES = _int("THREAD_CACHE_MAX_FILES", 2000)  # 超えたら更新の古い順に削除
+
+# ------------ 差分取得（履歴のレス数ウォーターマーク） ------------
+THREAD_FETCH_MODE   = os.getenv("THREAD_FETCH_MODE", "delta")  # delta / full
+THREAD_PAGE_SIZE    = _int("THREAD_PAGE_SIZE", 50)             # 1 ページあたりのレス数
+THREAD_DELTA_CONTEXT = _int("THREAD_DELTA_CONTEXT", 5)         # 新着の直前に含める既読レス数
+THREAD_DELTA_MAX_PAGES = _int("THREAD_DELTA_MAX_PAGES", 3)     # 新着が多い場合は末尾からこのページ数まで
+
+# ------------ Claude API ------------
+CLAUDE_API_URL      = os.getenv("CLAUDE_API_URL", "https://api.anthropic.com/v1/messages")
+CLAUDE_MODEL        = os.getenv("CLAUDE_MODEL", "claude-3-haiku-20240307")
+CLAUDE_TIMEOUT      = _float("CLAUDE_TIMEOUT", 45)
+CLAUDE_RETRY        = _int("CLAUDE_RETRY", 4)            # 429/5xx 時の最大再試行回数
+JUDGE_WORKERS       = _int("JUDGE_WORKERS", 4)           # judge_risk の同時実行数
+JUDGE_SPECULATE     = _int("JUDGE_SPECULATE", 1)         # 0 = 先行判定しない（走査順に 1 件ずつ。再生ベンチを決定的にする）
+
+# ------------ タイトル生成 ------------
+TITLE_CANDIDATES    = _int("TITLE_CANDIDATES", 5)          # 1 回の呼び出しで出させる候補数
+TITLE_MAX_CALLS     = _int("TITLE_MAX_CALLS", 3)           # 全候補が不合格のときの呼び直しを含む上限
+TITLE_TEMPERATURE   = _float("TITLE_TEMPERATURE", 0.8)     # 候補を散らす（判定は 0 のまま）
+
+# ------------ LLM 結果キャッシュ ------------
+LLM_CACHE_PATH      = os.getenv("LLM_CACHE_PATH", ".cache/llm.sqlite3")  # 空文字で無効
+LLM_CACHE_TTL_DAYS  = _float("LLM_CACHE_TTL_DAYS", 30)
+LLM_CACHE_MAX_ROWS  = _int("LLM_CACHE_MAX_ROWS", 5000)     # 超えたら最終利用の古い順に削除
+CLAUDE_BATCH        = os.getenv("CLAUDE_BATCH") == "1"     # Message Batches API で先行一括処理
+CLAUDE_BATCH_POLL   = _float("CLAUDE_BATCH_POLL", 30)      # ポーリング間隔 (秒)
+CLAUDE_BATCH_TIMEOUT = _float("CLAUDE_BATCH_TIMEOUT", 3600) # これを超えたらキャンセルして同期処理へ
+
+# ------------ 類似スレ（MinHash + LSH） ------------
+NEARDUP_PATH        = os.getenv("NEARDUP_PATH", ".cache/neardup.sqlite3")  # 空文字でメモリ上のみ
+NEARDUP_THRESHOLD   = _float("NEARDUP_THRESHOLD", 0.5)     # 推定 Jaccard がこれ以上なら重複（0 で無効）
+NEARDUP_SHINGLE     = _int("NEARDUP_SHINGLE", 4)           # 文字 n-gram の n
+NEARDUP_PERM        = _int("NEARDUP_PERM", 64)             # 署名の長さ（ビン数）
+NEARDUP_BANDS       = _int("NEARDUP_BANDS", 16)            # LSH の帯数（PERM の約数。64/16 で拾う類似度の目安 ≈ 0.5）
+NEARDUP_TTL_DAYS    = _float("NEARDUP_TTL_DAYS", 180)      # 更新の無いスレの署名を消すまでの日数
+
+# ------------ HTML 抽出 ------------
+HTML_BACKEND        = os.getenv("HTML_BACKEND", "strainer")   # soup / strainer / lxml
+
+# ------------ プロンプト予算 ------------
+PROMPT_BUDGET_CHARS = _int("PROMPT_BUDGET_CHARS", 6000)   # 本文部分の上限文字数（0 で無制限）
+
+# ------------ 事前モデレーション ------------
+PREMOD_TERMS_FILE   = os.getenv("PREMOD_TERMS_FILE", "")   # {"語": 重み, ...} の JSON。空なら既定リスト
+PREMOD_NG_SCORE     = _int("PREMOD_NG_SCORE", 20)          # これ以上で確定 NG（0 で無効）
+PREMOD_TERM_CAP     = _int("PREMOD_TERM_CAP", 3)           # 1 語あたり数える出現数の上限
+
+# ------------ スレ履歴シート ------------
+HISTORY_PRUNE_WEEKS = _int("HISTORY_PRUNE_WEEKS", 0)       # この週数 板で見かけないスレは削除（0 で無効。
+                                                            # main は履歴に追加しないので、消したスレは二度と候補にならない）
+HISTORY_COMPACT_RATIO = _float("HISTORY_COMPACT_RATIO", 0.1)  # 削除対象がこの割合以上で詰め直す
+
+# ------------ 状態の保存先 ------------
+STATE_BACKEND       = os.getenv("STATE_BACKEND", "sheets")        # sheets / sqlite
+STATE_DB_PATH       = os.getenv("STATE_DB_PATH", "state/state.sqlite3")
+
+# ------------ X 投稿キュー ------------
+X_TWEETS_URL        = os.getenv("X_TWEETS_URL", "https://api.twitter.com/2/tweets")
+POST_MAX_ATTEMPTS   = _int("POST_MAX_ATTEMPTS", 3)         # 1 投稿あたりの失敗の上限（実行をまたいで数える）
+POST_RETRY          = _int("POST_RETRY", 2)                # 1 回の実行での送信回数（5xx・通信エラー時）
+POST_INTERVAL       = _float("POST_INTERVAL", 0)           # 投稿の最小間隔 (秒)
+POST_RATE_WAIT_MAX  = _float("POST_RATE_WAIT_MAX", 900)    # レート枠のリセット待ちの上限 (秒)。超えたら次回へ
+POST_CURSOR_PATH    = os.getenv("POST_CURSOR_PATH", "state/post_cursor.json")  # sheets の読み始め行。空文字で無効
+
+# ------------ メトリクス ------------
+METRICS_DIR         = os.getenv("METRICS_DIR", "metrics")   # 空文字で出力しない
+PROFILE             = os.getenv("PROFILE", "")              # cprofile / tracemalloc
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+並列クローラ（ホスト単位のレート制御つき）
+  - ホスト毎トークンバケット ＋ 同時実行数上限
+  - 取得は http_client（共有 Session）。403/429/5xx/通信エラーは共通ポリシーで再試行
+  - 結果は常に入力 URL の順序で返す（重複排除・並び順は従来どおり）
+"""
+
+import html, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+import config, extract, http_client
+
+THREAD_URL = "https://www.e-mansion.co.jp/bbs/thread/{tid}/"
+
+
+# ------------ 1. レートリミッタ ------------
+class TokenBucket:
+    """rate (トークン/秒) で補充、capacity まで貯まるバケット"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate, self.capacity = rate, max(1, capacity)
+        self.tokens, self.stamp = float(self.capacity), time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """ホストごとにトークンバケットと同時実行セマフォを持つ"""
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        self.rate  = config.CRAWL_RATE if rate is None else rate
+        self.burst = config.CRAWL_BURST if burst is None else burst
+        self.max_in_flight = config.CRAWL_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self._hosts, self._lock = {}, threading.Lock()
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                bucket = TokenBucket(self.rate, self.burst) if self.rate > 0 else None
+                self._hosts[host] = (bucket, threading.BoundedSemaphore(max(1, self.max_in_flight)))
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url):
+        bucket, sem = self._host(urlsplit(url).netloc)
+        with sem:
+            if bucket:
+                bucket.acquire()
+            yield
+
+
+LIMITER = HostLimiter()   # プロセス内で共有（同一ホストへの総量を抑える）
+
+
+# ------------ 2. 取得 ------------
+BLOCK_STATUS = http_client.RETRY_STATUS | {403}    # 403 は一時的なアクセス制限として再試行
+
+
+def get_with_retry(url, *, headers=None, timeout=30, label=None,
+                   limiter=None, retries=None, target="board"):
+    """200 が返るまで最大 retries 回（試行毎に limiter のスロットを取る）。失敗時は None"""
+    try:
+        res = http_client.get(url, headers=headers, timeout=timeout, label=label, target=target,
+                              limiter=limiter or LIMITER, retry_status=BLOCK_STATUS,
+                              retries=config.CRAWL_RETRY if retries is None else retries)
+    except requests.RequestException:
+        return None
+    return res if res.status_code == 200 else None
+
+
+def fetch_all(urls, *, labels=None, workers=None, then=None, **kw) -> list:
+    """
+    urls を並列取得し、同じ順序で Response（失敗は None）を返す。
+    then(i, res) を渡すとワーカー内で後処理し、その戻り値を返す。
+    """
+    workers = config.CRAWL_WORKERS if workers is None else workers
+    labels = labels or list(urls)
+    then = then or (lambda i, res: res)
+
+    def one(i):
+        return then(i, get_with_retry(urls[i], label=labels[i], **kw))
+
+    if workers <= 1:
+        return [one(i) for i in range(len(urls))]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(one, range(len(urls))))
+
+
+# ------------ 3. 板クロール ------------
+def parse_board(text: str) -> list[dict]:
+    """板ページ HTML からスレ一覧を抽出（ページ内の出現順）"""
+    out = []
+    for href, count, title in extract.BACKEND.board_items(text):
+        tid = re.search(r"/thread/(\d+)/", href).group(1)
+        count = int(count) if count is not None else 0
+        title = html.unescape(title) if title is not None else "タイトル取得失敗"
+        out.append({"url": THREAD_URL.format(tid=tid), "id": tid, "title": title, "count": count})
+    return out
+
+
+def parse_thread(text: str) -> list[str]:
+    """スレッドページ HTML から本文（commentText）を抽出"""
+    return extract.BACKEND.comments(text)
+
+
+def _fetch_pages(board_url, pages, *, headers=None, on_page=None, **kw) -> list:
+    """pages（ページ番号のリスト）を並列取得してページ毎のスレ一覧（失敗は None）を返す"""
+    urls = [f"{board_url}?page={p}" for p in pages]
+
+    def parse(i, res):
+        if res is None:
+            return None
+        items = parse_board(res.text)
+        if on_page:
+            on_page(pages[i], items)
+        return items
+
+    return fetch_all(urls, labels=[f"page{p}" for p in pages], headers=headers, timeout=30, then=parse, **kw)
+
+
+def _merge(pages, parsed) -> list[dict]:
+    """ページ順に連結（重複 ID は先勝ち）。取得失敗ページはスキップ"""
+    threads, seen_ids = [], set()
+    for p, items in zip(pages, parsed):
+        if items is None:
+            print(f"▶ page{p} 取得失敗、スキップ")
+            continue
+        for t in items:
+            if t["id"] in seen_ids:
+                continue
+            seen_ids.add(t["id"])
+            threads.append(t)
+    return threads
+
+
+def crawl_board(board_url: str, pages: int, *, headers=None, on_page=None, **kw) -> list[dict]:
+    """
+    board_url?page=1..pages を並列取得し、ページ順に連結（重複 ID は先勝ち）。
+    取得失敗ページはスキップ。on_page(page, threads) は各ページの取得直後（完了順）に呼ぶ。
+    """
+    pages = list(range(1, pages + 1))
+    return _merge(pages, _fetch_pages(board_url, pages, headers=headers, on_page=on_page, **kw))
+
+
+def has_delta(items, history, seen=()) -> bool:
+    """履歴にあるスレのレス数が増えているページか（前のページと重なるスレ = seen は除く）"""
+    return any(t["id"] not in seen and t["url"] in history and t["count"] > history[t["url"]] for t in items)
+
+
+def crawl_adaptive(board_url: str, history, *, max_pages, quiet_pages=None, wave=None,
+                   headers=None, on_page=None, **kw) -> tuple[list[dict], int]:
+    """
+    ページ 1 から wave ページずつ取得し、差分（has_delta）の無いページが quiet_pages 続いたら止める。
+    差分が続く限り max_pages まで深く読む。(スレ一覧, 取得したページ数) を返す
+    """
+    quiet_pages = config.BOARD_QUIET_PAGES if quiet_pages is None else quiet_pages
+    wave = max(1, config.CRAWL_MAX_IN_FLIGHT if wave is None else wave)
+    pages, parsed, quiet, seen = [], [], 0, set()
+    while len(pages) < max_pages and quiet < quiet_pages:
+        n = min(wave, quiet_pages - quiet, max_pages - len(pages))     # 止まり得る所より先は読まない
+        batch = list(range(len(pages) + 1, len(pages) + n + 1))
+        for p, items in zip(batch, _fetch_pages(board_url, batch, headers=headers, on_page=on_page, **kw)):
+            pages.append(p)
+            parsed.append(items)
+            if items is not None and quiet < quiet_pages:   # 取得失敗ページは数えない
+                quiet = 0 if has_delta(items, history, seen) else quiet + 1
+                seen.update(t["id"] for t in items)
+    return _merge(pages, parsed), len(pages)
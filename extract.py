@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+HTML 抽出レイヤ（バックエンド切替式）
+  - soup     : 従来どおり html.parser で全体をパース
+  - strainer : SoupStrainer で対象ノードだけを構築（既定・追加依存なし）
+  - lxml     : lxml.html + XPath（lxml がある場合のみ）
+いずれも従来の BeautifulSoup 抽出と同じ結果を返す。
+bs4 / lxml はバックエンドを作る時（＝最初に BACKEND を使う時）に import する。
+"""
+
+import importlib.util, re
+
+import config
+
+HAS_LXML = importlib.util.find_spec("lxml") is not None     # 任意依存
+
+
+def _xclass(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# ------------ バックエンド ------------
+class SoupBackend:
+    """board_items → [(href, 件数 or None, タイトル or None)], comments → [本文], title → str or None"""
+
+    BOARD = COMMENT = TITLE = None
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._bs = BeautifulSoup
+
+    def _soup(self, text, only=None):
+        return self._bs(text, "html.parser", parse_only=only)
+
+    def board_items(self, text):
+        out = []
+        for a in self._soup(text, self.BOARD).select("a.component_thread_list_item"):
+            count_tag = a.select_one("span.num_of_item")
+            title_tag = a.select_one("div.oneliner.title")
+            out.append((a["href"],
+                        count_tag.get_text(strip=True) if count_tag else None,
+                        title_tag.get_text(strip=True) if title_tag else None))
+        return out
+
+    def comments(self, text):
+        return [t.get_text(strip=True) for t in self._soup(text, self.COMMENT).select('p[itemprop="commentText"]')]
+
+    def title(self, text):
+        tag = self._soup(text, self.TITLE).title
+        return tag.get_text(strip=True) if tag else None
+
+
+class StrainerBackend(SoupBackend):
+    def __init__(self):
+        super().__init__()
+        from bs4 import SoupStrainer
+        self.BOARD   = SoupStrainer("a", class_=re.compile(r"(^|\s)component_thread_list_item(\s|$)"))
+        self.COMMENT = SoupStrainer("p", attrs={"itemprop": "commentText"})
+        self.TITLE   = SoupStrainer("title")
+
+
+class LxmlBackend:
+    BOARD = f"//a[{_xclass('component_thread_list_item')}]"
+    COUNT = f".//span[{_xclass('num_of_item')}]"
+    TITLE_DIV = f".//div[{_xclass('oneliner')} and {_xclass('title')}]"
+
+    SKIP = {"script", "style", "template"}      # bs4 の get_text が拾わない要素
+
+    def __init__(self):
+        import lxml.html
+        self._html = lxml.html
+        self.PARSER = lxml.html.HTMLParser(encoding="utf-8")
+
+    @classmethod
+    def _text(cls, el):
+        """get_text(strip=True) 相当（コメント・script 等は除外、tail は親に従う）"""
+        parts = []
+
+        def walk(e, skip):
+            skip = skip or not isinstance(e.tag, str) or e.tag in cls.SKIP
+            if not skip and e.text:
+                parts.append(e.text)
+            for c in e:
+                walk(c, skip)
+                if not skip and c.tail:
+                    parts.append(c.tail)
+
+        walk(el, False)
+        return "".join(s.strip() for s in parts)
+
+    def _tree(self, text):
+        if not text.strip():
+            return None
+        return self._html.fromstring(text.encode("utf-8"), parser=self.PARSER)
+
+    def board_items(self, text):
+        tree, out = self._tree(text), []
+        for a in tree.xpath(self.BOARD) if tree is not None else []:
+            if a.get("href") is None:
+                continue
+            c, t = a.xpath(self.COUNT), a.xpath(self.TITLE_DIV)
+            out.append((a.get("href"),
+                        self._text(c[0]) if c else None,
+                        self._text(t[0]) if t else None))
+        return out
+
+    def comments(self, text):
+        tree = self._tree(text)
+        return [self._text(p) for p in tree.xpath('//p[@itemprop="commentText"]')] if tree is not None else []
+
+    def title(self, text):
+        tree = self._tree(text)
+        t = tree.xpath("//title") if tree is not None else []
+        return self._text(t[0]) if t else None
+
+
+BACKENDS = {"soup": SoupBackend, "strainer": StrainerBackend}
+if HAS_LXML:
+    BACKENDS["lxml"] = LxmlBackend
+
+
+def get(name=None):
+    """名前のバックエンドを返す。未インストールなら strainer にフォールバック"""
+    name = name or config.HTML_BACKEND
+    return BACKENDS.get(name, StrainerBackend)()
+
+
+def __getattr__(name):
+    """extract.BACKEND は初回参照時に作る"""
+    if name == "BACKEND":
+        globals()["BACKEND"] = get()
+        return globals()["BACKEND"]
+    raise AttributeError(name)
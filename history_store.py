@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+スレ履歴シート（URL / 取得時レス数 / 最終取得日）の差分更新
+  - load で 1 回だけ読み、URL → シート行番号の索引を持つ
+  - 変更行は batch_update 1 回、新規スレは append_rows 1 回
+    （clear しないので途中で落ちても既存の履歴は消えない）
+  - 最終取得日 = 板で最後に見かけた日。HISTORY_PRUNE_WEEKS 週より古い行が
+    HISTORY_COMPACT_RATIO 以上たまったら、1 回の batch_update で詰め直す（HISTORY_PRUNE_WEEKS=0 の既定では削除しない）
+"""
+
+import datetime
+
+import config, metrics
+
+HEADER = ["URL", "取得時レス数", "最終取得日"]
+
+
+def _date(s):
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d"):
+        try:
+            return datetime.datetime.strptime(s.strip(), fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+class HistoryStore:
+    def __init__(self, ws, today=None):
+        self.ws = ws
+        self.today = today or datetime.date.today()
+        self.rows = {}          # url → [レス数, 最終取得日]
+        self.index = {}         # url → シート行番号（新規は flush まで無し）
+        self.used = 0           # 使用行数（ヘッダ込み。空シートなら 0）
+        self.dirty = set()
+        self.stats = {"rows": 0, "updated": 0, "appended": 0, "pruned": 0, "calls": 0}
+
+    # ---- 読み込み ----
+    def load(self) -> dict:
+        values = self.ws.get_all_values()
+        self._count("get_all_values")
+        self.used = len(values)
+        for i, r in enumerate(values[1:], start=2):
+            if len(r) > 1 and r[1].isdigit():            # 詰め直し後の空行などは飛ばす
+                self.index[r[0]] = i                     # 重複 URL は後の行を採用（従来どおり）
+                self.rows[r[0]] = [int(r[1]), _date(r[2]) if len(r) > 2 else None]
+        self.stats["rows"] = len(self.rows)
+        return self.counts()
+
+    def counts(self) -> dict:
+        return {u: c for u, (c, _) in self.rows.items()}
+
+    # ---- 更新（バッファ） ----
+    def set(self, url, count):
+        if self.rows.get(url) != [count, self.today]:
+            self.rows[url] = [count, self.today]
+            self.dirty.add(url)
+
+    def touch(self, urls):
+        """板で見かけた既存スレの最終取得日だけ進める"""
+        for u in urls:
+            if u in self.rows and self.rows[u][1] != self.today:
+                self.rows[u][1] = self.today
+                self.dirty.add(u)
+
+    def _row(self, url):
+        count, seen = self.rows[url]
+        return [url, count, (seen or self.today).isoformat()]
+
+    def _count(self, op):
+        self.stats["calls"] += 1
+        metrics.REG.inc("gspread_calls_total", op=op)
+
+    # ---- 書き込み ----
+    def stale(self) -> set:
+        if config.HISTORY_PRUNE_WEEKS <= 0:
+            return set()
+        limit = self.today - datetime.timedelta(weeks=config.HISTORY_PRUNE_WEEKS)
+        return {u for u, (_, seen) in self.rows.items() if seen and seen < limit}
+
+    @metrics.timed("history_flush")
+    def flush(self):
+        stale = self.stale()
+        if stale and len(stale) >= config.HISTORY_COMPACT_RATIO * len(self.rows):
+            self._compact(stale)
+            return
+        old = sorted((u for u in self.dirty if u in self.index), key=self.index.get)
+        new = [u for u in self.dirty if u not in self.index]
+        if old:
+            self.ws.batch_update([{"range": f"A{self.index[u]}:C{self.index[u]}", "values": [self._row(u)]}
+                                  for u in old])
+            self._count("batch_update")
+        if new:
+            head = [] if self.used else [HEADER]
+            self.ws.append_rows(head + [self._row(u) for u in new], table_range="A1")
+            self._count("append_rows")
+            self.used += len(head)
+            for i, u in enumerate(new, start=self.used + 1):
+                self.index[u] = i
+            self.used += len(new)
+        self.stats["updated"] += len(old)
+        self.stats["appended"] += len(new)
+        self.dirty.clear()
+
+    def _compact(self, stale):
+        """ヘッダ＋残す行で A1 から上書きし、余った末尾は空行にする（1 リクエスト）"""
+        keep = [u for u in sorted(self.rows, key=lambda u: (u not in self.index, self.index.get(u, 0)))
+                if u not in stale]
+        values = [HEADER] + [self._row(u) for u in keep]
+        values += [["", "", ""]] * (self.used - len(values))
+        self.ws.batch_update([{"range": f"A1:C{len(values)}", "values": values}])
+        self._count("batch_update")
+        for u in stale:
+            del self.rows[u]
+        self.index = {u: i for i, u in enumerate(keep, start=2)}
+        self.used = len(keep) + 1
+        self.stats["pruned"] += len(stale)
+        self.dirty.clear()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['rows']} 行 / 更新 {s['updated']} / 追加 {s['appended']} / "
+                f"削除 {s['pruned']}（API {s['calls']} 回）")
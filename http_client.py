@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+共有 HTTP クライアント（main / post_to_x / candidate_extractor から使う）
+  - ホスト毎に 1 つの requests.Session を使い回す（keep-alive・コネクションプール）
+  - 接続エラーは HTTPAdapter（urllib3 Retry）が再試行
+  - ステータスによる再試行は request() の共通ポリシー:
+      ジッタ付き指数バックオフ、Retry-After を優先、429/503/529 はホスト全体で待つ
+      既定は GET なら 429/5xx、GET 以外は 429 のみ（二重投稿を避ける）
+      通信エラーも GET 以外は接続段階の失敗（送っていないもの）だけ再試行
+  - Accept-Encoding: gzip, deflate（brotli があれば br も）
+  - タイムアウトはホスト毎（HTTP_TIMEOUTS）
+"""
+
+import random, threading, time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+from urllib3.util.retry import Retry
+
+import config, metrics
+
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+COOLDOWN_STATUS = frozenset({429, 503, 529})          # レート制限・過負荷
+IDEMPOTENT = frozenset({"GET", "HEAD", "OPTIONS"})
+
+try:
+    import brotli  # noqa: F401  urllib3 が br を展開できるときだけ申告する
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+_sessions, _cooldown, _lock = {}, {}, threading.Lock()   # ホスト → Session / 再開時刻
+
+
+def _timeouts() -> dict:
+    """HTTP_TIMEOUTS="host=秒,host=秒" → {host: 秒}"""
+    out = {}
+    for item in filter(None, (s.strip() for s in config.HTTP_TIMEOUTS.split(","))):
+        host, _, sec = item.partition("=")
+        out[host.strip()] = float(sec)
+    return out
+
+
+TIMEOUTS = _timeouts()
+
+
+def timeout_for(url) -> float:
+    return TIMEOUTS.get(urlsplit(url).hostname, config.HTTP_TIMEOUT)
+
+
+def session(url) -> requests.Session:
+    """url のホスト用の Session（初回に作成）"""
+    host = urlsplit(url).netloc
+    with _lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE,
+                max_retries=Retry(total=None, connect=config.HTTP_CONNECT_RETRY, read=0, status=0,
+                                  other=0, redirect=5, backoff_factor=0.5, raise_on_status=False))
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["Accept-Encoding"] = ACCEPT_ENCODING
+            _sessions[host] = s
+        return s
+
+
+def backoff(retry: int, res=None) -> float:
+    """2s → 4s → 8s … を上限付きで、半分をジッタにする。Retry-After があれば優先"""
+    base = min(config.HTTP_BACKOFF_CAP, 2 ** (retry + 1))
+    wait = base / 2 + random.uniform(0, base / 2)
+    ra = res.headers.get("Retry-After", "") if res is not None else ""
+    try:
+        wait = max(wait, min(config.HTTP_BACKOFF_CAP, float(ra)))
+    except ValueError:
+        pass
+    return wait
+
+
+def before_send(e) -> bool:
+    """接続段階の失敗か（接続タイムアウト・名前解決や接続の失敗。リクエストはまだ送っていない）"""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = e.args[0] if isinstance(e, requests.ConnectionError) and e.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (ConnectTimeoutError, NewConnectionError))
+
+
+def _wait_cooldown(host):
+    delay = _cooldown.get(host, 0.0) - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def request(method, url, *, target, retries=None, retry_status=None, limiter=None, label=None, **kw):
+    """
+    共通ポリシーで 1 リクエスト。retry_status 以外の応答はそのまま返し、
+    再試行しきったら最後の応答を返す（通信エラーなら例外）。
+    limiter（crawler.HostLimiter）を渡すと各試行をそのスロット内で送る。
+    """
+    method = method.upper()
+    retries = config.HTTP_RETRY if retries is None else retries
+    if retry_status is None:
+        retry_status = RETRY_STATUS if method in IDEMPOTENT else frozenset({429})
+    kw.setdefault("timeout", timeout_for(url))
+    host, label = urlsplit(url).netloc, label or url
+    for attempt in range(max(1, retries)):
+        _wait_cooldown(host)
+        res = None
+        try:
+            t0 = time.perf_counter()
+            if limiter:
+                with limiter.slot(url):
+                    res = session(url).request(method, url, **kw)
+            else:
+                res = session(url).request(method, url, **kw)
+            metrics.http(target, res, time.perf_counter() - t0)
+            if res.status_code not in retry_status:
+                return res
+            print(f"▶ {label} status={res.status_code} retry={attempt + 1}")
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.http(target, error=e)
+            # 送信済みかもしれない失敗（読み取りタイムアウト・接続断）は冪等なメソッドだけ再試行
+            if attempt + 1 >= retries or (method not in IDEMPOTENT and not before_send(e)):
+                raise
+            print(f"▶ {label} error={e} retry={attempt + 1}")
+        if attempt + 1 >= retries:
+            break
+        metrics.retry(target)
+        wait = backoff(attempt, res)
+        if res is not None and res.status_code in COOLDOWN_STATUS:   # 同じホストへの他スレッドも待たせる
+            with _lock:
+                _cooldown[host] = max(_cooldown.get(host, 0.0), time.monotonic() + wait)
+        time.sleep(wait)                                     # limiter のスロットは解放済みで待つ
+    return res
+
+
+def get(url, *, target="http", **kw):
+    return request("GET", url, target=target, **kw)
+
+
+def post(url, *, target="http", **kw):
+    return request("POST", url, target=target, **kw)
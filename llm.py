@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Claude Messages API クライアント
+  - 429 / 529 / 5xx は http_client の共通ポリシーで再試行（retry-after 優先、全スレッドで待機を共有）
+  - 同一プロンプト・モデルの応答は llm_cache から返し API を呼ばない
+  - prefetch_batch : Message Batches API でまとめて処理し、結果を先に用意しておく
+  - map_ordered : 上限付きワーカープールで並列実行し、入力順で結果を返す
+"""
+
+import json, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import config, http_client, llm_cache, metrics
+
+RETRY_STATUS = {429, 500, 502, 503, 504, 529}
+
+_batched = {}                                # バッチで得た応答（キャッシュキー → 本文）
+
+
+def claude_call(prompt, max_tokens, api_key=None, temperature=0):
+    """本文テキストを返す（キャッシュ優先）。再試行しきれなければ例外"""
+    key = llm_cache.CACHE.key(config.CLAUDE_MODEL, max_tokens, prompt, temperature)
+    if key in _batched:
+        return _batched[key]
+    hit = llm_cache.CACHE.get(key)
+    if hit is not None:
+        return hit
+    t0 = time.monotonic()
+    text = _post(prompt, max_tokens, api_key, temperature)
+    llm_cache.CACHE.put(key, config.CLAUDE_MODEL, text, time.monotonic() - t0)
+    return text
+
+
+def _headers(api_key):
+    return {"x-api-key": api_key or os.environ["CLAUDE_API_KEY"], "anthropic-version": "2023-06-01"}
+
+
+def _body(prompt, max_tokens, temperature=0):
+    return {"model": config.CLAUDE_MODEL, "temperature": temperature, "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}]}
+
+
+def _post(prompt, max_tokens, api_key, temperature=0):
+    """429/5xx/529 は http_client の共通ポリシーで再試行（レート制限中はホスト全体で待つ）"""
+    res = http_client.post(config.CLAUDE_API_URL, headers=_headers(api_key), json=_body(prompt, max_tokens, temperature),
+                           timeout=config.CLAUDE_TIMEOUT, target="claude",
+                           retries=config.CLAUDE_RETRY + 1, retry_status=RETRY_STATUS)
+    res.raise_for_status()
+    data = res.json()
+    metrics.tokens(data.get("usage", {}))
+    return data["content"][0]["text"].strip()
+
+
+# ------------ Message Batches ------------
+def prefetch_batch(reqs, api_key=None) -> int:
+    """
+    [(prompt, max_tokens[, temperature]), ...] を 1 バッチで投げ、終わるまでポーリングして結果を保持する。
+    失敗・タイムアウト・個別エラー分は何もしない（後続の claude_call が同期で処理）。
+    戻り値は取得できた件数。
+    """
+    url, headers = config.CLAUDE_API_URL.rstrip("/") + "/batches", _headers(api_key)
+    todo = {}
+    for prompt, max_tokens, *temperature in reqs:
+        key = llm_cache.CACHE.key(config.CLAUDE_MODEL, max_tokens, prompt, *temperature)
+        if key not in _batched and key not in todo and not llm_cache.CACHE.contains(key):
+            todo[key] = {"custom_id": key, "params": _body(prompt, max_tokens, *temperature)}
+    if not todo:
+        return 0
+
+    try:
+        res = http_client.post(url, headers=headers, json={"requests": list(todo.values())},
+                               timeout=60, target="claude_batch")
+        res.raise_for_status()
+        batch = res.json()
+        print(f"▶ バッチ投入 {batch['id']} ({len(todo)} 件)")
+        deadline = time.monotonic() + config.CLAUDE_BATCH_TIMEOUT
+        while batch["processing_status"] != "ended":
+            if time.monotonic() > deadline:
+                http_client.post(f"{url}/{batch['id']}/cancel", headers=headers, timeout=30,
+                                 target="claude_batch")
+                print(f"▶ バッチ {batch['id']} タイムアウト、同期処理にフォールバック")
+                return 0
+            time.sleep(config.CLAUDE_BATCH_POLL)
+            res = http_client.get(f"{url}/{batch['id']}", headers=headers, timeout=30, target="claude_batch")
+            res.raise_for_status()
+            batch = res.json()
+
+        res = http_client.get(batch["results_url"], headers=headers, timeout=60, target="claude_batch")
+        res.raise_for_status()
+        got = 0
+        for line in res.text.splitlines():
+            if not line.strip():
+                continue
+            r = json.loads(line)
+            if r["custom_id"] not in todo or r["result"]["type"] != "succeeded":
+                continue
+            metrics.tokens(r["result"]["message"].get("usage", {}), kind="batch")
+            text = r["result"]["message"]["content"][0]["text"].strip()
+            _batched[r["custom_id"]] = text
+            llm_cache.CACHE.put(r["custom_id"], config.CLAUDE_MODEL, text, 0.0)
+            got += 1
+        print(f"▶ バッチ結果 {got}/{len(todo)} 件取得")
+        return got
+    except (requests.RequestException, ValueError, KeyError) as e:
+        print(f"▶ バッチ失敗、同期処理にフォールバック: {e}")
+        return 0
+
+
+def map_ordered(fn, items, workers=None, on_error=None):
+    """fn を並列に適用し入力順で返す。例外は on_error(item, e) の戻り値に置き換える"""
+    workers = config.JUDGE_WORKERS if workers is None else workers
+
+    def run(item):
+        try:
+            return fn(item)
+        except Exception as e:
+            if on_error is None:
+                raise
+            return on_error(item, e)
+
+    if workers <= 1:
+        return [run(x) for x in items]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(run, items))
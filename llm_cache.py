@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Claude 応答の永続キャッシュ（SQLite）
+  - キー = sha256(モデル名, max_tokens, プロンプト全文[, temperature])
+    ※ プロンプトはテンプレート＋本文なので、どちらかが変われば別キー
+  - TTL 切れと件数上限（最終利用の古い順）で削除
+  - WAL + busy_timeout で週次実行と手動実行から同時に使える
+"""
+
+import hashlib, os, sqlite3, threading, time
+
+import config
+
+
+class LLMCache:
+    def __init__(self, path=None):
+        self.path = config.LLM_CACHE_PATH if path is None else path
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.saved_sec = 0.0
+        self.db = None
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                                      isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("""CREATE TABLE IF NOT EXISTS llm_cache(
+                key TEXT PRIMARY KEY, model TEXT, response TEXT,
+                elapsed REAL, created REAL, used REAL)""")
+            self.db.execute("CREATE INDEX IF NOT EXISTS llm_cache_used ON llm_cache(used)")
+
+    @staticmethod
+    def key(model, max_tokens, prompt, temperature=0) -> str:
+        extra = f"\0{temperature}" if temperature else ""          # 0 は従来のキーのまま
+        return hashlib.sha256(f"{model}\0{max_tokens}\0{prompt}{extra}".encode("utf-8")).hexdigest()
+
+    def contains(self, key) -> bool:
+        """統計に数えずに有効なエントリの有無だけを見る"""
+        if self.db is None:
+            return False
+        with self.lock:
+            return self.db.execute(
+                "SELECT 1 FROM llm_cache WHERE key=? AND created>?",
+                (key, time.time() - config.LLM_CACHE_TTL_DAYS * 86400)).fetchone() is not None
+
+    def get(self, key):
+        if self.db is None:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT response, elapsed FROM llm_cache WHERE key=? AND created>?",
+                (key, now - config.LLM_CACHE_TTL_DAYS * 86400)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE llm_cache SET used=? WHERE key=?", (now, key))
+            self.hits += 1
+            self.saved_sec += row[1]
+            return row[0]
+
+    def put(self, key, model, response, elapsed):
+        if self.db is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO llm_cache VALUES(?,?,?,?,?,?)",
+                            (key, model, response, elapsed, now, now))
+
+    def evict(self):
+        """TTL 切れと件数上限超過分を削除"""
+        if self.db is None:
+            return
+        with self.lock:
+            self.db.execute("DELETE FROM llm_cache WHERE created<=?",
+                            (time.time() - config.LLM_CACHE_TTL_DAYS * 86400,))
+            self.db.execute("""DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY used DESC LIMIT -1 OFFSET ?)""",
+                            (config.LLM_CACHE_MAX_ROWS,))
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0.0
+        return f"hit={self.hits} miss={self.misses} hit率={ratio:.0%} API時間節約={self.saved_sec:.1f}s"
+
+
+def __getattr__(name):
+    """llm_cache.CACHE は初回参照時に開く（import だけでは DB ファイルを作らない）"""
+    if name == "CACHE":
+        globals()["CACHE"] = LLMCache()
+        return globals()["CACHE"]
+    raise AttributeError(name)
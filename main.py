@@ -3,48 +3,41 @@
 """
 マンションコミュニティ自動投稿スクリプト
   - 金曜23:00JST実行 → 翌週月曜から投稿
-  - URL重複排除・NOKリトライ(5回)・90字CTA固定
+  - URL重複排除・類似スレは 1 件にまとめる・タイトル候補を一括生成して検証（全滅時のみ呼び直し）・90字CTA固定
 """
 
-import os, base64, datetime, random, re, time, requests, html
-from bs4 import BeautifulSoup
-import gspread
-from google.oauth2.service_account import Credentials
+import os, datetime, functools, random, re, threading, requests
+from concurrent.futures import Future
 
-# ------------ 0. 定数 ------------
-SPREADSHEET_ID = os.environ["SPREADSHEET_ID"]
-CLAUDE_API_KEY = os.environ["CLAUDE_API_KEY"]
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+import boards, clients, config, crawler, extract, http_client, llm, llm_cache, metrics, neardup, pipeline, premod, prompt_budget, state, thread_cache, titles
 
-MAX_PAGES, POST_COUNT = 3, 5
-MAX_RETRY_BASE, MAX_EXTRA_RETRY = 3, 5
+# ------------ 0. 定数 ------------
+@functools.lru_cache(maxsize=1)
+def load_boards() -> list:
+    """板一覧（BOARDS_FILE。既定は 23 区板・3 ページ）。import 時ではなく初回使用時に読む"""
+    return boards.load()
 
-HISTORY_SHEET, CANDIDATE_SHEET, POST_SHEET = "スレ履歴", "投稿候補", "投稿予定"
-BANNED_WORDS = ["意味不明","共産主義","中国人","血税","糞尿","悩む","スケベ","低俗","トラブル","酷い","劣等感","三流","タイトル"]
-MAX_TITLE_LEN   = 90
+def post_count() -> int:
+    return min(config.POST_COUNT, sum(b.quota for b in load_boards()))
 
-# ------------ 1. Google 認証 ------------
-sa = base64.b64decode(os.environ["GCP_SERVICE_ACCOUNT_B64"])
-with open("service_account.json","wb") as f: f.write(sa)
-gc = gspread.authorize(Credentials.from_service_account_file("service_account.json",scopes=SCOPES))
+# ------------ 1. 認証（clients が初回使用時に行う。import しても副作用なし） ------------
 
 # ------------ 2. 共通関数 ------------
-def contains_banned(words,text): return any(re.search(re.escape(w),text,re.I) for w in words)
-def claude_call(prompt,max_tokens):
-    res = requests.post("https://api.anthropic.com/v1/messages",
-        headers={"x-api-key":CLAUDE_API_KEY,"anthropic-version":"2023-06-01"},
-        json={"model":"claude-3-haiku-20240307","temperature":0,"max_tokens":max_tokens,
-              "messages":[{"role":"user","content":prompt}]},timeout=45)
-    res.raise_for_status(); return res.json()["content"][0]["text"].strip()
+@metrics.timed("claude_call")
+def claude_call(prompt,max_tokens,temperature=0):
+    return llm.claude_call(prompt,max_tokens,api_key=clients.claude_key(),temperature=temperature)   # 429/5xx は retry-after で再試行
 
 # ------------ 3. スクレイパ ------------
-def fetch_threads() -> list[dict]:
+@metrics.timed("fetch_threads")
+def fetch_threads(on_page=None, history=None) -> list[dict]:
     """
-    23区板を MAX_PAGES 分クロール（重複 ID 除外）。
-    - 403/429 が返ったら指数バックオフで 2 回まで再試行
-    - ページ間の待機時間を 2 秒に延長
+    load_boards() の各板をクロール（板をまたいだ重複 ID も除外）。
+    - history を渡すと、レス数が増えたスレの無いページが続いた所で止める（BOARD_PAGING=adaptive）
+    - 板・ページは並列取得（ホスト毎トークンバケット＋同時実行上限は全板で共有）
+    - 403/429 が返ったらジッタ付き指数バックオフで再試行
+    - 結果はページ順・ページ内順を維持
+    - on_page(page, threads) は各ページ取得直後に呼ばれる（判定の先行開始用）
     """
-    threads, seen_ids = [], set()
     ua = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -52,60 +45,26 @@ def fetch_threads() -> list[dict]:
             "Chrome/124.0.0.0 Safari/537.36"
         )
     }
+    return boards.crawl(load_boards(), history=history, headers=ua, on_page=on_page)
 
-    for page in range(1, MAX_PAGES + 1):
-        url = f"https://www.e-mansion.co.jp/bbs/board/23ku/?page={page}"
-
-        # ---- 最大 3 回まで指数バックオフでリトライ ----
-        success = False
-        for retry in range(3):
-            try:
-                res = requests.get(url, headers=ua, timeout=30)
-                if res.status_code == 200:
-                    success = True
-                    break
-                print(f"▶ page{page} status={res.status_code} retry={retry+1}")
-            except requests.RequestException as e:
-                print(f"▶ page{page} error={e} retry={retry+1}")
-
-            time.sleep(2 ** (retry + 1))   # 2s → 4s → 8s
-
-        if not success:
-            print(f"▶ page{page} 取得失敗、スキップ")
-            continue
-
-        soup = BeautifulSoup(res.text, "html.parser")
-        for a in soup.select("a.component_thread_list_item"):
-            tid = re.search(r"/thread/(\d+)/", a["href"]).group(1)
-            if tid in seen_ids:
-                continue
-            seen_ids.add(tid)
-
-            count_tag = a.select_one("span.num_of_item")
-            title_tag = a.select_one("div.oneliner.title")
-            count = int(count_tag.get_text(strip=True)) if count_tag else 0
-            title = html.unescape(title_tag.get_text(strip=True)) if title_tag else "タイトル取得失敗"
-
-            threads.append(
-                {"url": f"https://www.e-mansion.co.jp/bbs/thread/{tid}/",
-                 "id": tid, "title": title, "count": count})
-
-        time.sleep(2)   # ページ間ディレイを 2 秒に
-
-    return threads
-
-def fetch_thread_text(url,pages=3):
+def fetch_thread_posts(url,pages=3,count=None,since=None):
+    """
+    count（一覧のレス数）を渡すと、前回から変化のないページは取得しない。
+    since（履歴のレス数）も渡すと差分モードで新着レス＋直前の文脈だけを返す。
+    """
     tid=re.search(r'/thread/(\d+)/',url).group(1)
-    ua={"User-Agent":"Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+    if since is not None and count and config.THREAD_FETCH_MODE=="delta":
+        posts=thread_cache.fetch_delta(tid,since,count)
+        if posts: return posts
     posts=[]
     for p in range(1,pages+1):
-        try:
-            r=requests.get(f"https://www.e-mansion.co.jp/bbs/thread/{tid}/?page={p}",headers=ua,timeout=15); r.raise_for_status()
-            soup=BeautifulSoup(r.text,"html.parser")
-            posts += [t.get_text(strip=True) for t in soup.select('p[itemprop="commentText"]')]
-        except requests.RequestException: continue
-        time.sleep(0.3)
-    return "\n".join(posts)
+        posts += thread_cache.CACHE.get_posts(tid,p,count=count) or []
+    return posts
+
+@metrics.timed("fetch_thread_text")
+def fetch_thread_text(url,pages=3,count=None,since=None):
+    """プロンプト用本文（重複除去・PROMPT_BUDGET_CHARS 以内）"""
+    return prompt_budget.build(fetch_thread_posts(url,pages,count,since))
 
 def fetch_true_title(url: str) -> str:
     """
@@ -115,12 +74,12 @@ def fetch_true_title(url: str) -> str:
     """
     ua = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
     try:
-        res = requests.get(url, headers=ua, timeout=15)
+        res = http_client.get(url, headers=ua, target="title", limiter=crawler.LIMITER)
         res.raise_for_status()
-        soup = BeautifulSoup(res.text, "html.parser")
-
         # <title> タグを取得
-        raw = soup.title.get_text(strip=True)
+        raw = extract.BACKEND.title(res.text)
+        if raw is None:
+            return ""
 
         # ① 先頭の【口コミ掲示板】を削除
         raw = re.sub(r'^【口コミ掲示板】', '', raw)
@@ -129,21 +88,21 @@ def fetch_true_title(url: str) -> str:
         raw = re.sub(r'｜マンション口コミ・評判.*$', '', raw)
 
         return raw.strip()
-    except Exception:
+    except requests.RequestException:        # 再試行は http_client が済ませている
         return ""
 
-# ------------ 4. Sheet util ------------
-def load_history():
-    rows=gc.open_by_key(SPREADSHEET_ID).worksheet(HISTORY_SHEET).get_all_values()[1:]
-    return {r[0]:int(r[1]) for r in rows if len(r)>1 and r[1].isdigit()}
-def save_history(hist):
-    ws=gc.open_by_key(SPREADSHEET_ID).worksheet(HISTORY_SHEET)
-    ws.clear(); ws.append_row(["URL","取得時レス数","最終取得日"])
-    ws.append_rows([[u,c,datetime.date.today().isoformat()] for u,c in hist.items()])
-
-# ------------ 5. Claude ラッパ（プロンプトは変更しない） ------------
-def judge_risk(text):
-    prompt = f"""SNS 炎上リスクのレビューをしてください。
+# ------------ 4. 状態（STATE_BACKEND=sheets / sqlite） ------------
+@metrics.timed("load_history")
+def load_history(st):
+    return st.load_history()        # url → 取得時レス数（sqlite は索引で 1 件ずつ引く）
+@metrics.timed("save_history")
+def save_history(st,counts,seen):
+    """変更行だけ batch_update・新規スレだけ append（clear しない）"""
+    st.save_history(counts,seen)
+
+# ------------ 5. Claude ラッパ（判定プロンプトは変更しない。タイトルは titles） ------------
+def judge_prompt(text):
+    return f"""SNS 炎上リスクのレビューをしてください。
 本文（日本語）について、炎上につながる要素があるか厳格に判定してください。
 
 ## 判定基準
@@ -162,120 +121,113 @@ def judge_risk(text):
 - 条件を満たせない場合は **「ERROR」** とだけ書く
 --- 本文 ---
 {text}"""
+
+@metrics.timed("judge_risk")
+def judge_risk(text,call=claude_call):
+    verdict=premod.prejudge(text)                 # 確定 NG は Claude を呼ばない
+    if verdict: return verdict
     try:
-        ans=claude_call(prompt,200)
+        ans=call(judge_prompt(text),200)
         risk="高" if "リスク：高" in ans else "低"
         return risk,ans,("NG" if risk=="高" else "OK")
     except Exception as e:
         return "高",f"[Error] {e}","NG"
 
-def generate_summary(text,max_retry=MAX_RETRY_BASE):
-    prompt=f"""あなたは X（旧Twitter）向けのコピーライターです。
-掲示板スレッド本文を読み、読者が続きをクリックしたくなる **前向きで長め** の日本語タイトルを 1 本だけ生成してください。
-### 出力仕様（必ず守る）
-1. **タイトル本文のみ** を 1 行で出力
-   - 行頭に「-」「–」「・」など記号を付けない
-   - 接頭辞「タイトル:」や解説文（例: 「禁止語を含まず～」「90文字以内で～」）を付けない
-   - 同一の文を 2 回以上繰り返さない
-   - 改行・かぎ括弧・箇条書き・絵文字・記号説明を付けない
-   - 90 文字以内
-2. 本文冒頭に **地名・駅名・数字** いずれかを入れて目を引く構成にする
-3. 上記を 1 つでも満たせない、または禁止語を 1 語でも含む場合は **NOK** とだけ出力する
-   - NOK 以外の文字を一切書かない
-### 禁止語
-{', '.join(BANNED_WORDS)}
---- 本文 ---
-{text}"""
-    for _ in range(max_retry+1):
-        try:
-            t=claude_call(prompt,80)
-        except Exception: time.sleep(2); continue
-        if "NOK" in t.upper(): return "NOK"
-        t=re.sub(r'\s+',' ',t.strip())
-        t=re.sub(r'^\s*タイトル[:：]\s*','',t)
-        t=re.sub(r'^.*?[「"](.*?)[」"]$',r'\1',t)
-        if contains_banned(BANNED_WORDS,t): time.sleep(1); continue
-        if len(t)>MAX_TITLE_LEN: t=t[:MAX_TITLE_LEN].rstrip("、,。. ")+"…"
-        return t
-    return "NOK"
+@metrics.timed("generate_summary")
+def generate_summary(text,call=claude_call) -> titles.Title:
+    """候補を TITLE_CANDIDATES 本まとめて出させて選ぶ（全滅時のみ呼び直し）。text は "NOK" もあり得る"""
+    return titles.generate(text, call)
 
 # ------------ 6. メイン ------------
 def main():
     print("▶ main() start")
-
-    # 1. スレ抽出 & 差分判定
-    threads = fetch_threads()
-    print(f"▶ 取得スレ数 = {len(threads)}")
-    history = load_history()
-
-    diffs = []
-    for t in sorted(
-        threads,
-        key=lambda x: x["count"] - history.get(x["url"], 0),
-        reverse=True,
-    ):
-        if t["url"] not in history:                         # 新規スレは除外
-            continue
-        if t["count"] - history[t["url"]] <= 0:             # 差分なしは除外
-            continue
-        diffs.append(t)
-        if len(diffs) == 25:
-            break
+    board_list, n_posts = load_boards(), post_count()
+    lap = metrics.laps()
+
+    # 1. スレ抽出 & 差分判定（ページ到着順に先行判定を開始）
+    st = state.get(clients.spreadsheet())
+    history = load_history(st)
+    texts, texts_lock = {}, threading.Lock()  # URL → 本文の Future（類似判定・判定・タイトル生成で共用）
+    stop = threading.Event()                 # pipe.close() で立つ。以降は本文取得も Claude 呼び出しもしない
+
+    def text_of(d):
+        with texts_lock:
+            f, mine = texts.get(d["url"]), False
+            if f is None:
+                f = texts[d["url"]] = Future()
+                mine = True
+        if mine:                             # 最初に要求したスレッドだけが取得する
+            try:
+                pipeline.checkpoint(stop)
+                f.set_result(fetch_thread_text(d["url"], count=d["count"], since=history[d["url"]]))
+            except Exception as e:
+                f.set_exception(e)
+        return f.result()
+
+    def call(prompt, max_tokens, temperature=0):
+        pipeline.checkpoint(stop)
+        return claude_call(prompt, max_tokens, temperature)
+
+    def judge(d):
+        return judge_risk(text_of(d), call)
+
+    title_calls = {}                         # URL → タイトル生成の呼び出し回数
+
+    def make_title(c):                       # タイトル生成（候補一括・全滅時のみ呼び直し）
+        t = generate_summary(text_of(c), call)
+        title_calls[c["url"]] = t.calls
+        return t.text
+
+    clusters = neardup.Clusters(text_of) if config.NEARDUP_THRESHOLD > 0 else None
+    pipe = pipeline.Pipeline(history, judge, make_title, n_posts, stream=not config.CLAUDE_BATCH,
+                             quotas=boards.quotas(board_list), clusters=clusters, stop=stop)
+    threads = fetch_threads(on_page=pipe.feed, history=history)
+    print(f"▶ 取得スレ数 = {len(threads)}  ({boards.summary()})")
+    diffs = pipeline.rank_diffs(threads, history, pipeline.MAX_DIFFS * len(board_list))   # 全板で順位付け
     print(f"▶ 差分候補   = {len(diffs)}")
-
-    # 2. 炎上リスク判定
-    candidates, updated = [], {}
-    for d in diffs:
-        risk, msg, flag = judge_risk(fetch_thread_text(d["url"]))
-        candidates.append({**d, "risk": risk, "comment": msg, "flag": flag})
-        updated[d["url"]] = d["count"]
-
-    ok = [c for c in candidates if c["flag"] == "OK"][:POST_COUNT]
+    lap("crawl")
+
+    # 2. 炎上リスク判定（JUDGE_WORKERS 並列・順位順。類似スレは上位の 1 件だけ。OK が POST_COUNT 件で打ち切り）
+    if config.CLAUDE_BATCH:                  # 全プロンプトを 1 バッチで先に解かせる（類似スレは除く）
+        llm.map_ordered(text_of, diffs)      # 本文を並列に先取り
+        llm.prefetch_batch([(judge_prompt(text_of(d)), 200) for d in diffs
+                            if not (clusters and clusters.match(d)) and not premod.certain_ng(text_of(d))],
+                           api_key=clients.claude_key())
+    candidates, ok = pipe.judge(diffs)
+    updated = {c["url"]: c["count"] for c in candidates}
     random.shuffle(ok)
-    print(f"▶ OK候補     = {len(ok)}")
+    print(f"▶ OK候補     = {len(ok)}  ({pipe.summary()})")
+    lap("judge")
 
     # 3. 投稿候補シートを更新
-    ws_cand = gc.open_by_key(SPREADSHEET_ID).worksheet(CANDIDATE_SHEET)
-    ws_cand.clear()
-    ws_cand.append_row(
-        ["URL", "差分レス数", "スレッドタイトル", "炎上リスク", "コメント", "投稿可否"]
-    )
-    for c in sorted(
-        candidates,
-        key=lambda x: x["count"] - history.get(x["url"], 0),
+    ranked = sorted(
+        ({**c, "diff": c["count"] - history.get(c["url"], 0)} for c in candidates),
+        key=lambda x: x["diff"],
         reverse=True,
-    ):
-        ws_cand.append_row(
-            [
-                c["url"],
-                c["count"] - history.get(c["url"], 0),
-                c["title"],
-                c["risk"],
-                c["comment"],
-                c["flag"],
-            ]
-        )
+    )
+    st.write_candidates(ranked)              # シートは clear + append_rows の 2 リクエスト
+    for b in board_list:
+        if b.sheet:                          # 板別の候補シート
+            st.write_candidates([c for c in ranked if c["board"] == b.name], sheet=b.sheet)
     print(f"▶ 投稿候補シート更新 = {len(candidates)} 行")
+    lap("candidate_sheet")
 
     # 4. 投稿予定シート（最大 14 行・7 日均等配置）
-    ws_post = gc.open_by_key(SPREADSHEET_ID).worksheet(POST_SHEET)
-    ws_post.clear()
-    ws_post.append_row(["日付", "投稿時間", "投稿テキスト", "投稿済み", "URL"])
+    posts = []
 
     today = datetime.date.today()
     base_monday = today + datetime.timedelta(days=((7 - today.weekday()) % 7 or 7))
 
+    if config.CLAUDE_BATCH:
+        llm.prefetch_batch([titles.request(text_of(c)) for c in ok],
+            api_key=clients.claude_key())
+
     scheduled, row_count = set(), 0
     for c in ok:
         if c["url"] in scheduled:
             continue
 
-        # タイトル生成（NOK リトライ）
-        title = "NOK"
-        for _ in range(MAX_EXTRA_RETRY + 1):
-            title = generate_summary(fetch_thread_text(c["url"]))
-            if title.upper() != "NOK":
-                break
+        title = pipe.title(c)                # OK 確定時に生成開始済み
         if title.upper() == "NOK":
             continue
 
@@ -289,27 +241,54 @@ def main():
         utm = f"?utm_source=x&utm_medium=em-{tid}&utm_campaign={post_date:%Y%m%d}"
         post_txt = f"{title}\n#マンションコミュニティ\n{c['url']}{utm}"
 
-        ws_post.append_row(
-            [
-                post_date.strftime("%Y/%m/%d"),
-                time_str,
-                post_txt,
-                "FALSE",
-                c["url"],
-            ]
+        posts.append(
+            {
+                "date": post_date.strftime("%Y/%m/%d"),
+                "time": time_str,
+                "text": post_txt,
+                "url": c["url"],
+            }
         )
         scheduled.add(c["url"])
         row_count += 1
-        if row_count == POST_COUNT:          # 14 行で終了
+        metrics.REG.observe("title_calls", title_calls.get(c["url"], 0))
+        print(f"  {posts[-1]['date']} {time_str}: タイトル生成 {title_calls.get(c['url'], 0)} 回 {c['url']}")
+        if row_count == n_posts:          # 14 行で終了
             break
+    st.write_schedule(posts)
+    pipe.close()
+    lap("schedule")
     print(f"▶ 投稿行数   = {row_count}")
+    thread_cache.CACHE.evict()
+    print(f"▶ スレキャッシュ {thread_cache.CACHE.summary()}")
+    print(f"▶ プロンプト予算 {prompt_budget.summary()}")
+    print(f"▶ 事前判定   {premod.summary()}")
+    print(f"▶ 類似スレ   {neardup.summary()}")
+    print(f"▶ タイトル生成 {titles.summary()}")
+    llm_cache.CACHE.evict()
+    if config.NEARDUP_THRESHOLD > 0:
+        neardup.INDEX.evict()
+    print(f"▶ LLMキャッシュ {llm_cache.CACHE.summary()}")
+    metrics.gauges("board_pages", boards.STATS)
+    metrics.gauges("thread_cache", thread_cache.CACHE.stats)
+    metrics.gauges("pipeline", pipe.stats)
+    metrics.gauges("prompt_budget", prompt_budget.STATS)
+    metrics.gauges("premod", premod.STATS)
+    metrics.gauges("titles", titles.STATS)
+    metrics.gauges("neardup", neardup.STATS)
+    metrics.gauges("llm_cache", {"hit": llm_cache.CACHE.hits, "miss": llm_cache.CACHE.misses,
+                                 "saved_seconds": llm_cache.CACHE.saved_sec})
 
     # 5. 履歴更新
     if os.getenv("TEST_MODE") != "1":
-        save_history({**history, **{u: updated[u] for u in scheduled}})
+        save_history(st, {u: updated[u] for u in scheduled}, {t["url"]: t["count"] for t in threads})
+    print(f"▶ 状態       {st.summary()}")
+    st.close()
+    lap("history")
 
     print("▶ Done")
 
 # ------------ 7. 実行 ------------
 if __name__=="__main__":
-    main()
+    with metrics.run("main"):
+        main()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+実行メトリクス（結果は変えずに計測だけ行う）
+  - stage() / laps() : main の各段階の所要時間
+  - timed()  : 関数呼び出しのレイテンシ分布・例外数
+  - http()   : HTTP ステータス数・バイト数・レイテンシ、retry() で再試行数
+  - tokens() : LLM の入出力トークン数
+  - run(job) : 終了時に METRICS_DIR/<job>.json と <job>.prom（Prometheus textfile）を出力
+               PROFILE=cprofile / tracemalloc でプロファイルも保存
+"""
+
+import cProfile, functools, io, json, os, pstats, threading, time, tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+import config
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PREFIX = "mansion_"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hist = defaultdict(list)        # (name, labels) → 観測値
+        self.counters = defaultdict(float)   # (name, labels) → 値
+        self.gauges = {}                     # (name, labels) → 値
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            self.hist[(name, tuple(sorted(labels.items())))].append(value)
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    # ---- 出力 ----
+    @staticmethod
+    def _pct(xs, q):
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            hist = {k: sorted(v) for k, v in self.hist.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        return {
+            "histograms": [{"name": n, "labels": dict(l), "count": len(v), "sum": round(sum(v), 4),
+                            "p50": round(self._pct(v, .5), 4), "p90": round(self._pct(v, .9), 4),
+                            "p99": round(self._pct(v, .99), 4), "max": round(v[-1], 4)}
+                           for (n, l), v in sorted(hist.items())],
+            "counters": [{"name": n, "labels": dict(l), "value": c} for (n, l), c in sorted(counters.items())],
+            "gauges": [{"name": n, "labels": dict(l), "value": g} for (n, l), g in sorted(gauges.items())],
+        }
+
+    def to_prometheus(self) -> str:
+        def lab(labels, extra=()):
+            items = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+        with self.lock:
+            hist = {k: list(v) for k, v in self.hist.items()}
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        out, typed = [], set()
+        for (n, l), v in sorted(hist.items()):
+            if n not in typed:
+                out.append(f"# TYPE {PREFIX}{n} histogram"); typed.add(n)
+            for b in BUCKETS:
+                out.append(f"{PREFIX}{n}_bucket{lab(l, [('le', b)])} {sum(x <= b for x in v)}")
+            out.append(f"{PREFIX}{n}_bucket{lab(l, [('le', '+Inf')])} {len(v)}")
+            out.append(f"{PREFIX}{n}_sum{lab(l)} {sum(v):.6f}")
+            out.append(f"{PREFIX}{n}_count{lab(l)} {len(v)}")
+        for (n, l), c in sorted(counters.items()):
+            if n not in typed:
+                out.append(f"# TYPE {PREFIX}{n} counter"); typed.add(n)
+            out.append(f"{PREFIX}{n}{lab(l)} {c:g}")
+        for (n, l), g in sorted(gauges.items()):
+            if n not in typed:
+                out.append(f"# TYPE {PREFIX}{n} gauge"); typed.add(n)
+            out.append(f"{PREFIX}{n}{lab(l)} {g:g}")
+        return "\n".join(out) + "\n"
+
+
+REG = Registry()
+
+
+# ------------ 計測 API ------------
+@contextmanager
+def stage(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        REG.observe("stage_seconds", time.perf_counter() - t0, stage=name)
+
+
+def laps():
+    """lap("crawl") のたびに前回からの経過を stage_seconds{stage=...} に記録する"""
+    last = [time.perf_counter()]
+
+    def lap(name):
+        now = time.perf_counter()
+        REG.observe("stage_seconds", now - last[0], stage=name)
+        last[0] = now
+    return lap
+
+
+def gauges(name, values: dict, label="kind"):
+    """各モジュールの STATS 辞書をまとめてゲージに載せる"""
+    for k, v in values.items():
+        REG.set(name, v, **{label: k})
+
+
+def timed(name):
+    """関数のレイテンシを call_seconds{fn=name} に記録するデコレータ"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            t0 = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            except Exception:
+                REG.inc("call_errors_total", fn=name)
+                raise
+            finally:
+                REG.observe("call_seconds", time.perf_counter() - t0, fn=name)
+        return wrapper
+    return deco
+
+
+def http(target, res=None, seconds=None, error=None):
+    """HTTP 1 回分。res があればステータスとボディ長、error なら例外クラス名を記録"""
+    status = str(res.status_code) if res is not None else type(error).__name__
+    REG.inc("http_requests_total", target=target, status=status)
+    if res is not None:
+        REG.inc("http_bytes_total", len(res.content or b""), target=target)
+    if seconds is not None:
+        REG.observe("http_seconds", seconds, target=target)
+
+
+def retry(target):
+    REG.inc("http_retries_total", target=target)
+
+
+def tokens(usage: dict, kind="sync"):
+    REG.inc("llm_tokens_total", usage.get("input_tokens", 0), direction="input", kind=kind)
+    REG.inc("llm_tokens_total", usage.get("output_tokens", 0), direction="output", kind=kind)
+
+
+# ------------ 出力・プロファイル ------------
+def write(job):
+    if not config.METRICS_DIR:
+        return
+    os.makedirs(config.METRICS_DIR, exist_ok=True)
+    base = os.path.join(config.METRICS_DIR, job)
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump({"job": job, "finished_at": time.time(), **REG.to_dict()}, f, ensure_ascii=False, indent=1)
+    tmp = base + ".prom.tmp"                  # node_exporter が途中状態を読まないよう置換で更新
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(REG.to_prometheus())
+    os.replace(tmp, base + ".prom")
+    print(f"▶ メトリクス出力 {base}.json / .prom")
+
+
+@contextmanager
+def run(job):
+    """エントリポイント全体を包む。PROFILE でプロファイラを切り替え"""
+    prof = cProfile.Profile() if config.PROFILE == "cprofile" else None   # メインスレッドのみ
+    if config.PROFILE == "tracemalloc":
+        tracemalloc.start(25)
+    if prof:
+        prof.enable()
+    REG.set("run_started_timestamp_seconds", time.time())
+    try:
+        with stage("total"):
+            yield
+    finally:
+        if prof:
+            prof.disable()
+            if config.METRICS_DIR:
+                os.makedirs(config.METRICS_DIR, exist_ok=True)
+                prof.dump_stats(os.path.join(config.METRICS_DIR, f"{job}.prof"))
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(20)
+            print(buf.getvalue())
+        if config.PROFILE == "tracemalloc":
+            snap = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"▶ tracemalloc peak={peak / 2**20:.1f}MiB")
+            for s in snap.statistics("lineno")[:10]:
+                print(f"   {s}")
+            REG.set("peak_memory_bytes", peak)
+        write(job)
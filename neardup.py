@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+類似スレ（本スレ・Part2・住民板など本文がほぼ同じスレ）の検出
+  - 署名 = 文字 NEARDUP_SHINGLE-gram の MinHash（One Permutation Hashing: 1 回のハッシュで
+    NEARDUP_PERM 個のビンに振り分け各ビンの最小値。空ビンは隣から借りて埋める）
+  - LSH: 署名を NEARDUP_BANDS 個の帯に分け、帯のハッシュが 1 つでも一致したスレだけ比べる
+    （索引を引くだけなので件数が数万に増えても線形走査しない）
+  - 署名と帯は SQLite（NEARDUP_PATH）に保存して実行をまたいで使う。同じスレの署名は
+    要素毎の min で合成する（＝これまでに読んだ本文の和集合の MinHash）
+  - Clusters: 順位順に見て、先に残したスレと推定 Jaccard が NEARDUP_THRESHOLD 以上なら重複
+    （pipeline の判定の走査から呼ぶので、打ち切り後のスレの本文は取得しない）
+"""
+
+import hashlib, os, re, sqlite3, sys, threading, time
+from array import array
+
+import config
+
+EMPTY = (1 << 63) - 1                   # 空ビン（min の単位元）
+_STRIDE = 1 << 56                       # 借りた値に足す（借り元と区別する）
+
+STATS = {"threads": 0, "clusters": 0, "duplicates": 0, "compared": 0, "seconds": 0.0}   # seconds は署名・索引の時間
+_lock = threading.Lock()
+
+
+# ------------ 署名 ------------
+def signature(text) -> list[int]:
+    """本文 → 生の署名（空ビンは EMPTY）。空白は無視"""
+    k, n = config.NEARDUP_PERM, config.NEARDUP_SHINGLE
+    s = re.sub(r"\s+", "", text)
+    sig = [EMPTY] * k
+    for sh in {s[i:i + n] for i in range(max(0, len(s) - n + 1))}:
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+        b, v = h % k, h // k
+        if v < sig[b]:
+            sig[b] = v
+    return sig
+
+
+def merge(a, b) -> list[int]:
+    return [min(x, y) for x, y in zip(a, b)]
+
+
+def densify(sig):
+    """空ビンを右隣の空でないビンの値で埋める。全部空なら None"""
+    k = len(sig)
+    if all(v == EMPTY for v in sig):
+        return None
+    out = list(sig)
+    for i, v in enumerate(sig):
+        step = 1
+        while v == EMPTY:
+            v = sig[(i + step) % k]
+            if v != EMPTY:
+                v += step * _STRIDE
+                break
+            step += 1
+        out[i] = v
+    return out
+
+
+def similarity(a, b) -> float:
+    """推定 Jaccard（一致するビンの割合）"""
+    a, b = densify(a), densify(b)
+    if a is None or b is None:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def bands(sig) -> list[tuple]:
+    """[(帯番号, バケット), ...]。バケットは帯の値の 63bit ハッシュ"""
+    d = densify(sig)
+    if d is None:
+        return []
+    r = len(d) // config.NEARDUP_BANDS
+    out = []
+    for i in range(config.NEARDUP_BANDS):
+        raw = array("Q", d[i * r:(i + 1) * r]).tobytes()
+        out.append((i, int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big") >> 1))
+    return out
+
+
+# ------------ 索引（SQLite） ------------
+class NearDupIndex:
+    def __init__(self, path=None):
+        self.path = config.NEARDUP_PATH if path is None else path
+        self.lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path or ":memory:", timeout=30, check_same_thread=False,
+                                  isolation_level=None)
+        if self.path:
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS neardup_sig(url TEXT PRIMARY KEY, sig BLOB, seen REAL);
+            CREATE TABLE IF NOT EXISTS neardup_band(band INTEGER, bucket INTEGER, url TEXT,
+                PRIMARY KEY(band, bucket, url)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS neardup_band_url ON neardup_band(url);""")
+
+    def get(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT sig FROM neardup_sig WHERE url=?", (url,)).fetchone()
+        return list(array("Q", row[0])) if row else None
+
+    def add(self, url, sig) -> list[int]:
+        """sig を保存済みの署名と合成して保存し、合成後の署名を返す"""
+        old = self.get(url)
+        if old is not None and len(old) == len(sig):
+            sig = merge(old, sig)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("INSERT OR REPLACE INTO neardup_sig VALUES(?,?,?)",
+                                (url, array("Q", sig).tobytes(), time.time()))
+                self.db.execute("DELETE FROM neardup_band WHERE url=?", (url,))
+                self.db.executemany("INSERT OR IGNORE INTO neardup_band VALUES(?,?,?)",
+                                    [(b, h, url) for b, h in bands(sig)])
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+        return sig
+
+    def query(self, sig) -> set:
+        """帯が 1 つでも一致する URL（LSH の候補）"""
+        keys = bands(sig)
+        if not keys:
+            return set()
+        values = ",".join("(?,?)" for _ in keys)
+        with self.lock:
+            rows = self.db.execute(
+                f"WITH q(band, bucket) AS (VALUES {values}) "
+                "SELECT DISTINCT b.url FROM q JOIN neardup_band b ON b.band=q.band AND b.bucket=q.bucket",
+                [x for k in keys for x in k]).fetchall()
+        return {r[0] for r in rows}
+
+    def evict(self):
+        """NEARDUP_TTL_DAYS 日 更新の無いスレを削除"""
+        cutoff = time.time() - config.NEARDUP_TTL_DAYS * 86400
+        with self.lock:
+            self.db.execute("DELETE FROM neardup_band WHERE url IN (SELECT url FROM neardup_sig WHERE seen<=?)",
+                            (cutoff,))
+            self.db.execute("DELETE FROM neardup_sig WHERE seen<=?", (cutoff,))
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM neardup_sig").fetchone()[0]
+
+
+def __getattr__(name):
+    """neardup.INDEX は初回参照時に開く（import だけでは DB ファイルを作らない）"""
+    if name == "INDEX":
+        globals()["INDEX"] = NearDupIndex()
+        return globals()["INDEX"]
+    raise AttributeError(name)
+
+
+# ------------ クラスタリング ------------
+class Clusters:
+    """
+    match(d) を順位順に呼ぶと、先に残したスレと推定 Jaccard が NEARDUP_THRESHOLD 以上なら
+    (代表 URL, 推定 Jaccard) を、そうでなければ None を返して d を代表として残す（貪欲法）。
+    likely(d, above) は判定ワーカー用の見込み（署名を計算済みの上位に類似スレがあるか）で、確定は match。
+    本文は text_of(d) で取得し、署名は索引に合成して保存する
+    """
+
+    def __init__(self, text_of, index=None):
+        self.text_of = text_of
+        self.index = sys.modules[__name__].INDEX if index is None else index     # 初回はここで開く
+        self.sigs, self.kept, self.decided = {}, {}, {}    # URL → 署名 / 代表 URL → 署名 / URL → match の結果
+        self.lock = threading.Lock()
+
+    def sig_of(self, d):
+        """今回の実行での d の署名（保存済みの署名と合成したもの）"""
+        with self.lock:
+            sig = self.sigs.get(d["url"])
+        if sig is None:
+            text = self.text_of(d) or ""                 # 取得はロックの外で
+            t0 = time.perf_counter()
+            raw = signature(text)
+            with self.lock:
+                if d["url"] not in self.sigs:
+                    self.sigs[d["url"]] = self.index.add(d["url"], raw)
+                sig = self.sigs[d["url"]]
+            with _lock:
+                STATS["seconds"] += time.perf_counter() - t0
+        return sig
+
+    def _nearest(self, sig, pool):
+        t0 = time.perf_counter()
+        best, sim, near = None, 0.0, [u for u in self.index.query(sig) if u in pool]
+        for u in near:
+            s = similarity(sig, pool[u])
+            if s > sim:
+                best, sim = u, s
+        with _lock:
+            STATS["compared"] += len(near)
+            STATS["seconds"] += time.perf_counter() - t0
+        return (best, sim) if best is not None and sim >= config.NEARDUP_THRESHOLD else None
+
+    def likely(self, d, above) -> bool:
+        """
+        above（d より上位の候補）に類似スレがあるか。比べるのは署名を計算済みの上位だけで、
+        上位の本文は取得しない（打ち切りでキャンセルされ得る）。d の本文は判定で使うので取得する
+        """
+        sig = self.sig_of(d)
+        with self.lock:
+            pool = {a["url"]: self.sigs[a["url"]] for a in above if a["url"] in self.sigs}
+        return bool(pool) and self._nearest(sig, pool) is not None
+
+    def match(self, d):
+        sig = self.sig_of(d)
+        with self.lock:
+            if d["url"] in self.decided:
+                return self.decided[d["url"]]
+            dup = self._nearest(sig, self.kept)
+            if dup is None:
+                self.kept[d["url"]] = sig
+            self.decided[d["url"]] = dup
+        with _lock:
+            STATS["threads"] += 1
+            STATS["clusters"] += dup is None
+            STATS["duplicates"] += dup is not None
+        return dup
+
+
+def summary() -> str:
+    s = STATS
+    return (f"{s['threads']} スレ → {s['clusters']} 件（重複 {s['duplicates']}） "
+            f"比較 {s['compared']} 回 / {s['seconds']:.2f}s")
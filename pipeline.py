@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+ストリーミング判定パイプライン（早期終了つき）
+  - 板ページが届くたびに差分候補を暫定順位付けし、上位から判定を先行開始
+  - クロール完了後の確定順位で判定結果を走査し、OK が確定した時点でタイトル生成を開始
+  - OK が post_count 件そろったら（quotas 指定時は全板の上限に達しても）未着手の判定をキャンセル
+  - JUDGE_SPECULATE=0 なら先行判定せず、確定順位の走査で 1 件ずつ判定する（取得・呼び出しがタイミングに依らない）
+  - clusters（neardup.Clusters）を渡すと類似スレは上位の 1 件だけ判定する
+      判定ワーカーは上位に類似スレがありそうなら Claude を呼ばず、確定順位の走査で match して除く
+  - close() は stop を立ててから実行中の判定・タイトル生成の終了を待つ
+      （judge / titler 側も取得・Claude 呼び出しの前に checkpoint(stop) で止まる）
+出力（OK 候補・その順序）は全件判定してから先頭 post_count 件を取る従来方式と同じ。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+MAX_DIFFS = 25
+DUP = ("-", "類似スレ（上位のスレと重複の見込み）", "DUP")
+
+
+class Stopped(Exception):
+    """close() 後に始まろうとした取得・Claude 呼び出し"""
+
+
+def checkpoint(stop):
+    if stop is not None and stop.is_set():
+        raise Stopped()
+
+
+def rank_diffs(threads, history, limit=MAX_DIFFS) -> list[dict]:
+    """既存スレのうち差分レス数の多い順（同数はページ順）に limit 件"""
+    diffs = []
+    for t in sorted(threads, key=lambda x: x["count"] - history.get(x["url"], 0), reverse=True):
+        if t["url"] not in history:                         # 新規スレは除外
+            continue
+        if t["count"] - history[t["url"]] <= 0:             # 差分なしは除外
+            continue
+        diffs.append(t)
+        if len(diffs) == limit:
+            break
+    return diffs
+
+
+class Pipeline:
+    """
+    judge(d) -> (risk, comment, flag)、titler(c) -> タイトル or "NOK"。
+    stream=False なら先行判定・先行タイトル生成をしない（バッチモード用）。
+    quotas = {板名: 上限} を渡すと d["board"] 毎に OK の件数を制限する（超えた分は OK でも ok に入れない）。
+    clusters（neardup.Clusters）を渡すと類似スレの 2 件目以降を flag="DUP" にして判定・投稿しない。
+    stop（threading.Event）は close() で立つ。judge / titler と共有して取得・呼び出しの前に見る。
+    """
+
+    def __init__(self, history, judge, titler, post_count, workers=None, stream=True, quotas=None,
+                 clusters=None, stop=None):
+        self.history, self.judge_fn, self.titler = history, judge, titler
+        self.stop = threading.Event() if stop is None else stop
+        self.post_count, self.stream, self.clusters = post_count, stream, clusters
+        self.order, self.rank = [], {}         # 順位順の候補 / URL → 順位（クロール中は暫定）
+        self.quotas, self.taken = quotas or {}, {}
+        workers = config.JUDGE_WORKERS if workers is None else workers
+        self.speculate = max(1, workers) if config.JUDGE_SPECULATE else 0   # クロール中に先行判定する件数の上限
+        self.judge_ex = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.title_ex = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.seen, self.verdicts, self.titles = {}, {}, {}
+        self.lock = threading.Lock()
+        self.stats = {"judged": 0, "speculative_wasted": 0, "cancelled": 0, "duplicates": 0}
+
+    def _judge(self, d, ahead=True):
+        checkpoint(self.stop)
+        try:
+            if ahead and self.clusters:
+                order = self.order
+                if self.clusters.likely(d, order[:self.rank.get(d["url"], len(order))]):
+                    return DUP                      # 上位に類似スレ。確定は judge() の match
+            return self.judge_fn(d)
+        except Exception as e:
+            return "高", f"[Error] {e}", "NG"
+
+    def _rank(self, ranked):
+        self.order, self.rank = list(ranked), {d["url"]: k for k, d in enumerate(ranked)}
+
+    def _submit(self, d, ahead=True):
+        if d["url"] not in self.verdicts:
+            self.verdicts[d["url"]] = self.judge_ex.submit(self._judge, d, ahead)
+        return self.verdicts[d["url"]]
+
+    # ---- 1. クロール中 ----
+    def feed(self, page, threads):
+        """crawler.crawl_board の on_page。暫定上位を先行判定に回す"""
+        if not self.stream or not self.speculate:
+            return
+        with self.lock:
+            for t in threads:
+                prev = self.seen.get(t["id"])
+                if prev is None or page < prev[0]:          # 確定時と同じく若いページ優先
+                    self.seen[t["id"]] = (page, t)
+            ranked = rank_diffs([t for _, t in sorted(self.seen.values(), key=lambda x: x[0])],
+                                self.history, self.speculate)
+            self._rank(ranked)
+            for d in ranked:
+                self._submit(d)
+
+    # ---- 2. 判定（確定順位で走査、post_count 件の OK で打ち切り） ----
+    def judge(self, diffs):
+        """(candidates, ok) を返す。candidates は判定済み＋未判定（SKIP）を diffs 順で"""
+        with self.lock:
+            wanted = {d["url"] for d in diffs}
+            self._rank(diffs)
+            for u, f in self.verdicts.items():            # 確定順位から外れた先行判定
+                if u not in wanted and not f.cancel():
+                    self.stats["speculative_wasted"] += 1
+            if self.speculate:
+                for d in diffs:
+                    self._submit(d)
+
+        candidates, ok = [], []
+        for i, d in enumerate(diffs):
+            dup = self.clusters.match(d) if self.clusters else None
+            f = self.verdicts.get(d["url"])
+            if dup:                                        # 上位の類似スレが代表。判定・投稿しない
+                self.stats["duplicates"] += 1
+                if f is not None and not f.cancel() and f.result()[2] != "DUP":
+                    self.stats["speculative_wasted"] += 1
+                candidates.append({**d, "risk": "-", "comment": f"類似スレと重複（{dup[0]} / {dup[1]:.2f}）",
+                                   "flag": "DUP"})
+                continue
+            if f is None:                                  # 先行判定なし: ここで判定（類似は match 済み）
+                f = self._submit(d, ahead=False)
+            risk, msg, flag = f.result()
+            if flag == "DUP":                              # 見込みが外れた（上位側も重複だった等）
+                risk, msg, flag = self._judge(d, ahead=False)
+            self.stats["judged"] += 1
+            candidates.append({**d, "risk": risk, "comment": msg, "flag": flag})
+            if flag == "OK" and self._room(d):
+                ok.append(candidates[-1])
+                self.taken[d.get("board")] = self.taken.get(d.get("board"), 0) + 1
+                if self.stream:
+                    self._title(candidates[-1])
+                if len(ok) == self.post_count or self._full():
+                    for rest in diffs[i + 1:]:
+                        f = self.verdicts.get(rest["url"])
+                        if f is None or f.cancel():
+                            self.stats["cancelled"] += 1
+                        candidates.append({**rest, "risk": "-", "comment": "未判定（投稿数充足で打ち切り）",
+                                           "flag": "SKIP"})
+                    break
+        self.judge_ex.shutdown(wait=False, cancel_futures=True)
+        return candidates, ok
+
+    def _room(self, d):
+        b = d.get("board")
+        return b not in self.quotas or self.taken.get(b, 0) < self.quotas[b]
+
+    def _full(self):
+        return bool(self.quotas) and all(self.taken.get(b, 0) >= q for b, q in self.quotas.items())
+
+    # ---- 3. タイトル生成 ----
+    def _title(self, c):
+        if c["url"] not in self.titles:
+            self.titles[c["url"]] = self.title_ex.submit(self._titled, c)
+        return self.titles[c["url"]]
+
+    def _titled(self, c):
+        checkpoint(self.stop)
+        return self.titler(c)
+
+    def title(self, c) -> str:
+        try:
+            return self._title(c).result()
+        except Exception:
+            return "NOK"
+
+    def close(self):
+        """未着手はキャンセル、実行中は次の取得・呼び出しの前で止めて終了を待つ"""
+        self.stop.set()
+        self.judge_ex.shutdown(wait=True, cancel_futures=True)
+        self.title_ex.shutdown(wait=True, cancel_futures=True)
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"判定 {s['judged']} 件 / 打ち切り {s['cancelled']} 件 / 類似スレ {s['duplicates']} 件 / "
+                f"先行判定の空振り {s['speculative_wasted']} 件")
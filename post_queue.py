@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+X 投稿キュー（post_to_x から使う）
+  - state の pending_posts（期日到来分）を due 順に 1 件ずつ投稿
+  - 冪等キー（予定日時＋本文）が投稿済みなら送らない
+  - 送信前に st.claim で「送信中」を記録。結果が分からないまま落ちた・タイムアウトした投稿は
+    再送し、X の重複エラー（403 duplicate content）を投稿済みとして扱う
+  - x-rate-limit-remaining / reset を読み、枠が尽きたらリセットまで待つ
+    （POST_RATE_WAIT_MAX 秒より先なら残りは次回の実行へ）
+  - 5xx・通信エラーは POST_RETRY 回まで送り直し、失敗は ERROR:n として
+    POST_MAX_ATTEMPTS 回まで次回以降も再試行
+"""
+
+import time
+from collections import Counter
+
+import requests
+
+import config, http_client, metrics
+
+
+class RateGate:
+    """直近の応答の x-rate-limit-* から、次に送ってよい時刻まで待つ"""
+
+    def __init__(self):
+        self.remaining, self.reset, self.last = None, 0.0, None
+
+    def update(self, res):
+        try:
+            self.remaining = int(res.headers["x-rate-limit-remaining"])
+            self.reset = float(res.headers["x-rate-limit-reset"])      # epoch 秒
+        except (KeyError, ValueError):
+            if res.status_code == 429:                                  # ヘッダが無ければ Retry-After / バックオフ
+                self.remaining, self.reset = 0, time.time() + http_client.backoff(0, res)
+        if res.status_code == 429:
+            self.remaining = 0
+
+    def wait(self) -> bool:
+        """送ってよければ True（必要なら待つ）。枠のリセットが遠ければ False"""
+        delay = 0.0
+        if self.remaining == 0:
+            delay = self.reset + 1 - time.time()            # reset は秒単位なので 1 秒余裕を見る
+            if delay > config.POST_RATE_WAIT_MAX:
+                return False
+            print(f"▶ レート枠の残り 0: {max(delay, 0):.0f} 秒待機")
+        if self.last is not None:
+            delay = max(delay, self.last + config.POST_INTERVAL - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)
+        if self.remaining == 0:
+            self.remaining = None                       # リセット済み（次の応答で更新）
+        return True
+
+    def sent(self):
+        self.last = time.monotonic()
+
+
+def _outcome(res):
+    """応答 → (ok / limited / error, ツイート ID)"""
+    if res.status_code == 201:
+        try:
+            return "ok", res.json()["data"]["id"]
+        except (ValueError, KeyError, TypeError):
+            return "ok", None
+    if res.status_code == 403 and "duplicate" in res.text.lower():     # 前回の送信が届いていた
+        return "ok", None
+    if res.status_code == 429:
+        return "limited", None
+    return "error", None
+
+
+def _post_one(item, st, send, gate):
+    """1 件投稿して posted / failed を返す。レート枠待ちが長すぎて送れなければ None"""
+    tries = limited = 0
+    while True:
+        if not gate.wait():
+            return None
+        st.claim(item)
+        res = None
+        try:
+            res = send(item.text)
+        except requests.RequestException as e:
+            kind, tweet_id = "error", None
+            print(f"▶ 行{item.row}: 通信エラー {e}")
+        else:
+            gate.update(res)
+            kind, tweet_id = _outcome(res)
+        gate.sent()
+        metrics.REG.inc("posts_sent_total", result=kind)
+        if kind == "limited":
+            st.unclaim(item)                            # 送れていないので失敗に数えない
+            limited += 1
+            if limited > config.POST_RETRY:
+                return None
+            continue
+        if kind == "ok":
+            st.mark_posted(item, True, tweet_id)
+            return "posted"
+        tries += 1
+        item = item._replace(attempts=item.attempts + 1)
+        if tries >= config.POST_RETRY or item.attempts >= config.POST_MAX_ATTEMPTS:
+            st.mark_posted(item, False)
+            return "failed"
+        time.sleep(http_client.backoff(tries - 1, res))
+
+
+def post_due(due, st, send) -> Counter:
+    """due（state.Pending のリスト）を順に投稿して結果を st に書く。send(text) -> Response"""
+    gate, stats = RateGate(), Counter()
+    for i, item in enumerate(due):
+        if st.posted(item.idem):                        # 同じ投稿が別の行・前回の実行で投稿済み
+            st.mark_posted(item, True)
+            stats["skipped"] += 1
+            print(f"行{item.row}: 投稿済みのためスキップ")
+            continue
+        result = _post_one(item, st, send, gate)
+        if result is None:
+            stats["deferred"] += len(due) - i
+            print(f"▶ レート枠が空くまで時間がかかるため残り {len(due) - i} 件は次回に投稿")
+            break
+        stats[result] += 1
+        print(f"行{item.row}: {'投稿完了' if result == 'posted' else '投稿失敗'}")
+    return stats
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+ローカル事前モデレーション
+  - 重み付き語リストを 1 本の正規表現（長い語優先の選択）にコンパイルし 1 パスで走査
+  - スコア = Σ 重み × min(出現数, PREMOD_TERM_CAP)
+  - スコアが PREMOD_NG_SCORE 以上なら確定 NG として Claude 判定を省略
+  - スレ毎の走査時間・文字数を STATS に、走査時間を metrics の premod_scan_seconds に記録
+"""
+
+import json, re, threading, time
+from functools import lru_cache
+
+import config, metrics
+
+DEFAULT_TERMS = {
+    "死ね": 10, "殺す": 10, "自殺": 5, "在日": 5, "ヘイト": 4, "晒": 4, "実名": 4,
+    "外国人": 3, "差別": 3, "逮捕": 3, "詐欺": 3, "暴力": 3, "住所": 3,
+    "中国": 2, "韓国": 2, "宗教": 2, "政治": 2, "訴訟": 2, "事件": 2, "事故": 1,
+}
+
+
+class Matcher:
+    """語 → 重み。search / scan は大文字小文字を区別しない"""
+
+    def __init__(self, weights: dict):
+        self.weights = {w.lower(): v for w, v in weights.items() if w}
+        terms = sorted(self.weights, key=len, reverse=True)
+        self.regex = re.compile("|".join(map(re.escape, terms)), re.I) if terms else None
+
+    def search(self, text) -> bool:
+        return bool(self.regex and self.regex.search(text))
+
+    def scan(self, text) -> dict:
+        """語 → 出現数"""
+        hits = {}
+        if self.regex:
+            for m in self.regex.finditer(text):
+                w = m.group(0).lower()
+                hits[w] = hits.get(w, 0) + 1
+        return hits
+
+    def score(self, hits: dict) -> int:
+        return sum(self.weights[w] * min(n, config.PREMOD_TERM_CAP) for w, n in hits.items())
+
+
+@lru_cache(maxsize=32)
+def compile_terms(words: tuple) -> Matcher:
+    """重みなしの語リスト（BANNED_WORDS など）用"""
+    return Matcher({w: 1 for w in words})
+
+
+def _load_terms() -> dict:
+    if config.PREMOD_TERMS_FILE:
+        with open(config.PREMOD_TERMS_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return DEFAULT_TERMS
+
+
+@lru_cache(maxsize=1)
+def terms() -> Matcher:
+    """PREMOD_TERMS_FILE（未指定なら DEFAULT_TERMS）の Matcher。初回使用時に読む"""
+    return Matcher(_load_terms())
+
+
+STATS = {"threads": 0, "chars": 0, "sec": 0.0, "max_sec": 0.0, "ng": 0}
+_lock = threading.Lock()
+
+
+def certain_ng(text) -> bool:
+    """統計に数えずに確定 NG かどうかだけを見る"""
+    return config.PREMOD_NG_SCORE > 0 and terms().score(terms().scan(text)) >= config.PREMOD_NG_SCORE
+
+
+def prejudge(text):
+    """確定 NG なら judge_risk と同じ (risk, comment, flag)、判断できなければ None"""
+    t0 = time.perf_counter()
+    hits = terms().scan(text)
+    score = terms().score(hits)
+    sec = time.perf_counter() - t0
+    ng = config.PREMOD_NG_SCORE > 0 and score >= config.PREMOD_NG_SCORE
+    with _lock:
+        STATS["threads"] += 1
+        STATS["chars"] += len(text)
+        STATS["sec"] += sec
+        STATS["max_sec"] = max(STATS["max_sec"], sec)
+        STATS["ng"] += ng
+    metrics.REG.observe("premod_scan_seconds", sec)       # スレ毎の分布（JSON・Prometheus 出力）
+    if not ng:
+        return None
+    top = ", ".join(f"{w}×{n}" for w, n in sorted(hits.items(), key=lambda x: -terms().weights[x[0]] * x[1])[:5])
+    return "高", f"リスク：高\n[事前判定] score={score} ({top})", "NG"
+
+
+def summary() -> str:
+    s = STATS
+    return (f"threads={s['threads']} 確定NG={s['ng']}（Claude 省略） "
+            f"走査 {s['chars']} 字 / {s['sec'] * 1000:.1f}ms（最大 {s['max_sec'] * 1000:.1f}ms/スレ）")
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Claude に渡すスレ本文の組み立て（文字数予算つき）
+  - 完全重複・他レスに丸ごと引用されているレスを除去
+  - 予算内で「モデレーション関連語（premod.terms()）を含むレス」→「新しいレス」の順に採用
+  - 採用したレスは元の時系列順で連結
+  - 削った件数・文字数を STATS に集計
+"""
+
+import re, threading
+
+import config, premod
+
+MIN_QUOTE_LEN = 8      # これより短いレスは引用判定しない（「同意」等の誤除去防止）
+
+STATS = {"prompts": 0, "posts_in": 0, "posts_out": 0, "duplicates": 0,
+         "chars_in": 0, "chars_out": 0}
+_lock = threading.Lock()
+
+
+def _norm(s: str) -> str:
+    return re.sub(r"\s+", "", s)
+
+
+def dedupe(posts: list[str]) -> list[int]:
+    """残すレスの添字（時系列順）。同文の再投稿と、長いレスに含まれる引用元を除く"""
+    norms = [_norm(p) for p in posts]
+    keep, seen = [], set()
+    for i, n in enumerate(norms):
+        if not n or n in seen:
+            continue
+        seen.add(n)
+        keep.append(i)
+    return [i for i in keep
+            if len(norms[i]) < MIN_QUOTE_LEN
+            or not any(j != i and len(norms[j]) > len(norms[i]) and norms[i] in norms[j] for j in keep)]
+
+
+def build(posts: list[str], budget=None) -> str:
+    """予算（文字数）内に収めた本文を返す。budget<=0 なら重複除去のみ"""
+    budget = config.PROMPT_BUDGET_CHARS if budget is None else budget
+    idx = dedupe(posts)
+    chosen = idx
+    if budget > 0:
+        # 優先度: 関連語を含む → 新しい
+        order = sorted(idx, key=lambda i: (not premod.terms().search(posts[i]), -i))
+        chosen, used = [], 0
+        for i in order:
+            cost = len(posts[i]) + 1                 # 改行ぶん
+            if used + cost > budget:
+                if not chosen:                       # 1 件目が予算超過なら切り詰めて採用
+                    chosen.append(i)
+                    used = budget
+                continue
+            chosen.append(i)
+            used += cost
+        chosen.sort()
+    text = "\n".join(posts[i] for i in chosen)
+    if budget > 0:
+        text = text[:budget]
+
+    with _lock:
+        STATS["prompts"] += 1
+        STATS["posts_in"] += len(posts)
+        STATS["posts_out"] += len(chosen)
+        STATS["duplicates"] += len(posts) - len(idx)
+        STATS["chars_in"] += len("\n".join(posts))
+        STATS["chars_out"] += len(text)
+    return text
+
+
+def summary() -> str:
+    s = STATS
+    dropped = s["chars_in"] - s["chars_out"]
+    return (f"prompts={s['prompts']} レス {s['posts_out']}/{s['posts_in']} 採用"
+            f"（重複 {s['duplicates']}） 文字 {s['chars_out']}/{s['chars_in']}（削減 {dropped}）")
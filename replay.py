@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+記録・再生ハーネス（main.main / post_to_x.main をネットワークなしで丸ごと実行）
+  python replay.py record main --out fixtures/run1              # 本番に対して記録
+  python replay.py record main --out /tmp/fx --synthetic         # stubs の合成データで記録
+  python replay.py replay main --fixtures fixtures/run1 [--latency 0.05|recorded] [--report out.json]
+
+記録: requests の全 HTTP 応答と gspread の呼び出し（初回読み込み時のシート内容・操作回数）を
+      <DIR>/<job>/http.jsonl, sheets.json に保存。リクエストヘッダ（API キー等）は保存しない
+再生: StubServer が記録済み応答を返し、gspread は FakeClient に差し替える。
+      同じリクエストの応答が複数あれば記録順に返す（429 → 200 の再試行も再現される）
+終了時はジョブのワーカースレッドの終了を待ってから差し替えを解き、以降の送信は（本番へは流さず）例外にする
+"""
+
+import argparse, base64, hashlib, importlib, json, os, random, re, resource, sys, tempfile, threading, time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+
+KEEP_HEADERS = ("content-type", "etag", "last-modified", "retry-after", "cache-control",
+                "x-rate-limit-remaining", "x-rate-limit-reset")
+DUMMY_ENV = {
+    "SPREADSHEET_ID": "replay", "CLAUDE_API_KEY": "replay",
+    "GCP_SERVICE_ACCOUNT_B64": base64.b64encode(b"{}").decode(),
+    "TWITTER_API_KEY": "replay", "TWITTER_API_SECRET": "replay",
+    "TWITTER_ACCESS_TOKEN": "replay", "TWITTER_ACCESS_SECRET": "replay",
+}
+_send = requests.Session.request          # 差し替え前の実体
+JOIN_TIMEOUT = 60.0                        # ジョブ終了後、残ったワーカーを待つ秒数
+
+
+def request_key(method, url, kw, body=True) -> str:
+    """メソッド・URL・クエリ・ボディから応答を引くキー。body=False は URL だけの緩いキー"""
+    raw = f"{method.upper()} {url} {sorted((kw.get('params') or {}).items())}"
+    if body:
+        data = kw.get("json")
+        data = json.dumps(data, sort_keys=True, ensure_ascii=False) if data is not None else kw.get("data")
+        raw += f" {data or ''}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _routed(srv):
+    """requests の送信先を srv に向ける（元の URL とキーはヘッダで渡す）"""
+    def request(self, method, url, **kw):
+        u = urlsplit(url)
+        kw["headers"] = {**(kw.get("headers") or {}), "X-Replay-Url": url,
+                         "X-Replay-Key": request_key(method, url, kw),
+                         "X-Replay-Loose": request_key(method, url, kw, body=False)}
+        kw.pop("params", None)
+        return _send(self, method, f"{srv.url}/{u.netloc}{u.path}", **kw)
+    return request
+
+
+def _refuse(self, method, url, **kw):
+    """ジョブ終了後の送信（スタブを通らない）。本番へは流さずに失敗させる"""
+    raise RuntimeError(f"replay: スタブを通らない HTTP {method} {url}")
+
+
+def _join(before, timeout=JOIN_TIMEOUT) -> list[str]:
+    """ジョブが起こしたスレッド（判定・タイトル生成の executor 等）の終了を待つ。残ったものの名前を返す"""
+    deadline, left = time.monotonic() + timeout, []
+    for t in threading.enumerate():
+        if t in before or t.daemon:
+            continue
+        t.join(max(0.0, deadline - time.monotonic()))
+        if t.is_alive():
+            left.append(t.name)
+    return left
+
+
+def _unpatch(before):
+    """ワーカーの終了を待ってから requests を _refuse に差し替える（_send には戻さない）"""
+    left = _join(before)
+    requests.Session.request = _refuse
+    if left:
+        print(f"▶ replay: 終了しないスレッド {left}", file=sys.stderr)
+    return left
+
+
+def _env(fixtures=None):
+    """config を読む前に呼ぶ。記録・再生ともキャッシュは無効化して全リクエストを通す"""
+    os.environ["THREAD_CACHE_DIR"] = ""
+    os.environ["LLM_CACHE_PATH"] = ""
+    if fixtures is not None:
+        for k, v in DUMMY_ENV.items():
+            os.environ.setdefault(k, v)
+
+
+def _run_job(job):
+    import metrics                                  # _env の後で import する
+    random.seed(0)                                  # 候補のシャッフルを記録時と揃える
+    mod = importlib.import_module(job)
+    with metrics.run(job):
+        mod.main()
+    return metrics
+
+
+# ------------ 1. 記録 ------------
+class SheetRecorder:
+    """gspread クライアントを包み、シート毎の初回 get_all_values と操作回数を控える"""
+
+    def __init__(self, obj, log, title=None):
+        self._obj, self._log, self._title = obj, log, title
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if name in ("open_by_key", "worksheet"):
+            return lambda key: SheetRecorder(attr(key), self._log, key if name == "worksheet" else None)
+        if self._title is None or not callable(attr):
+            return attr
+
+        def call(*a, **kw):
+            out = attr(*a, **kw)
+            with self._log["lock"]:
+                self._log["calls"][name] = self._log["calls"].get(name, 0) + 1
+                if name == "get_all_values":
+                    self._log["snapshot"].setdefault(self._title, out)
+            return out
+        return call
+
+
+def _synthetic_route(method, path, query, headers, body):
+    """--synthetic 用。元の URL で e-mansion / Claude / Twitter を模す"""
+    from stubs import board_html, thread_html
+    u = urlsplit(headers.get("X-Replay-Url", ""))
+    page = int(dict(p.split("=") for p in u.query.split("&") if "=" in p).get("page", "1"))
+    if u.path.startswith("/v1/messages"):
+        req = json.loads(body)
+        text = "リスク：低\n該当なし" if req["max_tokens"] == 200 else (
+            "1. 管理の評判まとめ\n2. 渋谷駅徒歩5分のテストマンション、管理の評判まとめ")   # 1 本目は冒頭に地名が無く短い（2 本目を採る）
+        return 200, {}, {"type": "message", "role": "assistant", "model": req.get("model"),
+                         "content": [{"type": "text", "text": text}],
+                         "usage": {"input_tokens": len(req["messages"][0]["content"]), "output_tokens": len(text)}}
+    if u.path.startswith("/2/tweets"):
+        return 201, {"x-rate-limit-remaining": "99", "x-rate-limit-reset": str(int(time.time()) + 900)}, {
+            "data": {"id": "1", "text": json.loads(body)["text"]}}
+    if "/bbs/board/" in u.path:
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, board_html(page)
+    if "/bbs/thread/" in u.path:
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, thread_html(u.path.rstrip("/").split("/")[-1], page)
+    return 404, {}, ""
+
+
+SYNTHETIC_SHEETS = {
+    "main": {"スレ履歴": [["URL", "レス数", "更新日"]] + [
+        [f"https://www.e-mansion.co.jp/bbs/thread/{600000 + i}/", "1", "2026-01-01"]
+        for i in sorted({*range(0, 80, 2), *range(9, 80, 10)})]},    # 末尾 9 は末尾 8 の類似スレ（stubs._comment・_count）
+    "post_to_x": {"投稿予定": [["日付", "投稿時間", "投稿テキスト", "投稿済み", "URL"]] + [
+        ["2026/01/05", f"{8 + i}:00", f"テスト投稿{i}", "FALSE", f"u{i}"] for i in range(5)]},
+}
+
+
+def record(job, out, synthetic=False):
+    _env(fixtures="" if synthetic else None)
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from stubs import FakeClient, StubServer
+
+    os.makedirs(os.path.join(out, job), exist_ok=True)
+    log = {"lock": threading.Lock(), "calls": {}, "snapshot": {}}
+    entries, lock = [], threading.Lock()
+
+    srv = StubServer(_synthetic_route) if synthetic else None
+    send = _routed(srv) if synthetic else _send
+
+    def request(self, method, url, **kw):
+        key, loose = request_key(method, url, kw), request_key(method, url, kw, body=False)
+        t0 = time.perf_counter()
+        res = send(self, method, url, **kw)
+        entry = {"method": method.upper(), "url": url, "key": key, "loose": loose,
+                 "status": res.status_code, "elapsed": round(time.perf_counter() - t0, 4),
+                 "headers": {k: v for k, v in res.headers.items() if k.lower() in KEEP_HEADERS}}
+        try:
+            entry["text"] = res.content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["b64"] = base64.b64encode(res.content).decode()
+        with lock:
+            entries.append(entry)
+        return res
+
+    authorize = gspread.authorize
+    if synthetic:
+        Credentials.from_service_account_info = classmethod(lambda cls, *a, **kw: None)
+        gspread.authorize = lambda *a, **kw: SheetRecorder(FakeClient(SYNTHETIC_SHEETS[job]), log)
+    else:
+        gspread.authorize = lambda *a, **kw: SheetRecorder(authorize(*a, **kw), log)
+    requests.Session.request = request
+    cwd, before, left = os.getcwd(), set(threading.enumerate()), []
+    tmp = tempfile.TemporaryDirectory() if srv else None
+    try:
+        if srv:
+            srv.__enter__()
+            os.chdir(tmp.name)                      # state/ のファイルを上書きしない
+        _run_job(job)
+    finally:
+        os.chdir(cwd)
+        left = _unpatch(before)
+        gspread.authorize = authorize
+        if srv:
+            srv.__exit__()
+            tmp.cleanup()
+    if left:
+        raise RuntimeError(f"replay: ジョブ終了後もスレッドが残っている {left}")
+
+    with open(os.path.join(out, job, "http.jsonl"), "w", encoding="utf-8") as f:
+        for e in entries:
+            f.write(json.dumps(e, ensure_ascii=False) + "\n")
+    with open(os.path.join(out, job, "sheets.json"), "w", encoding="utf-8") as f:
+        json.dump({"recorded_at": time.time(), "synthetic": synthetic,
+                   "snapshot": log["snapshot"], "calls": log["calls"]}, f, ensure_ascii=False, indent=1)
+    print(f"▶ 記録 {job}: HTTP {len(entries)} 件 / gspread {sum(log['calls'].values())} 回 → {out}/{job}")
+
+
+# ------------ 2. 再生 ------------
+class ReplayRoute:
+    """
+    StubServer の route。記録済み応答を キー → 緩いキー（URL のみ）→ 形（数字を伏せた URL）の順に引く。
+    先行判定・打ち切りのタイミング次第で記録時に取得しなかったスレを読むことがあるため、
+    その場合は同じ形の別スレの応答で代用し approx に数える。
+    """
+
+    def __init__(self, entries, latency=0.0):
+        self.latency = latency                  # 秒 または "recorded"（記録時の応答時間）
+        self.exact, self.loose, self.shape = defaultdict(deque), defaultdict(deque), defaultdict(deque)
+        for e in entries:
+            self.exact[e["key"]].append(e)
+            self.loose[e["loose"]].append(e)
+            self.shape[self._shape(e["method"], e["url"])].append(e)
+        self.lock = threading.Lock()
+        self.hits, self.approx, self.unmatched = defaultdict(int), 0, []
+
+    @staticmethod
+    def _shape(method, url):
+        return re.sub(r"\d+", "N", f"{method.upper()} {url}")
+
+    @staticmethod
+    def _take(q):
+        return q.popleft() if len(q) > 1 else q[0]     # 最後の応答は使い回す
+
+    def __call__(self, method, path, query, headers, body):
+        with self.lock:
+            url = headers.get("X-Replay-Url")
+            q = self.exact.get(headers.get("X-Replay-Key")) or self.loose.get(headers.get("X-Replay-Loose"))
+            if not q:
+                q = self.shape.get(self._shape(method, url))
+                self.approx += bool(q)
+            if not q:
+                self.unmatched.append(f"{method} {url}")
+                return 404, {}, f"replay: 記録なし {method} {url}"
+            e = self._take(q)
+            self.hits[urlsplit(e["url"]).netloc] += 1
+        wait = e["elapsed"] if self.latency == "recorded" else self.latency
+        if wait:
+            time.sleep(wait)
+        payload = base64.b64decode(e["b64"]) if "b64" in e else e.get("text", "")
+        return e["status"], e["headers"], payload
+
+
+def replay(job, fixtures, latency=0.0) -> dict:
+    _env(fixtures)
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from stubs import FakeClient, StubServer
+
+    with open(os.path.join(fixtures, job, "http.jsonl"), encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    with open(os.path.join(fixtures, job, "sheets.json"), encoding="utf-8") as f:
+        sheets = json.load(f)
+
+    route = ReplayRoute(entries, latency)
+    fake = FakeClient(sheets["snapshot"])
+    Credentials.from_service_account_info = classmethod(lambda cls, *a, **kw: None)
+    gspread.authorize = lambda *a, **kw: fake
+    cwd, before = os.getcwd(), set(threading.enumerate())
+    with StubServer(route) as srv, tempfile.TemporaryDirectory() as tmp:
+        os.environ["METRICS_DIR"] = os.path.join(tmp, "metrics")
+        requests.Session.request = _routed(srv)
+        os.chdir(tmp)
+        t0 = time.perf_counter()
+        try:
+            metrics = _run_job(job)
+        finally:
+            wall = time.perf_counter() - t0
+            os.chdir(cwd)
+            left = _unpatch(before)
+    if left:
+        raise RuntimeError(f"replay: ジョブ終了後もスレッドが残っている {left}")
+
+    reg = metrics.REG.to_dict()
+    stages = {h["labels"]["stage"]: h["sum"] for h in reg["histograms"] if h["name"] == "stage_seconds"}
+    gauges = {".".join([g["name"], *map(str, g["labels"].values())]): g["value"] for g in reg["gauges"]}
+    return {
+        "job": job, "latency": latency, "synthetic": sheets.get("synthetic", False), "wall_sec": round(wall, 3),
+        "stages": stages, "gauges": gauges,
+        "http": {"recorded": len(entries), "served": sum(route.hits.values()), "approx": route.approx,
+                 "unmatched": len(route.unmatched), "unmatched_urls": route.unmatched[:20], "by_host": dict(route.hits)},
+        "gspread": {"recorded": sheets["calls"], "replayed": fake.book.calls},
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+# ------------ エントリポイント ------------
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("record", help="HTTP・gspread を記録")
+    p.add_argument("job", choices=["main", "post_to_x"])
+    p.add_argument("--out", required=True)
+    p.add_argument("--synthetic", action="store_true", help="本番ではなく stubs の合成データを記録")
+
+    p = sub.add_parser("replay", help="記録を再生して実行")
+    p.add_argument("job", choices=["main", "post_to_x"])
+    p.add_argument("--fixtures", required=True)
+    p.add_argument("--latency", default="0", help="応答遅延（秒）または recorded")
+    p.add_argument("--report", help="結果 JSON の出力先")
+
+    args = ap.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))     # chdir 後も import できるように
+    if args.cmd == "record":
+        record(args.job, args.out, args.synthetic)
+        return
+    latency = args.latency if args.latency == "recorded" else float(args.latency)
+    result = replay(args.job, os.path.abspath(args.fixtures), latency)
+    print(json.dumps(result, ensure_ascii=False, indent=1))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
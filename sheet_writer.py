@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+バッファ付きシート書き込み
+  - clear / append_row / update_cell を溜め、flush でシート毎に
+    clear 1 回 ＋ append_rows 1 回 ＋ batch_update 1 回にまとめる
+  - with 文の終了時（例外時も）と プロセス終了時に自動 flush
+"""
+
+import atexit
+
+import metrics
+
+_PENDING = []   # 未 flush のライタ（atexit 用）
+
+
+def rowcol_to_a1(row, col) -> str:
+    """gspread.utils.rowcol_to_a1 と同じ（gspread 全体を import しないため）"""
+    label = ""
+    while col:
+        col, r = divmod(col - 1, 26)
+        label = chr(65 + r) + label
+    return f"{label}{row}"
+
+
+class SheetWriter:
+    def __init__(self, ws):
+        self.ws = ws
+        self.cleared, self.rows, self.cells = False, [], {}
+        self.calls = 0          # 実際に発行した API 呼び出し数
+        _PENDING.append(self)
+
+    # ---- バッファ ----
+    def clear(self):
+        self.cleared, self.rows, self.cells = True, [], {}
+
+    def append_row(self, row):
+        self.rows.append(list(row))
+
+    def append_rows(self, rows):
+        self.rows += [list(r) for r in rows]
+
+    def update_cell(self, row, col, value):
+        self.cells[(row, col)] = value      # 同じセルは最後の値だけ送る
+
+    # ---- 送信 ----
+    def _count(self, op):
+        self.calls += 1
+        metrics.REG.inc("gspread_calls_total", op=op)
+
+    @metrics.timed("sheet_flush")
+    def flush(self):
+        if self.cleared:
+            self.ws.clear(); self._count("clear")
+        if self.rows:
+            self.ws.append_rows(self.rows); self._count("append_rows")
+        if self.cells:
+            self.ws.batch_update(
+                [{"range": rowcol_to_a1(r, c), "values": [[v]]} for (r, c), v in self.cells.items()],
+                raw=False)      # update_cell と同じ USER_ENTERED
+            self._count("batch_update")
+        self.cleared, self.rows, self.cells = False, [], {}
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self in _PENDING:
+                _PENDING.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@atexit.register
+def _flush_pending():
+    for w in list(_PENDING):
+        try:
+            w.close()
+        except Exception as e:
+            print(f"▶ シート flush 失敗: {e}")
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+実行状態（スレ履歴・投稿候補・投稿予定）のバックエンド
+  - SheetsState : 従来どおりシートが正。読むたびに get_all_values
+  - SqliteState : ローカル SQLite（WAL）が正。シートは変更行だけ送る表示用
+      threads   … スレ履歴（url 主キー。sheet_row でシート行と対応）
+      snapshots … クロール毎のレス数
+      verdicts  … 炎上リスク判定
+      posts     … 投稿予定（(status, due) 索引で未投稿の期日到来分を引く。idem で重複投稿を防ぐ）
+    DB が空なら初回だけシートから取り込む
+投稿予定の「投稿済み」列は TRUE / FALSE / ERROR:n（n = 失敗回数。POST_MAX_ATTEMPTS で打ち切り）
+STATE_BACKEND=sheets / sqlite で切り替え。main.py・post_to_x.py は get() だけを使う。
+"""
+
+import datetime, hashlib, json, os, sqlite3, threading
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import config, metrics
+from history_store import HistoryStore, _date
+from sheet_writer import SheetWriter
+
+HISTORY_SHEET, CANDIDATE_SHEET, POST_SHEET = "スレ履歴", "投稿候補", "投稿予定"
+CANDIDATE_HEADER = ["URL", "差分レス数", "スレッドタイトル", "炎上リスク", "コメント", "投稿可否"]
+POST_HEADER = ["日付", "投稿時間", "投稿テキスト", "投稿済み", "URL"]
+
+# 期日到来の投稿。key = 行の識別子（シート行 / posts.id）、idem = 冪等キー、attempts = これまでの失敗回数
+Pending = namedtuple("Pending", "key row text idem attempts status")
+
+
+def _due(date_str, time_str):
+    """シートの日付・時刻 → 比較用の datetime（JST の壁時計）。不正なら ValueError"""
+    return datetime.datetime.strptime(f"{date_str} {time_str}", "%Y/%m/%d %H:%M")
+
+
+def idem_key(date_str, time_str, text):
+    """投稿の冪等キー（予定日時＋本文）。予定を書き直しても同じ投稿なら同じキー"""
+    try:
+        when = _due(date_str, time_str).isoformat()                 # "8:00" と "08:00" を揃える
+    except ValueError:
+        when = f"{date_str} {time_str}"
+    return hashlib.sha1(f"{when}\n{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def _attempts(status):
+    """投稿済み列 → 失敗回数（ERROR は 1、ERROR:n は n）"""
+    s = status.strip().upper()
+    if not s.startswith("ERROR"):
+        return 0
+    n = s.partition(":")[2]
+    return int(n) if n.isdigit() else 1
+
+
+def _done(status):
+    """これ以上投稿を試みない行か"""
+    return status.strip().upper() == "TRUE" or _attempts(status) >= config.POST_MAX_ATTEMPTS
+
+
+def _cell(ok, attempts):
+    return "TRUE" if ok else f"ERROR:{attempts}"
+
+
+def _count(op):
+    metrics.REG.inc("gspread_calls_total", op=op)
+
+
+def _rewrite(book, name, header, rows):
+    with SheetWriter(book.worksheet(name)) as w:        # clear + append_rows の 2 リクエスト
+        w.clear()
+        w.append_row(header)
+        w.append_rows(rows)
+
+
+def _candidate_rows(candidates):
+    return [[c["url"], c["diff"], c["title"], c["risk"], c["comment"], c["flag"]] for c in candidates]
+
+
+def _post_rows(posts):
+    return [[p["date"], p["time"], p["text"], "FALSE", p["url"]] for p in posts]
+
+
+def _load_cursor():
+    """post_to_x が次に読み始めるシート行（POST_CURSOR_PATH。無ければ 2 行目）"""
+    try:
+        with open(config.POST_CURSOR_PATH, encoding="utf-8") as f:
+            return max(2, int(json.load(f)["row"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return 2
+
+
+def _save_cursor(row):
+    if config.POST_CURSOR_PATH:
+        os.makedirs(os.path.dirname(config.POST_CURSOR_PATH) or ".", exist_ok=True)
+        with open(config.POST_CURSOR_PATH, "w", encoding="utf-8") as f:
+            json.dump({"row": row}, f)
+
+
+# ------------ 1. シート ------------
+class SheetsState:
+    def __init__(self, book):
+        self.book = book
+        self.store = None
+        self.writer = None      # 投稿済み列の更新（post_to_x）
+        self.states, self.end = {}, 2       # 読んだ行 → 投稿済み列 / 読んだ範囲の次の行
+        self.posted_keys = set()
+
+    def load_history(self) -> Mapping:
+        self.store = HistoryStore(self.book.worksheet(HISTORY_SHEET))
+        return self.store.load()
+
+    def save_history(self, counts: dict, seen: dict):
+        """counts = 更新するレス数、seen = 今回板で見かけたスレ（url → レス数）"""
+        self.store.touch(seen)
+        for u, c in counts.items():
+            self.store.set(u, c)
+        self.store.flush()
+
+    def write_candidates(self, candidates: list[dict], sheet=CANDIDATE_SHEET):
+        _rewrite(self.book, sheet, CANDIDATE_HEADER, _candidate_rows(candidates))
+
+    def write_schedule(self, posts: list[dict]):
+        _rewrite(self.book, POST_SHEET, POST_HEADER, _post_rows(posts))
+        _save_cursor(2)                                 # 書き直したので先頭から
+
+    def pending_posts(self, now) -> list[Pending]:
+        """
+        期日を過ぎた未投稿行。前回の実行で投稿済みになった先頭部分は読まない
+        （カーソル行の 1 つ前も読み、投稿済みでなければ書き直されたとみなして全体を読む）
+        """
+        ws = self.book.worksheet(POST_SHEET)
+        start = _load_cursor()
+        values = None
+        if start > 2:
+            values = ws.get(f"A{start - 1}:E")
+            _count("get")
+        if values and _done((values[0] + [""] * 4)[3]):
+            rows = values[1:]
+        else:
+            start, rows = 2, ws.get_all_values()[1:]    # ヘッダを除外
+            _count("get_all_values")
+        self.writer = SheetWriter(ws)                   # ステータス更新は close 時に batch_update 1 回
+        self.states, self.end = {}, start + len(rows)
+        now = now.replace(tzinfo=None)
+        due = []
+        for idx, row in enumerate(rows, start=start):   # シート行番号
+            date_str, time_str, text, posted, *_ = (row + [""] * 5)[:5]
+            self.states[idx] = posted
+            key = idem_key(date_str, time_str, text)
+            if posted.upper() == "TRUE":
+                self.posted_keys.add(key)
+                continue
+            if _done(posted):
+                continue
+            try:
+                dt_post = _due(date_str, time_str)
+            except ValueError:
+                print(f"行{idx}: 日付/時刻フォーマットエラー")
+                continue
+            if dt_post <= now:
+                due.append(Pending(idx, idx, text, key, _attempts(posted), posted))
+        return due
+
+    def posted(self, idem) -> bool:
+        return idem in self.posted_keys
+
+    def claim(self, item):
+        """シートは送信前の記録をしない（結果不明の再送は X の重複エラーで判定する）"""
+
+    def unclaim(self, item):
+        pass
+
+    def mark_posted(self, item, ok, tweet_id=None):
+        self.states[item.row] = _cell(ok, item.attempts)
+        self.writer.update_cell(item.row, 4, self.states[item.row])     # D 列 = 投稿済み
+        if ok:
+            self.posted_keys.add(item.idem)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            # 先頭から続く投稿済み（または打ち切り）行の次を、次回の読み始めにする
+            _save_cursor(next((i for i in sorted(self.states) if not _done(self.states[i])), self.end))
+
+    def summary(self) -> str:
+        return f"sheets 履歴 {self.store.summary()}" if self.store else "sheets"
+
+
+# ------------ 2. SQLite ------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads(
+    url TEXT PRIMARY KEY, count INTEGER NOT NULL, last_seen TEXT, sheet_row INTEGER);
+CREATE TABLE IF NOT EXISTS snapshots(
+    url TEXT NOT NULL, run TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY(url, run));
+CREATE TABLE IF NOT EXISTS verdicts(
+    run TEXT NOT NULL, url TEXT NOT NULL, diff INTEGER, title TEXT,
+    risk TEXT, comment TEXT, flag TEXT, PRIMARY KEY(run, url));
+CREATE TABLE IF NOT EXISTS posts(
+    id INTEGER PRIMARY KEY, run TEXT NOT NULL, sheet_row INTEGER, due TEXT NOT NULL,
+    date TEXT, time TEXT, text TEXT, url TEXT, status TEXT NOT NULL DEFAULT 'FALSE', posted_at TEXT,
+    idem TEXT, attempts INTEGER NOT NULL DEFAULT 0, tweet_id TEXT);
+CREATE INDEX IF NOT EXISTS posts_pending ON posts(status, due);
+CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class HistoryView(Mapping):
+    """threads 表を dict のように引く（主キー索引で 1 件ずつ・結果はメモ）"""
+
+    def __init__(self, st):
+        self.st, self.memo = st, {}
+
+    def __getitem__(self, url):
+        if url not in self.memo:
+            row = self.st._one("SELECT count FROM threads WHERE url=?", (url,))
+            self.memo[url] = None if row is None else row[0]
+        if self.memo[url] is None:
+            raise KeyError(url)
+        return self.memo[url]
+
+    def __iter__(self):
+        return iter([r[0] for r in self.st._all("SELECT url FROM threads")])
+
+    def __len__(self):
+        return self.st._one("SELECT COUNT(*) FROM threads")[0]
+
+
+class SqliteState:
+    def __init__(self, book, path=None):
+        self.book = book
+        self.path = config.STATE_DB_PATH if path is None else path
+        self.run = datetime.datetime.now().isoformat(timespec="seconds")
+        self.lock = threading.Lock()
+        self.writer, self.marked = None, {}     # 投稿済み列の更新 / シート行 → その行で送った投稿
+        self.stats = {"history_rows_synced": 0, "imported": 0}
+        self.history_summary = ""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._migrate()
+
+    def _one(self, sql, args=()):
+        with self.lock:
+            return self.db.execute(sql, args).fetchone()
+
+    def _all(self, sql, args=()):
+        with self.lock:
+            return self.db.execute(sql, args).fetchall()
+
+    @contextmanager
+    def _tx(self):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def _migrate(self):
+        """posts に冪等キー・失敗回数の列が無い DB（以前の版）に列を足す"""
+        cols = {r[1] for r in self.db.execute("PRAGMA table_info(posts)")}
+        for name, decl in (("idem", "TEXT"), ("attempts", "INTEGER NOT NULL DEFAULT 0"), ("tweet_id", "TEXT")):
+            if name not in cols:
+                self.db.execute(f"ALTER TABLE posts ADD COLUMN {name} {decl}")
+        rows = self.db.execute("SELECT id, date, time, text FROM posts WHERE idem IS NULL").fetchall()
+        if rows:
+            self.db.executemany("UPDATE posts SET idem=? WHERE id=?", [(idem_key(d, t, x), i) for i, d, t, x in rows])
+        self.db.execute("CREATE INDEX IF NOT EXISTS posts_idem ON posts(idem, status)")
+
+    def _meta(self, key):
+        row = self._one("SELECT value FROM meta WHERE key=?", (key,))
+        return row and row[0]
+
+    # ---- 履歴 ----
+    def _import_history(self):
+        store = HistoryStore(self.book.worksheet(HISTORY_SHEET))
+        store.load()
+        with self._tx():
+            self.db.executemany("INSERT OR REPLACE INTO threads VALUES(?,?,?,?)",
+                                [(u, c, seen and seen.isoformat(), store.index[u])
+                                 for u, (c, seen) in store.rows.items()])
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES('history_used', ?)", (str(store.used),))
+        self.stats["imported"] += len(store.rows)
+
+    def load_history(self) -> Mapping:
+        if self._meta("history_used") is None:
+            self._import_history()
+        return HistoryView(self)
+
+    def save_history(self, counts: dict, seen: dict):
+        store = self._sheet_view()                      # DB 更新前の内容＝シート上の内容
+        today = datetime.date.today().isoformat()
+        with self._tx():
+            self.db.executemany("INSERT OR IGNORE INTO snapshots VALUES(?,?,?)",
+                                [(u, self.run, c) for u, c in seen.items()])
+            self.db.executemany("UPDATE threads SET last_seen=? WHERE url=?", [(today, u) for u in seen])
+            self.db.executemany("""INSERT INTO threads(url, count, last_seen) VALUES(?,?,?)
+                                   ON CONFLICT(url) DO UPDATE SET count=excluded.count, last_seen=excluded.last_seen""",
+                                [(u, c, today) for u, c in counts.items()])
+        self._sync_history(store, counts, seen)
+
+    def _sheet_view(self) -> HistoryStore:
+        """シート上の行（sheet_row あり）を索引にした HistoryStore。シートは読まない"""
+        store = HistoryStore(self.book.worksheet(HISTORY_SHEET))
+        for u, c, last, row in self._all("SELECT url, count, last_seen, sheet_row FROM threads "
+                                         "WHERE sheet_row IS NOT NULL"):
+            store.rows[u] = [c, _date(last or "")]
+            store.index[u] = row
+        store.used = int(self._meta("history_used") or 0)
+        store.stats["rows"] = len(store.rows)
+        return store
+
+    def _sync_history(self, store, counts, seen):
+        """変更行だけ HistoryStore で送り、行番号の変化（詰め直しなら削除も）を DB に戻す"""
+        store.touch(seen)
+        for u, c in counts.items():
+            store.set(u, c)
+        before = dict(store.index)
+        store.flush()
+        compacted = bool(store.stats["pruned"])          # 詰め直した場合は全行の行番号を書き直す
+        with self._tx():
+            if compacted:
+                self.db.executemany("DELETE FROM threads WHERE url=?",     # シートと同じく履歴から消す
+                                    [(u,) for u in before if u not in store.index])
+                self.db.execute("UPDATE threads SET sheet_row=NULL WHERE sheet_row IS NOT NULL")
+            self.db.executemany("UPDATE threads SET sheet_row=? WHERE url=?",
+                                [(r, u) for u, r in store.index.items() if compacted or before.get(u) != r])
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES('history_used', ?)", (str(store.used),))
+        self.stats["history_rows_synced"] += store.stats["updated"] + store.stats["appended"]
+        self.history_summary = store.summary()
+
+    # ---- 候補・予定 ----
+    def write_candidates(self, candidates: list[dict], sheet=CANDIDATE_SHEET):
+        """sheet は板別シートのときに指定（判定結果の DB 記録は全板分の 1 回だけ）"""
+        if sheet != CANDIDATE_SHEET:
+            _rewrite(self.book, sheet, CANDIDATE_HEADER, _candidate_rows(candidates))
+            return
+        with self._tx():
+            self.db.executemany("INSERT OR REPLACE INTO verdicts VALUES(?,?,?,?,?,?,?)",
+                                [(self.run, c["url"], c["diff"], c["title"], c["risk"], c["comment"], c["flag"])
+                                 for c in candidates])
+        _rewrite(self.book, CANDIDATE_SHEET, CANDIDATE_HEADER, _candidate_rows(candidates))
+
+    def _insert_posts(self, posts, run):
+        """posts: (シート行, 日付, 時刻, 本文, URL, 状態)。前回の予定で未投稿のものは REPLACED にする"""
+        rows = []
+        for row, date_str, time_str, text, url, status in posts:
+            try:
+                due = _due(date_str, time_str).isoformat(sep=" ")
+            except ValueError:
+                print(f"行{row}: 日付/時刻フォーマットエラー")
+                continue
+            attempts = _attempts(status)
+            status = "TRUE" if status.strip().upper() == "TRUE" else "ERROR" if attempts else "FALSE"
+            rows.append((run, row, due, date_str, time_str, text, url, status,
+                         idem_key(date_str, time_str, text), attempts))
+        with self._tx():
+            self.db.execute("UPDATE posts SET status='REPLACED' WHERE status IN ('FALSE', 'ERROR', 'SENDING')")
+            self.db.execute("UPDATE posts SET sheet_row=NULL WHERE sheet_row IS NOT NULL")
+            self.db.executemany("""INSERT INTO posts(run, sheet_row, due, date, time, text, url, status, idem, attempts)
+                                   VALUES(?,?,?,?,?,?,?,?,?,?)""", rows)
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES('schedule_run', ?)", (run,))
+
+    def write_schedule(self, posts: list[dict]):
+        self._insert_posts([(i, p["date"], p["time"], p["text"], p["url"], "FALSE")
+                            for i, p in enumerate(posts, start=2)], self.run)
+        _rewrite(self.book, POST_SHEET, POST_HEADER, _post_rows(posts))
+
+    def pending_posts(self, now) -> list[Pending]:
+        if self._meta("schedule_run") is None:         # 初回だけシートから取り込む
+            rows = self.book.worksheet(POST_SHEET).get_all_values()[1:]
+            _count("get_all_values")
+            cells = [(i, *(r + [""] * 5)[:5]) for i, r in enumerate(rows, start=2)]
+            self._insert_posts([(i, d, t, text, url, posted) for i, d, t, text, posted, url in cells], "import")
+            self.stats["imported"] += len(rows)
+        self.writer = SheetWriter(self.book.worksheet(POST_SHEET))
+        now = now.replace(tzinfo=None).isoformat(sep=" ", timespec="seconds")
+        # ERROR は POST_MAX_ATTEMPTS 回まで、SENDING（送信中に落ちた）は結果不明として再試行
+        return [Pending(*r) for r in self._all(
+            "SELECT id, sheet_row, text, idem, attempts, status FROM posts "
+            "WHERE status IN ('FALSE', 'ERROR', 'SENDING') AND due<=? AND attempts<? ORDER BY due, id",
+            (now, config.POST_MAX_ATTEMPTS))]
+
+    def posted(self, idem) -> bool:
+        return self._one("SELECT 1 FROM posts WHERE idem=? AND status='TRUE' LIMIT 1", (idem,)) is not None
+
+    def claim(self, item):
+        """送信直前に SENDING を記録（autocommit なので即座に永続化される）"""
+        with self.lock:
+            self.db.execute("UPDATE posts SET status='SENDING' WHERE id=?", (item.key,))
+
+    def unclaim(self, item):
+        """送っていない（429 など）ので元の状態に戻す"""
+        with self.lock:
+            self.db.execute("UPDATE posts SET status=? WHERE id=?", (item.status, item.key))
+
+    def mark_posted(self, item, ok, tweet_id=None):
+        with self.lock:
+            self.db.execute("UPDATE posts SET status=?, attempts=?, tweet_id=?, posted_at=? WHERE id=?",
+                            ("TRUE" if ok else "ERROR", item.attempts, tweet_id,
+                             datetime.datetime.now().isoformat(timespec="seconds"), item.key))
+        if item.row:
+            self.marked[item.row] = item
+            self.writer.update_cell(item.row, 4, _cell(ok, item.attempts))
+
+    def _drop_moved(self):
+        """
+        投稿済み列の更新のうち、送信中に予定が書き直されて別の投稿の行になったものは送らない
+        （DB の sheet_row と、シートの本文・URL を照合。シートは 1 回だけ読む）
+        """
+        if not self.marked:
+            return
+        lo, hi = min(self.marked), max(self.marked)
+        got = self.writer.ws.get(f"C{lo}:E{hi}")
+        _count("get")
+        for row, item in self.marked.items():
+            text, _, url = ((got[row - lo] if row - lo < len(got) else []) + [""] * 3)[:3]
+            cur = self._one("SELECT sheet_row, url FROM posts WHERE id=?", (item.key,))
+            if cur and cur[0] == row and (text == item.text or (cur[1] and url == cur[1])):
+                continue
+            self.writer.cells.pop((row, 4), None)
+            print(f"行{row}: 予定が書き直されているので投稿済み列は更新しない")
+
+    def close(self):
+        try:
+            if self.writer:
+                self._drop_moved()
+                self.writer.close()
+        finally:
+            self.db.close()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"sqlite {self.path} 取り込み {s['imported']} 行 / "
+                f"履歴シート同期 {s['history_rows_synced']} 行（{self.history_summary or '-'}）")
+
+
+BACKENDS = {"sheets": SheetsState, "sqlite": SqliteState}
+
+
+def get(book, backend=None):
+    name = backend or config.STATE_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"STATE_BACKEND={name!r} は未対応です（{' / '.join(BACKENDS)}）")
+    return BACKENDS[name](book)
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク・動作確認用のローカルスタブ
+  - StubServer : ルート関数で応答を返す HTTP サーバ（遅延・接続確立コスト注入可）
+  - board_html / thread_html : e-mansion と同じ構造のダミー HTML
+  - FakeClient : API 呼び出し回数を数える gspread 互換のインメモリ実装
+  - ClaudeStub : /v1/messages 互換。一定割合で 429 (retry-after) を返す
+  - BatchStub  : 上記＋ /v1/messages/batches（投入・ポーリング・結果 JSONL）
+  - TitleStub  : タイトル生成の /v1/messages。一定割合で不合格のタイトル・NOK を返す
+  - TweetsStub : POST /2/tweets 互換。x-rate-limit-* の枠・重複本文の 403・5xx を模す
+"""
+
+import json, math, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from gspread.utils import a1_to_rowcol
+
+
+# ------------ 1. スタブ HTTP サーバ ------------
+class StubServer:
+    """
+    route(method, path, query, headers, body) -> (status, headers, body) で応答。
+    body が dict/list なら JSON にする。latency 秒だけ応答を遅らせる。
+    connect_latency は新規接続ごとの待ち（TCP/TLS ハンドシェイク相当）。connections に接続数を数える。
+    """
+
+    def __init__(self, route, latency=0.0, connect_latency=0.0):
+        self.route, self.latency, self.connect_latency = route, latency, connect_latency
+        self.hits = self.connections = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True      # keep-alive でヘッダと本文の 2 回書きが遅延 ACK 待ちにならないように
+
+            def setup(self):
+                with lock:
+                    stub.connections += 1
+                if stub.connect_latency:
+                    time.sleep(stub.connect_latency)
+                super().setup()
+
+            def _serve(self):
+                stub.hits += 1
+                n = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(n) if n else b""
+                u = urlsplit(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, headers, payload = stub.route(
+                    self.command, u.path, parse_qs(u.query), self.headers, body)
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload, ensure_ascii=False)
+                    headers = {"Content-Type": "application/json", **headers}
+                if isinstance(payload, str):
+                    payload = payload.encode("utf-8")
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = _serve
+
+            def log_message(self, *a):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# ------------ 2. ダミー HTML ------------
+def _filler(n: int) -> str:
+    """ナビ・広告・スクリプト相当の無関係なマークアップ"""
+    return "".join(
+        f'<div class="nav"><ul><li><a href="/bbs/area/{i}/">エリア{i}</a></li>'
+        f'<li><span class="label">広告</span><img src="/img/{i}.png" alt=""></li></ul>'
+        f'<script>var x{i} = "{i}";</script></div>' for i in range(n))
+
+
+def _count(tid) -> int:
+    """一覧のレス数。末尾 9 のスレ（類似スレ、_comment）は 1 つ前のスレと同数にして差分の本文も揃える"""
+    src = tid - 1 if tid % 10 == 9 else tid
+    return (src * 7) % 1000
+
+
+def board_html(page: int, per_page: int = 30, filler: int = 0) -> str:
+    """板ページ。隣接ページと 2 件重複させて重複排除も通す"""
+    items = []
+    for i in range(per_page):
+        tid = 600000 + (page - 1) * (per_page - 2) + i
+        items.append(
+            f'<a class="component_thread_list_item" href="/bbs/thread/{tid}/">'
+            f'<div class="oneliner title">テストマンション{tid}&amp;ほか</div>'
+            f'<span class="num_of_item">{_count(tid)}</span></a>')
+    return (f"<html><head><title>23区</title></head><body>{_filler(filler)}"
+            f"{''.join(items)}{_filler(filler)}</body></html>")
+
+
+_KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわ管理駅徒歩築年修繕"
+
+
+def _comment(tid, page, i) -> str:
+    """スレ毎に別の本文。ID の末尾が 9 のスレは 1 つ前のスレとほぼ同じ本文（Part2 相当）"""
+    seed = int(tid) - 1 if tid.isdigit() and tid.endswith("9") else tid
+    r = random.Random(f"{seed}-{page}-{i}")
+    return f"{tid}-{page}-{i} {''.join(r.choice(_KANA) for _ in range(20))} 駅から徒歩5分、管理も良好です。"
+
+
+def thread_html(tid: str, page: int = 1, per_page: int = 50, filler: int = 0) -> str:
+    """スレッド詳細ページ"""
+    posts = "".join(
+        f'<div class="post"><p itemprop="commentText">{_comment(tid, page, i)}</p></div>'
+        for i in range(per_page))
+    return (f"<html><head><title>【口コミ掲示板】テストマンション{tid}"
+            f"｜マンション口コミ・評判（ページ{page}）</title></head><body>{_filler(filler)}"
+            f"{posts}{_filler(filler)}</body></html>")
+
+
+# ------------ 3. Claude API スタブ ------------
+class ClaudeStub:
+    """StubServer の route として使う。rate_429 の割合で 429 を返す"""
+
+    def __init__(self, rate_429=0.0, retry_after=1, text="リスク：低\n該当なし", seed=3, sec_per_kchar=0.0):
+        self.rate_429, self.retry_after, self.text = rate_429, retry_after, text
+        self.sec_per_kchar = sec_per_kchar      # プロンプト長に比例する処理時間
+        self.rng, self.lock = random.Random(seed), threading.Lock()
+        self.ok = self.throttled = 0
+
+    def __call__(self, method, path, query, headers, body):
+        with self.lock:
+            if self.rng.random() < self.rate_429:
+                self.throttled += 1
+                return 429, {"retry-after": str(self.retry_after)}, {
+                    "type": "error", "error": {"type": "rate_limit_error", "message": "stub"}}
+            self.ok += 1
+        req = json.loads(body or b"{}")
+        prompt = req.get("messages", [{}])[0].get("content", "")
+        if self.sec_per_kchar:
+            time.sleep(len(prompt) / 1000 * self.sec_per_kchar)
+        return 200, {}, {
+            "id": f"msg_{self.ok}", "type": "message", "role": "assistant", "model": req.get("model"),
+            "content": [{"type": "text", "text": self.text}],
+            "usage": {"input_tokens": len(prompt), "output_tokens": len(self.text)}}
+
+
+class BatchStub(ClaudeStub):
+    """polls 回ポーリングされると ended になる。errored の割合で個別エラーを混ぜる"""
+
+    def __init__(self, polls=2, errored=0.0, **kw):
+        super().__init__(**kw)
+        self.polls, self.errored = polls, errored
+        self.batches = {}
+
+    def __call__(self, method, path, query, headers, body):
+        if not path.startswith("/v1/messages/batches"):
+            return super().__call__(method, path, query, headers, body)
+        parts = path.rstrip("/").split("/")[4:]          # [id, "results" | "cancel"]
+        base = f"http://{headers.get('Host')}/v1/messages/batches"
+        if method == "POST" and not parts:
+            bid = f"msgbatch_{len(self.batches) + 1}"
+            self.batches[bid] = {"requests": json.loads(body)["requests"], "left": self.polls}
+            parts = [bid]
+        b = self.batches.get(parts[0]) if parts else None
+        if b is None:
+            return 404, {}, {"type": "error", "error": {"type": "not_found_error"}}
+        if parts[1:] == ["cancel"]:
+            b["left"] = 0
+        if parts[1:] == ["results"]:
+            lines = []
+            for r in b["requests"]:
+                if self.rng.random() < self.errored:
+                    result = {"type": "errored", "error": {"type": "api_error"}}
+                else:
+                    result = {"type": "succeeded", "message": {
+                        "content": [{"type": "text", "text": self.text}],
+                        "usage": {"input_tokens": 1, "output_tokens": len(self.text)}}}
+                lines.append(json.dumps({"custom_id": r["custom_id"], "result": result}, ensure_ascii=False))
+            return 200, {"Content-Type": "application/binary"}, "\n".join(lines)
+        if method == "GET":
+            b["left"] -= 1
+        ended = b["left"] <= 0
+        return 200, {}, {
+            "id": parts[0], "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else len(b["requests"])},
+            "results_url": f"{base}/{parts[0]}/results" if ended else None}
+
+
+class TitleStub:
+    """
+    タイトル生成用の /v1/messages。1 本ごとに bad の割合で不合格（禁止語・長さ）か冒頭に地名の無いタイトルを混ぜる。
+    乱数はプロンプト＋temperature から決めるので、temperature 0 の同じプロンプトには同じ応答を返す
+    （実 API の「同じ入力なら同じ出力」を模す）。複数候補のプロンプトには "n. タイトル" を n 行返す
+    """
+    BAD = ("{i}号棟のトラブル続出、理事会の対応まとめ",
+           "管理組合の議事録から見える住み心地の本音{i}",
+           "渋谷駅徒歩{i}分" + "、住民が語る管理・共用部・周辺環境の評判" * 5)
+
+    def __init__(self, bad=0.5, nok=0.0):
+        self.bad, self.nok = bad, nok
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _title(self, rng, i):
+        if rng.random() < self.bad:
+            return rng.choice(self.BAD).format(i=i)
+        return f"渋谷駅徒歩{i}分のテストマンション、管理と住み心地の評判まとめ"
+
+    def __call__(self, method, path, query, headers, body):
+        with self.lock:
+            self.calls += 1
+        req = json.loads(body or b"{}")
+        prompt = req["messages"][0]["content"]
+        rng = random.Random(f"{prompt}\0{req.get('temperature', 0)}")
+        m = re.search(r"候補を (\d+) 本", prompt)
+        if rng.random() < self.nok:
+            text = "NOK"
+        elif m:
+            text = "\n".join(f"{i}. {self._title(rng, i)}" for i in range(1, int(m.group(1)) + 1))
+        else:
+            text = self._title(rng, rng.randint(1, 9))
+        return 200, {}, {"type": "message", "role": "assistant", "model": req.get("model"),
+                         "content": [{"type": "text", "text": text}],
+                         "usage": {"input_tokens": len(prompt), "output_tokens": len(text)}}
+
+
+# ------------ 4. X API スタブ ------------
+class TweetsStub:
+    """
+    limit 件 / window 秒の枠。枠が尽きたら 429、同じ本文は 403 duplicate。
+    fail の割合で 503、lost の割合で「投稿したのに 503」（結果不明）を返す。
+    posts に実際に投稿された本文、sent に受けた POST 数を記録
+    """
+
+    def __init__(self, limit=50, window=900, fail=0.0, lost=0.0, seed=5):
+        self.limit, self.window, self.fail, self.lost = limit, window, fail, lost
+        self.rng, self.lock = random.Random(seed), threading.Lock()
+        self.posts, self.sent, self.throttled = [], 0, 0
+        self.used, self.reset = 0, math.ceil(time.time() + window)     # X と同じく epoch 秒で区切る
+
+    def __call__(self, method, path, query, headers, body):
+        with self.lock:
+            self.sent += 1
+            now = time.time()
+            if now >= self.reset:
+                self.used, self.reset = 0, math.ceil(now + self.window)
+            if self.used >= self.limit:
+                self.throttled += 1
+                return 429, self._rate(), {"title": "Too Many Requests", "status": 429}
+            self.used += 1
+            text = json.loads(body or b"{}").get("text", "")
+            r = self.rng.random()
+            if r < self.fail:
+                return 503, self._rate(), {"title": "Service Unavailable"}
+            if text in self.posts:
+                return 403, self._rate(), {"detail": "You are not allowed to create a Tweet with duplicate content."}
+            self.posts.append(text)
+            if r < self.fail + self.lost:
+                return 503, self._rate(), {"title": "Service Unavailable"}
+            return 201, self._rate(), {"data": {"id": str(len(self.posts)), "text": text}}
+
+    def _rate(self):
+        return {"x-rate-limit-limit": str(self.limit), "x-rate-limit-remaining": str(self.limit - self.used),
+                "x-rate-limit-reset": str(self.reset)}
+
+
+# ------------ 5. gspread フェイク ------------
+class FakeWorksheet:
+    """値はメモリ上の 2 次元リスト。calls に API 呼び出し回数を記録"""
+
+    def __init__(self, title, rows=None, calls=None):
+        self.title, self.rows = title, [list(r) for r in rows or []]
+        self.calls = calls if calls is not None else {}
+
+    def _hit(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def get_all_values(self):
+        self._hit("get_all_values"); return [list(r) for r in self.rows]
+
+    def get(self, range_name, **kw):
+        """"A5:E" / "A5:E9" 形式だけ対応"""
+        self._hit("get")
+        m = re.fullmatch(r"([A-Z]+)(\d+):([A-Z]+)(\d*)", range_name)
+        (r1, c1), (_, c2) = a1_to_rowcol(m[1] + m[2]), a1_to_rowcol(m[3] + "1")
+        r2 = int(m[4]) if m[4] else len(self.rows)
+        return [list(r[c1 - 1:c2]) for r in self.rows[r1 - 1:r2]]
+
+    def clear(self):
+        self._hit("clear"); self.rows = []
+
+    def append_row(self, values, **kw):
+        self._hit("append_row"); self.rows.append([str(v) for v in values])
+
+    def append_rows(self, values, **kw):
+        self._hit("append_rows"); self.rows += [[str(v) for v in r] for r in values]
+
+    def _set(self, r, c, v):
+        while len(self.rows) < r:
+            self.rows.append([])
+        row = self.rows[r - 1]
+        row += [""] * (c - len(row))
+        row[c - 1] = str(v)
+
+    def update_cell(self, row, col, value):
+        self._hit("update_cell"); self._set(row, col, value)
+
+    def batch_update(self, data, **kw):
+        self._hit("batch_update")
+        for d in data:
+            r, c = a1_to_rowcol(d["range"].split(":")[0])
+            for i, vals in enumerate(d["values"]):
+                for j, v in enumerate(vals):
+                    self._set(r + i, c + j, v)
+
+
+class FakeSpreadsheet:
+    def __init__(self, sheets=None):
+        self.calls = {}
+        self.sheets = {n: FakeWorksheet(n, rows, self.calls) for n, rows in (sheets or {}).items()}
+
+    def worksheet(self, name):
+        if name not in self.sheets:
+            self.sheets[name] = FakeWorksheet(name, calls=self.calls)
+        return self.sheets[name]
+
+
+class FakeClient:
+    def __init__(self, sheets=None):
+        self.book = FakeSpreadsheet(sheets)
+
+    def open_by_key(self, key):
+        return self.book
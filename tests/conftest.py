@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""stubs のローカルサーバに対する試験（ネットワーク・認証情報不要）"""
+
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config, http_client, llm, llm_cache  # noqa: E402
+from stubs import StubServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch, tmp_path):
+    """再試行の待ちは短く、LLM キャッシュはメモリ上、ホスト毎の待機・バッチ結果は試験毎に空"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config, "HTTP_BACKOFF_CAP", 0.05)
+    monkeypatch.setattr(llm_cache, "CACHE", llm_cache.LLMCache(path=""), raising=False)
+    monkeypatch.setattr(llm, "_batched", {})
+    monkeypatch.setattr(http_client, "_cooldown", {})
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """serve(route) → 起動済みの StubServer。Claude の URL もそこに向ける"""
+    servers = []
+
+    def start(route, **kw):
+        srv = StubServer(route, **kw).__enter__()
+        servers.append(srv)
+        monkeypatch.setattr(config, "CLAUDE_API_URL", f"{srv.url}/v1/messages")
+        return srv
+    yield start
+    for srv in servers:
+        srv.__exit__()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+import requests
+
+import config, http_client, llm
+from stubs import BatchStub, ClaudeStub
+
+
+class Throttled(ClaudeStub):
+    """最初の n 回は 429（retry-after 付き）、以降は ClaudeStub の応答"""
+
+    def __init__(self, n, **kw):
+        super().__init__(**kw)
+        self.n = n
+
+    def __call__(self, method, path, query, headers, body):
+        with self.lock:
+            if self.throttled < self.n:
+                self.throttled += 1
+                return 429, {"retry-after": str(self.retry_after)}, {
+                    "type": "error", "error": {"type": "rate_limit_error", "message": "stub"}}
+        return super().__call__(method, path, query, headers, body)
+
+
+# ------------ 429 / retry-after（user-005） ------------
+def test_429_waits_retry_after_then_succeeds(serve, monkeypatch):
+    monkeypatch.setattr(config, "HTTP_BACKOFF_CAP", 5.0)
+    stub = Throttled(1, retry_after=1)
+    srv = serve(stub)
+    t0 = time.monotonic()
+    assert llm.claude_call("p", 200, api_key="stub") == "リスク：低\n該当なし"
+    assert time.monotonic() - t0 >= 1.0                    # retry-after を待ってから送り直す
+    assert (stub.throttled, stub.ok) == (1, 1)
+    assert http_client._cooldown.get(srv.url.split("//")[1], 0) > 0    # 他スレッドも同じホストで待つ
+
+
+def test_429_gives_up_after_claude_retry(serve, monkeypatch):
+    monkeypatch.setattr(config, "CLAUDE_RETRY", 2)
+    stub = Throttled(99, retry_after=0)
+    serve(stub)
+    with pytest.raises(requests.HTTPError):
+        llm.claude_call("p", 200, api_key="stub")
+    assert (stub.throttled, stub.ok) == (3, 0)                 # 初回＋再試行 CLAUDE_RETRY 回
+
+
+# ------------ Message Batches のフォールバック（user-007） ------------
+PROMPTS = [(f"p{i}", 200) for i in range(10)]
+
+
+def test_batch_results_served_without_sync_calls(serve, monkeypatch):
+    monkeypatch.setattr(config, "CLAUDE_BATCH_POLL", 0)
+    stub = BatchStub(polls=2)
+    serve(stub)
+    assert llm.prefetch_batch(PROMPTS, api_key="stub") == len(PROMPTS)
+    assert all(llm.claude_call(p, n, api_key="stub") for p, n in PROMPTS)
+    assert stub.ok == 0                                         # 同期の /v1/messages は呼ばない
+
+
+def test_batch_errored_items_fall_back_to_sync(serve, monkeypatch):
+    monkeypatch.setattr(config, "CLAUDE_BATCH_POLL", 0)
+    stub = BatchStub(polls=1, errored=0.5, seed=1)
+    serve(stub)
+    got = llm.prefetch_batch(PROMPTS, api_key="stub")
+    assert 0 < got < len(PROMPTS)
+    assert all(llm.claude_call(p, n, api_key="stub") for p, n in PROMPTS)
+    assert stub.ok == len(PROMPTS) - got                        # 個別エラー分だけ同期で呼ぶ
+
+
+def test_batch_timeout_cancels_and_falls_back(serve, monkeypatch):
+    monkeypatch.setattr(config, "CLAUDE_BATCH_POLL", 0)
+    monkeypatch.setattr(config, "CLAUDE_BATCH_TIMEOUT", 0)
+    stub = BatchStub(polls=100)
+    serve(stub)
+    assert llm.prefetch_batch(PROMPTS, api_key="stub") == 0
+    assert stub.batches["msgbatch_1"]["left"] == 0             # cancel を送った
+    assert all(llm.claude_call(p, n, api_key="stub") for p, n in PROMPTS)
+    assert stub.ok == len(PROMPTS)
+
+
+def test_batch_endpoint_error_falls_back(serve):
+    stub = ClaudeStub()
+    serve(lambda method, path, *a: (500, {}, {"type": "error"}) if "/batches" in path
+          else stub(method, path, *a))
+    assert llm.prefetch_batch(PROMPTS, api_key="stub") == 0
+    assert all(llm.claude_call(p, n, api_key="stub") for p, n in PROMPTS)
+    assert stub.ok == len(PROMPTS)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import datetime, socket, threading
+
+import pytest
+import requests
+
+import config, http_client, post_queue, state
+from state import Pending
+from stubs import FakeClient, TweetsStub
+
+
+class Recorder:
+    """post_queue から見た state（claim / unclaim / mark_posted の呼び出し順を控える）"""
+
+    def __init__(self):
+        self.log = []
+
+    def claim(self, item):
+        self.log.append("claim")
+
+    def unclaim(self, item):
+        self.log.append("unclaim")
+
+    def mark_posted(self, item, ok, tweet_id=None):
+        self.log.append(("posted" if ok else "failed", item.attempts))
+
+    def posted(self, idem):
+        return False
+
+
+@pytest.fixture
+def tweets(serve, monkeypatch):
+    """serve(TweetsStub) と send(text)（post_to_x.post_to_twitter と同じ呼び方）"""
+    monkeypatch.setattr(config, "POST_INTERVAL", 0)
+
+    def start(stub):
+        srv = serve(stub)
+        return lambda text: http_client.post(f"{srv.url}/2/tweets", json={"text": text}, target="twitter", retries=1)
+    return start
+
+
+def _item(text="本文", row=2, status="FALSE"):
+    return Pending(row, row, text, state.idem_key("2026/01/05", "8:00", text), 0, status)
+
+
+# ------------ 重複エラー（403 duplicate）（user-017） ------------
+def test_duplicate_403_counts_as_posted(tweets):
+    stub = TweetsStub()
+    stub.posts.append("本文")                                   # 前回の送信が届いていた
+    st = Recorder()
+    assert post_queue._post_one(_item(), st, tweets(stub), post_queue.RateGate()) == "posted"
+    assert st.log == ["claim", ("posted", 0)]
+    assert stub.posts == ["本文"]
+
+
+def test_lost_response_is_resent_once(tweets):
+    stub = TweetsStub(lost=1.0)                                 # 投稿されたのに 503
+    st = Recorder()
+    assert post_queue._post_one(_item(), st, tweets(stub), post_queue.RateGate()) == "posted"
+    assert (stub.sent, stub.posts) == (2, ["本文"])             # 再送は 403 duplicate → 投稿済み
+    assert st.log == ["claim", "claim", ("posted", 1)]
+
+
+def test_rate_limited_is_unclaimed(tweets, monkeypatch):
+    monkeypatch.setattr(config, "POST_RATE_WAIT_MAX", 0)
+    stub = TweetsStub(limit=0)
+    st = Recorder()
+    assert post_queue._post_one(_item(), st, tweets(stub), post_queue.RateGate()) is None
+    assert st.log == ["claim", "unclaim"]                       # 送れていないので失敗に数えない
+
+
+# ------------ シートのステータスは終了時に 1 回（user-004 / user-017） ------------
+def test_sheets_state_batches_status_writes(tweets, monkeypatch):
+    monkeypatch.setattr(config, "POST_CURSOR_PATH", "")
+    book = FakeClient({state.POST_SHEET: [state.POST_HEADER] + [
+        ["2026/01/05", f"{8 + i}:00", f"本文{i}", "FALSE", "u"] for i in range(3)]}).book
+    ws = book.worksheet(state.POST_SHEET)
+    st = state.SheetsState(book)
+    due = st.pending_posts(datetime.datetime(2026, 2, 1))
+    assert post_queue.post_due(due, st, tweets(TweetsStub()))["posted"] == 3
+    assert "batch_update" not in book.calls                     # 送信の前後には書かない
+    st.close()
+    assert book.calls["batch_update"] == 1
+    assert [r[3] for r in ws.rows[1:]] == ["TRUE"] * 3
+
+
+# ------------ POST の再試行は接続段階の失敗だけ（user-017） ------------
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_post_retries_connect_error(capsys, monkeypatch):
+    monkeypatch.setattr(config, "HTTP_CONNECT_RETRY", 0)        # アダプタ内の再試行は除いて数える
+    with pytest.raises(requests.ConnectionError) as e:
+        http_client.post(f"http://127.0.0.1:{_free_port()}/2/tweets", json={}, target="t", retries=2)
+    assert http_client.before_send(e.value)
+    assert "retry=1" in capsys.readouterr().out
+
+
+def test_post_not_retried_after_send():
+    """本文を受け取ってから接続を切るサーバ。送信済みかもしれないので再送しない"""
+    srv, stop, accepted = socket.socket(), threading.Event(), []
+    srv.bind(("127.0.0.1", 0))
+    srv.listen()
+    srv.settimeout(0.05)
+
+    def serve():
+        while not stop.is_set():
+            try:
+                conn, _ = srv.accept()
+            except socket.timeout:
+                continue
+            accepted.append(conn)
+            conn.recv(65536)
+            conn.close()
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+    try:
+        with pytest.raises(requests.ConnectionError) as e:
+            http_client.post(f"http://127.0.0.1:{srv.getsockname()[1]}/2/tweets", json={"text": "x"},
+                             target="t", retries=3)
+    finally:
+        stop.set()
+        t.join()
+        srv.close()
+    assert not http_client.before_send(e.value)
+    assert len(accepted) == 1
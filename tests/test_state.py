@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import config, pipeline, state
+from stubs import FakeClient
+
+OLD, NEW = "2020-01-01", datetime.date.today().isoformat()
+
+
+def _book(rows):
+    return FakeClient({state.HISTORY_SHEET: [["URL", "取得時レス数", "最終取得日"]] + rows}).book
+
+
+# ------------ 履歴の詰め直し（user-015） ------------
+def test_sqlite_compaction_keeps_rows_and_drops_pruned(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "HISTORY_PRUNE_WEEKS", 12)
+    book = _book([["u1", "1", NEW], ["old", "1", OLD], ["u2", "1", NEW], ["u3", "1", NEW]])
+    ws = book.worksheet(state.HISTORY_SHEET)
+    st = state.SqliteState(book, path=str(tmp_path / "s.db"))
+    st.load_history()
+    st.save_history({"u2": 5}, {"u1": 1, "u2": 5, "u3": 1})          # old が消えて詰め直される
+    assert dict(st.load_history()) == {"u1": 1, "u2": 5, "u3": 1}
+    assert st._all("SELECT url FROM threads WHERE sheet_row IS NULL") == []
+
+    st.save_history({"u1": 2}, {"u1": 2, "u2": 5, "u3": 1})          # 次の保存で行を足さない
+    urls = [r[0] for r in ws.rows[1:] if r and r[0]]
+    assert sorted(urls) == ["u1", "u2", "u3"]
+    assert ws.rows[1 + urls.index("u1")][1] == "2"
+    st.close()
+
+
+# ------------ 休眠スレの復帰（user-014） ------------
+def test_dormant_thread_is_kept_and_ranked_again():
+    """既定では削除しないので、長く見かけなかったスレも再び伸びれば候補になる"""
+    book = _book([["u1", "1", NEW], ["dormant", "3", OLD]])
+    st = state.SheetsState(book)
+    st.load_history()
+    st.save_history({}, {"u1": 1})                                     # dormant は板に出てこない
+    st = state.SheetsState(book)
+    history = st.load_history()
+    assert history["dormant"] == 3
+    ranked = pipeline.rank_diffs([{"url": "dormant", "count": 10}, {"url": "u1", "count": 1}], history)
+    assert [d["url"] for d in ranked] == ["dormant"]
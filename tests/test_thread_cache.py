@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import os, time
+
+import config, thread_cache
+
+
+# ------------ ディスクキャッシュの削除（user-002） ------------
+def test_evict_drops_stale_and_over_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "THREAD_CACHE_TTL_DAYS", 1)
+    cache = thread_cache.ThreadPageCache(str(tmp_path))
+    for tid in ("old", "read", "a", "b"):
+        cache._store(tid, 1, {"count": 1, "posts": [tid]})
+    stale = time.time() - 3 * 86400
+    for tid in ("old", "read"):
+        os.utime(cache._path(tid), (stale, stale))
+    os.utime(cache._path("a"), (stale + 86400 * 2 + 60, stale + 86400 * 2 + 60))
+
+    reader = thread_cache.ThreadPageCache(str(tmp_path))
+    reader._load("read")                            # 今回読んだスレは古くても残す
+    reader.evict()
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "b.json", "read.json"]
+
+    monkeypatch.setattr(config, "THREAD_CACHE_MAX_FILES", 2)
+    reader.evict()                                  # 上限超過は今回読んだもの → 新しい順に残す
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "read.json"]
+    assert reader.stats["evicted"] == 2
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+スレッドページのキャッシュ（実行中メモ ＋ ディスク永続）
+  - キーは (スレ ID, ページ番号)、値は抽出済みの本文リスト
+  - レス数ウォーターマークが前回と同じならリクエストしない
+  - それ以外は ETag / Last-Modified で条件付き GET（304 なら再パースしない）
+  - evict() で TTL 切れ・件数上限超過のファイルを削除
+"""
+
+import json, os, threading, time
+
+import requests
+
+import config, crawler, http_client
+
+UA = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+
+
+class ThreadPageCache:
+    def __init__(self, cache_dir=None):
+        self.dir = config.THREAD_CACHE_DIR if cache_dir is None else cache_dir
+        self.memo, self.disk = {}, {}          # (tid, page) → posts / tid → {page: entry}
+        self.lock = threading.RLock()
+        self.stats = {"memo_hit": 0, "watermark_hit": 0, "not_modified": 0, "miss": 0, "error": 0, "evicted": 0}
+
+    # ---- ディスク ----
+    def _path(self, tid):
+        return os.path.join(self.dir, f"{tid}.json")
+
+    def _load(self, tid) -> dict:
+        with self.lock:
+            if tid not in self.disk:
+                self.disk[tid] = {}
+                if not self.dir:
+                    return self.disk[tid]
+                try:
+                    with open(self._path(tid), encoding="utf-8") as f:
+                        self.disk[tid] = json.load(f)
+                except (OSError, ValueError):
+                    pass
+            return self.disk[tid]
+
+    def _store(self, tid, page, entry):
+        with self.lock:
+            self._load(tid)[str(page)] = entry
+            if not self.dir:
+                return
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = self._path(tid) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.disk[tid], f, ensure_ascii=False)
+            os.replace(tmp, self._path(tid))
+
+    def evict(self):
+        """今回読んでいない TTL 切れのスレと、件数上限超過分（今回読んだもの → 新しい順に残す）を削除"""
+        if not self.dir:
+            return
+        with self.lock:
+            try:
+                names = [n for n in os.listdir(self.dir) if n.endswith(".json")]
+            except OSError:
+                return
+            files = []
+            for n in names:
+                path = os.path.join(self.dir, n)
+                try:
+                    files.append((n[:-5] in self.disk, os.path.getmtime(path), path))
+                except OSError:
+                    pass
+            files.sort(reverse=True)
+            cutoff = time.time() - config.THREAD_CACHE_TTL_DAYS * 86400
+            for i, (used, mtime, path) in enumerate(files):
+                if i >= config.THREAD_CACHE_MAX_FILES or (not used and mtime <= cutoff):
+                    try:
+                        os.remove(path)
+                        self.stats["evicted"] += 1
+                    except OSError:
+                        pass
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    # ---- 取得 ----
+    def get_posts(self, tid: str, page: int, count=None):
+        """
+        本文リストを返す。取得失敗は None。
+        count にはスレ一覧のレス数を渡す（前回保存時と同じならリクエスト省略）。
+        """
+        key = (tid, page)
+        if key in self.memo:
+            self._count("memo_hit")
+            return self.memo[key]
+
+        entry = self._load(tid).get(str(page))
+        if entry and count is not None and entry.get("count") == count:
+            self._count("watermark_hit")
+            self.memo[key] = entry["posts"]
+            return entry["posts"]
+
+        headers = dict(UA)
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        url = crawler.THREAD_URL.format(tid=tid) + f"?page={page}"
+        try:
+            r = http_client.get(url, headers=headers, target="thread", limiter=crawler.LIMITER)
+            if r.status_code == 304 and entry:
+                self._count("not_modified")
+                posts = entry["posts"]
+                if count is not None and entry.get("count") != count:
+                    self._store(tid, page, {**entry, "count": count})
+            else:
+                r.raise_for_status()
+                self._count("miss")
+                posts = crawler.parse_thread(r.text)
+                self._store(tid, page, {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "count": count, "posts": posts})
+        except requests.RequestException:
+            self._count("error")
+            return None
+        self.memo[key] = posts
+        return posts
+
+    def summary(self) -> str:
+        s = self.stats
+        skipped = s["memo_hit"] + s["watermark_hit"]
+        total = skipped + s["not_modified"] + s["miss"]
+        return (" ".join(f"{k}={v}" for k, v in s.items())
+                + f" (リクエスト回避 {skipped}/{total}, 再パース回避 {skipped + s['not_modified']}/{total})")
+
+
+CACHE = ThreadPageCache()
+
+
+# ------------ 差分取得 ------------
+def delta_pages(since: int, count: int, context=None, max_pages=None):
+    """
+    既読レス数 since → 現在 count のとき、取得すべきページ範囲と
+    先頭ページ内で捨てるレス数を返す: (first_page, last_page, skip)
+    """
+    size = config.THREAD_PAGE_SIZE
+    context = config.THREAD_DELTA_CONTEXT if context is None else context
+    max_pages = config.THREAD_DELTA_MAX_PAGES if max_pages is None else max_pages
+    start = max(0, since - context)                 # 0 始まりのレス位置
+    first, last = start // size + 1, max(0, count - 1) // size + 1
+    if last - first + 1 > max_pages:                # 新着が多すぎる → 新しい側を優先
+        first, start = last - max_pages + 1, (last - max_pages) * size
+    return first, last, start - (first - 1) * size
+
+
+def fetch_delta(tid: str, since: int, count: int, context=None, max_pages=None):
+    """ウォーターマーク以降のレス（＋直前 context 件）だけを返す。全ページ失敗時は None"""
+    first, last, skip = delta_pages(since, count, context, max_pages)
+    posts, ok = [], False
+    for p in range(first, last + 1):
+        page = CACHE.get_posts(tid, p, count=count)
+        if page is None:
+            continue
+        ok = True
+        posts += page[skip:] if p == first else page
+    return posts if ok else None
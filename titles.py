@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+投稿タイトルの生成（1 回の呼び出しで候補を複数出させ、ローカルで検証して選ぶ）
+  - TITLE_CANDIDATES 本を切り口を変えて出させる（temperature = TITLE_TEMPERATURE）
+  - 各候補を禁止語・長さ（MAX_TITLE_LEN）・形式で検証し、通ったもののうち score が最大のものを採用
+    （冒頭の地名／駅名／数字は不合格にせず score の加点。満たす候補が無くても呼び直さない）
+  - 全候補が不合格のときだけ、不合格の候補と理由を添えて呼び直す（最大 TITLE_MAX_CALLS 回）
+  - 長さ超過だけで全滅したら従来どおり切り詰めて使う
+  - 呼び出し回数・不合格理由を STATS に集計
+"""
+
+import re, threading
+from collections import Counter, namedtuple
+
+import config, premod
+
+BANNED_WORDS = ["意味不明","共産主義","中国人","血税","糞尿","悩む","スケベ","低俗","トラブル","酷い","劣等感","三流","タイトル"]
+MAX_TITLE_LEN = 90
+MAX_TOKENS_PER_TITLE = 120                      # 90 字の日本語＋番号
+
+# 冒頭の地名・駅名・数字（地名は「〜駅／区／市…」の形か、本文に「〜駅」等で出てくる語）
+_NUM = re.compile(r"^(?:[0-9０-９]|[一二三四五六七八九十百千]+[年月日階棟戸分万億])")
+_PLACE = re.compile(r"^[一-龥々ァ-ヶーA-Za-zＡ-Ｚａ-ｚ]{1,10}?(?:駅|区|市|町|村|県|都|府|線|丁目)")
+_PLACE_IN_TEXT = re.compile(r"([一-龥々ァ-ヶー]{2,8})(?:駅|区|市|町|線)")
+LEAD_BONUS = 30                                 # 冒頭が地名・駅名・数字なら加点（文字数換算）
+_ENUM = re.compile(r"^\s*(?:\d{1,2}[.)]\s+|[０-９]{1,2}[．）]\s*|[-–・*]\s*)")
+
+Title = namedtuple("Title", "text calls candidates")            # text は採用タイトル、無ければ "NOK"
+
+STATS = {"titles": 0, "calls": 0, "candidates": 0, "valid": 0, "nok": 0, "truncated": 0}
+REJECTED = Counter()                                             # 不合格理由 → 件数
+_lock = threading.Lock()
+
+
+def request(text, rejected=(), attempt=1) -> tuple:
+    """
+    (prompt, max_tokens, temperature)。llm.claude_call / prefetch_batch にそのまま渡す。
+    呼び直しはプロンプトを変える（同じなら llm_cache が前回の応答を返してしまう）
+    """
+    n = config.TITLE_CANDIDATES
+    retry = ""
+    if rejected:
+        retry = "### 次の候補は不採用（理由）。これらとは違うタイトルにする\n" + "\n".join(
+            f"- {t}（{why}）" for t, why in rejected) + "\n"
+    elif attempt > 1:
+        retry = f"### 再生成（{attempt} 回目）。前回は条件を満たす候補が無かった\n"
+    prompt = f"""あなたは X（旧Twitter）向けのコピーライターです。
+掲示板スレッド本文を読み、読者が続きをクリックしたくなる **前向きで長め** の日本語タイトルの候補を {n} 本、
+切り口・語彙を互いに変えて生成してください。
+### 出力仕様（必ず守る）
+1. **1 行に 1 本、計 {n} 行**。各行は「番号. タイトル」（例: 1. 〜）
+   - 接頭辞「タイトル:」や解説文（例: 「禁止語を含まず～」「90文字以内で～」）を付けない
+   - 同一の文を 2 回以上繰り返さない
+   - かぎ括弧・箇条書き記号・絵文字・記号説明を付けない
+   - 各 {MAX_TITLE_LEN} 文字以内
+2. 各タイトルの冒頭に **地名・駅名・数字** いずれかを入れて目を引く構成にする
+3. 上記を満たす候補を 1 本も作れない場合は **NOK** とだけ出力する
+### 禁止語
+{', '.join(BANNED_WORDS)}
+{retry}--- 本文 ---
+{text}"""
+    return prompt, MAX_TOKENS_PER_TITLE * n, config.TITLE_TEMPERATURE
+
+
+def parse(answer) -> list[str]:
+    """応答 → 候補（番号・接頭辞・かぎ括弧を除いたもの、重複なし）"""
+    out = []
+    for line in answer.splitlines():
+        t = _ENUM.sub("", line).strip()
+        t = re.sub(r"\s+", " ", t)
+        t = re.sub(r"^タイトル[:：]\s*", "", t)
+        t = re.sub(r"^.*?[「\"](.*?)[」\"]$", r"\1", t)
+        if t and t.upper() != "NOK" and t not in out:
+            out.append(t)
+    return out
+
+
+def places(text) -> set:
+    """本文に「〜駅」「〜区」などの形で出てくる地名"""
+    return set(_PLACE_IN_TEXT.findall(text))
+
+
+def leads_with_place_or_number(title, known=()) -> bool:
+    return bool(_NUM.match(title) or _PLACE.match(title) or any(title.startswith(p) for p in known))
+
+
+def check(title):
+    """不合格理由（合格なら None）。禁止語・形式・同じ文の繰り返し・長さだけを見る（冒頭の地名等は score）"""
+    hit = premod.compile_terms(tuple(BANNED_WORDS)).scan(title)
+    if hit:
+        return f"禁止語「{next(iter(hit))}」"
+    if re.search(r"[「」『』\n]|NOK", title, re.I):
+        return "形式"
+    sentences = [s for s in re.split(r"[。！？!?]", title) if s.strip()]
+    if len(sentences) != len(set(sentences)):
+        return "同じ文の繰り返し"
+    if len(title) > MAX_TITLE_LEN:
+        return f"{MAX_TITLE_LEN}字超"
+    return None
+
+
+def score(title, known=()) -> int:
+    """
+    長いほど高い（仕様の「長め」）。冒頭が地名・駅名・数字なら LEAD_BONUS、
+    冒頭 15 字に数字と地名・駅名の両方を含めばさらに加点
+    """
+    head = title[:15]
+    both = bool(re.search(r"[0-9０-９]", head)) and bool(
+        re.search(r"駅|区|市|町", head) or any(p in head for p in known))
+    return len(title) + LEAD_BONUS * leads_with_place_or_number(title, known) + 10 * both
+
+
+def _truncate(title) -> str:
+    return title[:MAX_TITLE_LEN].rstrip("、,。. ") + "…"
+
+
+def generate(text, call) -> Title:
+    """
+    call(prompt, max_tokens, temperature) -> 応答テキスト（例外は呼び出し 1 回の失敗として数える）。
+    候補がすべて不合格のときだけ呼び直す
+    """
+    known, rejected, too_long, calls, seen = places(text), [], [], 0, 0
+    title = "NOK"
+    for _ in range(max(1, config.TITLE_MAX_CALLS)):
+        calls += 1
+        try:
+            answer = call(*request(text, rejected[-config.TITLE_CANDIDATES * 2:], calls))
+        except Exception:
+            continue
+        tried = {t for t, _ in rejected}
+        cands = [t for t in parse(answer) if t not in tried]
+        seen += len(cands)
+        valid = []
+        for t in cands:
+            why = check(t)
+            if why is None:
+                valid.append(t)
+            else:
+                rejected.append((t, why))
+                with _lock:
+                    REJECTED[re.sub(r"「.*」", "", why)] += 1
+                if why.endswith("字超"):
+                    too_long.append(t)
+        if valid:
+            title = max(valid, key=lambda t: score(t, known))     # 同点は先の候補
+            break
+    truncated = title == "NOK" and bool(too_long)
+    if truncated:
+        title = _truncate(max(too_long, key=lambda t: score(t, known)))
+    with _lock:
+        STATS["titles"] += 1
+        STATS["calls"] += calls
+        STATS["candidates"] += seen
+        STATS["valid"] += title != "NOK" and not truncated
+        STATS["nok"] += title == "NOK"
+        STATS["truncated"] += truncated
+    return Title(title, calls, seen)
+
+
+def summary() -> str:
+    s = STATS
+    per = s["calls"] / s["titles"] if s["titles"] else 0.0
+    why = " ".join(f"{k} {v}" for k, v in REJECTED.most_common()) or "なし"
+    return (f"{s['titles']} 件 / 呼び出し {s['calls']} 回（{per:.2f} 回/件） 候補 {s['candidates']} 本 / "
+            f"NOK {s['nok']} 件 / 切り詰め {s['truncated']} 件 / 不合格理由: {why}")